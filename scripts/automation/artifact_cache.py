@@ -0,0 +1,272 @@
+"""
+Content-addressed local cache of TeamCity artifacts.
+
+Artifacts addressed by build id never change once the build is finished. The
+cache maps (build configuration, build id, artifact path) to the sha256 of the
+artifact, whose content is stored once under its digest. Contents are reflinked
+or, where the file system cannot, copied into and out of the cache, so that retries
+and dry runs skip the network entirely. They are never hard-linked, as editing the
+downloaded file would then silently change the cached content. The total size of
+the stored contents is bounded, the least recently used ones being evicted first.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# ioctl request cloning a file on copy-on-write file systems (Linux FICLONE)
+FICLONE = 0x40049409
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def clone_or_copy(source: Path, destination: Path) -> None:
+    """
+    Make destination a reflink of source, else a copy. Both are independent of
+    source once created, unlike a hard link.
+
+    Args:
+    - source (Path): The existing file.
+    - destination (Path): The file to create, replaced if it exists.
+    """
+    destination = Path(destination)
+    if destination.exists():
+        destination.unlink()
+
+    try:
+        import fcntl
+    except ImportError:  # not available on Windows, e.g. in git bash
+        fcntl = None
+
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as source_file, open(destination, "wb") as clone:
+                fcntl.ioctl(clone.fileno(), FICLONE, source_file.fileno())
+            return
+        except OSError:
+            destination.unlink(missing_ok=True)
+
+    shutil.copyfile(source, destination)
+
+
+def hash_file(path: Path) -> str:
+    """
+    Compute the sha256 of a file.
+
+    Args:
+    - path (Path): The file.
+
+    Returns:
+    - str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(HASH_BLOCK_SIZE)
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+
+
+class ArtifactCache:
+    """
+    A size-bounded, content-addressed cache of build artifacts stored in a directory.
+
+    Attributes:
+    - directory (Path): The directory holding the cache.
+    - max_bytes (int): Maximum total size of the cached contents.
+
+    Methods:
+    - fetch(build_config_id: str, build_id: str, artifact: str, destination: Path) -> Optional[Dict]:
+        Materialize a cached artifact at destination.
+    - store(build_config_id: str, build_id: str, artifact: str, path: Path, sha256: str = None) -> Dict:
+        Add a downloaded artifact to the cache.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """
+        Initialize an ArtifactCache instance.
+
+        Args:
+        - directory (Path): The directory holding the cache, created if needed.
+        - max_bytes (int): Maximum total size of the cached contents.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._index_dir = self.directory / "index"
+        self._blobs_dir = self.directory / "blobs"
+        self._index_dir.mkdir(parents=True, exist_ok=True)
+        self._blobs_dir.mkdir(parents=True, exist_ok=True)
+        # serializes the evictions of the threads storing artifacts concurrently
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def _key(build_config_id: str, build_id: str, artifact: str) -> str:
+        identity = json.dumps([build_config_id, str(build_id), artifact.strip("/")])
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self._blobs_dir / sha256[:2] / sha256
+
+    def lookup(
+        self,
+        build_config_id: str,
+        build_id: str,
+        artifact: str,
+    ) -> Optional[Dict]:
+        """
+        Get the index entry of an artifact whose content is cached.
+
+        Args:
+        - build_config_id (str): The id of the build configuration.
+        - build_id (str): The id of the build.
+        - artifact (str): The path of the artifact relative to the artifacts root.
+
+        Returns:
+        - dict or None: The entry, with the sha256 and size of the artifact.
+        """
+        index_path = self._index_dir / self._key(build_config_id, build_id, artifact)
+        try:
+            with open(index_path, "r") as index_file:
+                entry = json.load(index_file)
+            blob_size = self._blob_path(entry["sha256"]).stat().st_size
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if blob_size != entry["size"]:
+            return None
+        return entry
+
+    def fetch(
+        self,
+        build_config_id: str,
+        build_id: str,
+        artifact: str,
+        destination: Path,
+    ) -> Optional[Dict]:
+        """
+        Materialize a cached artifact at destination.
+
+        Args:
+        - build_config_id (str): The id of the build configuration.
+        - build_id (str): The id of the build.
+        - artifact (str): The path of the artifact relative to the artifacts root.
+        - destination (Path): The file to create.
+
+        Returns:
+        - dict or None: The entry of the artifact, None on a cache miss.
+        """
+        entry = self.lookup(build_config_id, build_id, artifact)
+        if entry is None:
+            return None
+
+        blob_path = self._blob_path(entry["sha256"])
+        try:
+            clone_or_copy(blob_path, destination)
+            # mark the content as recently used
+            os.utime(blob_path)
+        except FileNotFoundError:
+            # evicted by another thread or process since the lookup
+            return None
+        return entry
+
+    def store(
+        self,
+        build_config_id: str,
+        build_id: str,
+        artifact: str,
+        path: Path,
+        sha256: Optional[str] = None,
+    ) -> Dict:
+        """
+        Add a downloaded artifact to the cache.
+
+        Args:
+        - build_config_id (str): The id of the build configuration.
+        - build_id (str): The id of the build.
+        - artifact (str): The path of the artifact relative to the artifacts root.
+        - path (Path): The downloaded artifact.
+        - sha256 (str, optional): The digest of the artifact, computed if not given.
+
+        Returns:
+        - dict: The entry of the artifact.
+        """
+        sha256 = sha256 or hash_file(path)
+        entry = {
+            "build_config_id": build_config_id,
+            "build_id": str(build_id),
+            "artifact": artifact.strip("/"),
+            "sha256": sha256,
+            "size": os.path.getsize(path),
+        }
+
+        blob_path = self._blob_path(sha256)
+        try:
+            # mark the content as recently used if it is already cached
+            os.utime(blob_path)
+        except FileNotFoundError:
+            blob_path.parent.mkdir(exist_ok=True)
+            temporary_path = blob_path.with_name(
+                f"{sha256}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            clone_or_copy(path, temporary_path)
+            os.replace(temporary_path, blob_path)
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self._index_dir)
+        with os.fdopen(file_descriptor, "w") as index_file:
+            json.dump(entry, index_file)
+        os.replace(
+            temporary_path,
+            self._index_dir / self._key(build_config_id, build_id, artifact),
+        )
+
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        with self._evict_lock:
+            blobs = []
+            total_size = 0
+            for blob_path in self._blobs_dir.glob("*/*"):
+                if blob_path.suffix == ".tmp":
+                    continue
+                try:
+                    stat = blob_path.stat()
+                except FileNotFoundError:
+                    # evicted by another process since it was listed
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, blob_path))
+                total_size += stat.st_size
+
+            # least recently used first, index entries of evicted contents become misses
+            for _, size, blob_path in sorted(blobs):
+                if total_size <= self.max_bytes:
+                    break
+                blob_path.unlink(missing_ok=True)
+                total_size -= size
+
+
+def create_artifact_cache(directory: Optional[Path]) -> Optional[ArtifactCache]:
+    """
+    Create an ArtifactCache in directory, or no cache at all when directory is not given.
+
+    Args:
+    - directory (Path or None): The cache directory.
+
+    Returns:
+    - ArtifactCache or None: The cache.
+    """
+    if not directory:
+        return None
+    return ArtifactCache(directory)
@@ -0,0 +1,312 @@
+"""
+In-memory index of the artifacts of a TeamCity build.
+
+The artifacts of a build are listed once, recursively, and held in a trie of their
+path segments, so that artifacts can be looked up by glob or regular expression
+instead of by their exact name, e.g. Deltares.MeshKernel.*.nupkg, without knowing
+the build number embedded in the name and without listing each directory.
+
+Glob patterns are matched segment by segment: * and ? do not match /, and a **
+segment matches any number of directories. The build numbers embedded in names are
+matched with [#], which matches digits only: * would also match the dots of e.g.
+Deltares.MeshKernel.1.0.0.123.symbols.nupkg.
+"""
+
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+from request_wrapper import BUILDS_ROOT, RequestsWrapper
+from teamcity_locator import locator
+
+HEADERS = {"Accept": "application/json"}
+
+# characters which make a name a glob pattern
+GLOB_CHARACTERS = frozenset("*?[")
+
+# separates an archived artifact from the path of a member inside it, as in
+# NuGetContent.zip!/lib/MeshKernel.dll
+ARCHIVE_MEMBER_SEPARATOR = "!/"
+
+# stands for a build number in a glob pattern, one or more digits
+BUILD_NUMBER_GLOB = "[#]"
+
+# replaces BUILD_NUMBER_GLOB while a pattern is translated, which leaves it unescaped
+_BUILD_NUMBER_MARKER = "\ue000"
+
+
+def is_glob(name: str) -> bool:
+    """
+    Whether a name is a glob pattern rather than an exact name.
+
+    Args:
+    - name (str): The name.
+
+    Returns:
+    - bool: True if the name contains glob characters.
+    """
+    return not GLOB_CHARACTERS.isdisjoint(name)
+
+
+@lru_cache(maxsize=None)
+def compile_glob(pattern: str) -> Pattern[str]:
+    """
+    Compile a glob pattern into a regular expression.
+
+    Args:
+    - pattern (str): The glob pattern, which may contain BUILD_NUMBER_GLOB.
+
+    Returns:
+    - Pattern: The regular expression matching the names the pattern matches.
+    """
+    regex = translate(pattern.replace(BUILD_NUMBER_GLOB, _BUILD_NUMBER_MARKER))
+    return re.compile(regex.replace(_BUILD_NUMBER_MARKER, "[0-9]+"))
+
+
+def match_glob(name: str, pattern: str) -> bool:
+    """
+    Whether a name matches a glob pattern, case-sensitively.
+
+    Args:
+    - name (str): The name.
+    - pattern (str): The glob pattern, which may contain BUILD_NUMBER_GLOB.
+
+    Returns:
+    - bool: True if the name matches the pattern.
+    """
+    return compile_glob(pattern).match(name) is not None
+
+
+def split_archive_member(artifact_name: str) -> Tuple[str, str]:
+    """
+    Split the name of an artifact addressing a member of an archived artifact.
+
+    Args:
+    - artifact_name (str): The name, e.g. NuGetContent.zip!/lib/MeshKernel.dll.
+
+    Returns:
+    - tuple: The name of the archive and the path of the member inside it, empty
+      if the name does not address a member.
+    """
+    archive_name, _, member = artifact_name.partition(ARCHIVE_MEMBER_SEPARATOR)
+    return archive_name, member
+
+
+def join_path(path: str, name: str) -> str:
+    """
+    Join an artifact path and name, the path may be empty for the artifacts root.
+
+    Args:
+    - path (str): The path.
+    - name (str): The name.
+
+    Returns:
+    - str: The path of the name relative to the artifacts root.
+    """
+    path = path.strip("/")
+    return f"{path}/{name}" if path else name
+
+
+class ArtifactIndex:
+    """
+    A trie of the paths of the artifacts of a build. Directories are dicts of their
+    entries by name, files are None.
+    """
+
+    def __init__(self, full_names: Iterable[str] = ()):
+        """
+        Create the index.
+
+        Args:
+        - full_names (iterable): The paths of the artifacts relative to the artifacts root.
+        """
+        self._root: Dict = {}
+        self._count = 0
+        for full_name in full_names:
+            self.add(full_name)
+
+    @classmethod
+    def from_listing(cls, files: Sequence[Dict]) -> "ArtifactIndex":
+        """
+        Create the index from a recursive artifacts listing.
+
+        Args:
+        - files (list): The files of the listing, with their fullName, directories
+          have children.
+
+        Returns:
+        - ArtifactIndex: The index of the files which are not directories.
+        """
+        return cls(file["fullName"] for file in files if "children" not in file)
+
+    def add(self, full_name: str) -> None:
+        """
+        Add an artifact.
+
+        Args:
+        - full_name (str): The path of the artifact relative to the artifacts root.
+        """
+        *directories, name = full_name.strip("/").split("/")
+        node = self._root
+        for directory in directories:
+            node = node.setdefault(directory, {})
+        if name not in node:
+            node[name] = None
+            self._count += 1
+
+    def _find_node(self, path: str) -> Optional[Dict]:
+        """
+        Get the directory node of a path.
+
+        Args:
+        - path (str): The path of the directory, empty for the artifacts root.
+
+        Returns:
+        - dict or None: The node, None if there is no such directory.
+        """
+        node = self._root
+        for directory in filter(None, path.strip("/").split("/")):
+            node = node.get(directory)
+            if not isinstance(node, dict):
+                return None
+        return node
+
+    def __contains__(self, full_name: str) -> bool:
+        *directories, name = full_name.strip("/").split("/")
+        node = self._find_node("/".join(directories))
+        return node is not None and name in node and node[name] is None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iterate()
+
+    def iterate(self, path: str = "") -> Iterator[str]:
+        """
+        Iterate over the artifacts under a directory.
+
+        Args:
+        - path (str): The path of the directory, empty for the artifacts root.
+
+        Yields:
+        - str: The paths of the artifacts relative to the artifacts root.
+        """
+        node = self._find_node(path)
+        if node is None:
+            return
+        stack = [(path.strip("/"), node)]
+        while stack:
+            prefix, node = stack.pop()
+            for name, child in node.items():
+                full_name = join_path(prefix, name)
+                if child is None:
+                    yield full_name
+                else:
+                    stack.append((full_name, child))
+
+    def glob(self, pattern: str, path: str = "") -> List[str]:
+        """
+        Get the artifacts matching a glob pattern.
+
+        Args:
+        - pattern (str): The glob pattern, relative to path.
+        - path (str): The path of the directory the pattern is relative to.
+
+        Returns:
+        - list: The sorted paths of the matching artifacts relative to the artifacts root.
+        """
+        matches = []
+        segments = join_path(path, pattern).strip("/").split("/")
+
+        def walk(node: Dict, prefix: str, index: int) -> None:
+            segment = segments[index]
+            last = index == len(segments) - 1
+            if segment == "**":
+                if not last:
+                    walk(node, prefix, index + 1)
+                for name, child in node.items():
+                    if child is None:
+                        if last:
+                            matches.append(join_path(prefix, name))
+                    else:
+                        walk(child, join_path(prefix, name), index)
+                return
+            if is_glob(segment):
+                names = [name for name in node if match_glob(name, segment)]
+            else:
+                names = [segment] if segment in node else []
+            for name in names:
+                child = node[name]
+                if last and child is None:
+                    matches.append(join_path(prefix, name))
+                elif not last and child is not None:
+                    walk(child, join_path(prefix, name), index + 1)
+
+        walk(self._root, "", 0)
+        return sorted(matches)
+
+    def search(self, regex: str, path: str = "") -> List[str]:
+        """
+        Get the artifacts matching a regular expression.
+
+        Args:
+        - regex (str): The regular expression, matched in full against the paths of
+          the artifacts relative to path.
+        - path (str): The path of the directory the artifacts are searched in.
+
+        Returns:
+        - list: The sorted paths of the matching artifacts relative to the artifacts root.
+        """
+        compiled = re.compile(regex)
+        prefix_length = len(path.strip("/")) + 1 if path.strip("/") else 0
+        return sorted(
+            full_name
+            for full_name in self.iterate(path)
+            if compiled.fullmatch(full_name[prefix_length:])
+        )
+
+    def find(self, artifact_path: str, artifact_name: str) -> Optional[str]:
+        """
+        Get the artifact with a name, which may be a glob pattern.
+
+        Args:
+        - artifact_path (str): The path of the artifact, empty for the artifacts root.
+        - artifact_name (str): The name or glob pattern of the artifact.
+
+        Returns:
+        - str or None: The path of the artifact relative to the artifacts root, None
+          if there is none.
+
+        Raises:
+        - Exception: If the pattern matches several artifacts.
+        """
+        matches = self.glob(artifact_name, artifact_path)
+        if len(matches) > 1:
+            raise Exception(
+                f"Artifact pattern '{join_path(artifact_path, artifact_name)}' matches several artifacts: {matches}."
+            )
+        return matches[0] if matches else None
+
+
+def get_artifact_index(build_id: int, request: RequestsWrapper) -> ArtifactIndex:
+    """
+    List the artifacts of a build recursively, in a single request.
+
+    Args:
+    - build_id (int): The id of the build.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+
+    Returns:
+    - ArtifactIndex: The index of the artifacts of the build.
+    """
+    response = request.get(
+        f"{BUILDS_ROOT}/id:{build_id}/artifacts",
+        params={
+            "locator": locator(recursive=True),
+            "fields": "file(fullName,children)",
+        },
+        headers=HEADERS,
+    )
+    return ArtifactIndex.from_listing(response.json().get("file", []))
@@ -0,0 +1,239 @@
+import aiohttp
+from typing import Optional, Dict, Union
+
+from request_wrapper import RequestsWrapper
+
+
+class AsyncRequestsWrapper:
+    """
+    An asyncio counterpart of RequestsWrapper around aiohttp.ClientSession.
+
+    All requests share a bounded pool of keep-alive connections, so that many
+    REST calls can be awaited concurrently (e.g. with asyncio.gather) over a
+    handful of reused TLS connections. The wrapper must be used as an async
+    context manager, which opens and closes the underlying session.
+
+    Attributes:
+    - max_connections (int): Maximum number of simultaneously open connections.
+    - session (aiohttp.ClientSession): Session object, available inside the context.
+
+    Methods:
+    - __init__(token: str, max_connections: int = 20): Initialize the AsyncRequestsWrapper.
+    - from_requests_wrapper(request: RequestsWrapper) -> AsyncRequestsWrapper:
+        Create an AsyncRequestsWrapper authenticated like an existing RequestsWrapper.
+    - _reset_headers(headers: dict): Manages the headers of the requests
+    - get(url: str, headers: dict = None, **kwargs) -> aiohttp.ClientResponse:
+        Perform a GET request.
+    - post(url: str, data: dict = None, json: dict = None, headers: dict = None, **kwargs) -> aiohttp.ClientResponse:
+        Perform a POST request.
+    - put(url: str, data: dict = None, headers: dict = None, **kwargs) -> aiohttp.ClientResponse:
+        Perform a PUT request.
+    - delete(url: str, headers: dict = None, **kwargs) -> aiohttp.ClientResponse:
+        Perform a DELETE request.
+    - patch(url: str, data: dict = None, headers: dict = None, **kwargs) -> aiohttp.ClientResponse:
+        Perform a PATCH request.
+
+    The returned responses have their body already read, so that the connection is
+    handed back to the pool immediately; await response.json() or response.text()
+    to access the content.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        max_connections: int = 20,
+    ):
+        """
+        Initialize an AsyncRequestsWrapper instance with a token for authentication.
+
+        Args:
+        - token (str): The authentication token to be used for API requests.
+        - max_connections (int): Maximum number of simultaneously open connections.
+        """
+        self.max_connections = max_connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._authorization = f"Bearer {token}"
+
+    @classmethod
+    def from_requests_wrapper(
+        cls,
+        request: RequestsWrapper,
+        max_connections: int = 20,
+    ) -> "AsyncRequestsWrapper":
+        """
+        Create an AsyncRequestsWrapper using the credentials of a RequestsWrapper.
+
+        Args:
+        - request (RequestsWrapper): The synchronous wrapper to take the credentials from.
+        - max_connections (int): Maximum number of simultaneously open connections.
+
+        Returns:
+        - AsyncRequestsWrapper: The new (not yet opened) asynchronous wrapper.
+        """
+        authorization = request.session.headers.get("Authorization", "")
+        return cls(authorization.removeprefix("Bearer "), max_connections)
+
+    async def __aenter__(self) -> "AsyncRequestsWrapper":
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"Authorization": self._authorization},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the session and all pooled connections.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _reset_headers(
+        self,
+        headers: Optional[Dict[str, str]],
+    ) -> Dict[str, str]:
+        """
+        Reset the headers preserving only the 'Authorization' key then merge additional headers
+
+        Args:
+        - headers (dict or None): Additional headers to merge.
+
+        Returns:
+        - dict: Merged headers.
+        """
+        new_headers = {"Authorization": self._authorization}
+        if headers:
+            new_headers.update(headers)
+        return new_headers
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a request and read its body before releasing the connection to the pool.
+
+        Args:
+        - method (str): The HTTP method.
+        - url (str): The URL for the request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object with its body already read.
+        """
+        if self.session is None:
+            raise Exception(
+                "AsyncRequestsWrapper must be used as an async context manager."
+            )
+        headers = self._reset_headers(headers)
+        async with self.session.request(
+            method, url, headers=headers, **kwargs
+        ) as response:
+            await response.read()
+        response.raise_for_status()
+        return response
+
+    async def get(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a GET request using the pooled session.
+
+        Args:
+        - url (str): The URL for the GET request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object from the GET request.
+        """
+        return await self._request("GET", url, headers, **kwargs)
+
+    async def post(
+        self,
+        url: str,
+        data: Optional[Dict[str, Union[str, int]]] = None,
+        json: Optional[Dict[str, Union[str, int]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a POST request using the pooled session.
+
+        Args:
+        - url (str): The URL for the POST request.
+        - data (dict, optional): The body data to send with the request.
+        - json (dict, optional): JSON data to send with the request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object from the POST request.
+        """
+        return await self._request("POST", url, headers, data=data, json=json, **kwargs)
+
+    async def put(
+        self,
+        url: str,
+        data: Optional[Dict[str, Union[str, int]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a PUT request using the pooled session.
+
+        Args:
+        - url (str): The URL for the PUT request.
+        - data (dict, optional): The body data to send with the request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object from the PUT request.
+        """
+        return await self._request("PUT", url, headers, data=data, **kwargs)
+
+    async def delete(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a DELETE request using the pooled session.
+
+        Args:
+        - url (str): The URL for the DELETE request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object from the DELETE request.
+        """
+        return await self._request("DELETE", url, headers, **kwargs)
+
+    async def patch(
+        self,
+        url: str,
+        data: Optional[Dict[str, Union[str, int]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """
+        Perform a PATCH request using the pooled session.
+
+        Args:
+        - url (str): The URL for the PATCH request.
+        - data (dict, optional): The body data to send with the request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - aiohttp.ClientResponse: The response object from the PATCH request.
+        """
+        return await self._request("PATCH", url, headers, data=data, **kwargs)
@@ -0,0 +1,550 @@
+"""
+Local SQLite mirror of the metadata of TeamCity builds.
+
+The builds of a build configuration (number, branch, state, pinned state and tags)
+are mirrored on first use and then synced incrementally: a sync only requests the
+builds since the last finished build already mirrored, so running builds are
+refreshed until they finish. The first sync of a build configuration reaches back
+to a date horizon. Artifact listings are mirrored when first needed, once the
+build is finished, as they cannot change anymore.
+
+Lookups by build configuration, branch and number are answered from indexed
+tables. Tags and pins are added to and removed from old builds, which incremental
+syncs never request again, e.g. through the web UI or by a release run on another
+machine. Lookups by tag or pinned state are therefore answered by the server, in a
+single request for one build, and the build found is mirrored.
+"""
+
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+from artifact_index import ArtifactIndex, get_artifact_index
+from request_wrapper import BUILDS_ROOT, RequestsWrapper
+from teamcity_collection import first_item, iterate_collection
+from teamcity_locator import build_locator, collection_query, locator
+
+HEADERS = {"Accept": "application/json"}
+
+# the fields of a build which are mirrored
+MIRROR_FIELDS = "id,buildTypeId,number,branchName,state,status,pinned,personal,failedToStart,canceledInfo(timestamp),tags(tag(name))"
+
+# format of the dates of TeamCity locators
+SINCE_DATE_FORMAT = "%Y%m%dT%H%M%S%z"
+
+DEFAULT_HORIZON_DAYS = 365
+DEFAULT_SYNC_INTERVAL = 60  # seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    build_type TEXT NOT NULL,
+    branch TEXT,
+    number TEXT,
+    state TEXT,
+    status TEXT,
+    pinned INTEGER NOT NULL,
+    default_filter INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_by_branch ON builds (build_type, branch, id DESC);
+CREATE INDEX IF NOT EXISTS builds_by_number ON builds (build_type, number);
+CREATE TABLE IF NOT EXISTS tags (
+    build_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (build_id, name)
+);
+CREATE INDEX IF NOT EXISTS tags_by_name ON tags (name, build_id);
+CREATE TABLE IF NOT EXISTS artifacts (
+    build_id INTEGER NOT NULL,
+    full_name TEXT NOT NULL,
+    PRIMARY KEY (build_id, full_name)
+);
+CREATE TABLE IF NOT EXISTS artifact_listings (
+    build_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    build_type TEXT PRIMARY KEY,
+    since_build INTEGER,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=True,
+        help="Path of the SQLite mirror of the TeamCity builds.",
+    )
+
+    parser.add_argument(
+        "--build_config_id",
+        type=str,
+        action="append",
+        required=True,
+        help="The id of a build configuration to sync. Can be repeated.",
+    )
+
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Switch for resyncing the build configurations from scratch, which picks up changes made on the server by other means.",
+    )
+
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        required=False,
+        default=DEFAULT_HORIZON_DAYS,
+        help="Number of days of builds mirrored by the first sync of a build configuration.",
+    )
+
+    parser.add_argument(
+        "--teamcity_access_token",
+        type=argparse.FileType("r"),
+        required=True,
+        help="The TeamCity access token to authenticate with.",
+    )
+
+    return parser.parse_args()
+
+
+def passes_default_filter(build: Dict) -> bool:
+    """
+    Whether TeamCity lists a build when the default filter of build locators applies.
+
+    Args:
+    - build (dict): The build, with the mirrored fields.
+
+    Returns:
+    - bool: True if the build is finished and neither canceled, personal nor failed to start.
+    """
+    return (
+        build.get("state") == "finished"
+        and "canceledInfo" not in build
+        and not build.get("personal", False)
+        and not build.get("failedToStart", False)
+    )
+
+
+class BuildMirror:
+    """
+    A SQLite mirror of the metadata of TeamCity builds, safe to use from threads.
+
+    Attributes:
+    - path (Path): The path of the SQLite database.
+    - horizon_days (int): Number of days of builds mirrored by the first sync of a build configuration.
+    - sync_interval (float): Minimum number of seconds between two syncs of a build configuration.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        horizon_days: int = DEFAULT_HORIZON_DAYS,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL,
+    ):
+        """
+        Open the mirror, creating the database if needed.
+
+        Args:
+        - path (Path): The path of the SQLite database.
+        - horizon_days (int): Number of days of builds mirrored by the first sync of a build configuration.
+        - sync_interval (float): Minimum number of seconds between two syncs of a build configuration.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.horizon_days = horizon_days
+        self.sync_interval = sync_interval
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._sync_locks: Dict[str, threading.Lock] = {}
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def _sync_lock(self, build_type: str) -> threading.Lock:
+        """
+        Get the lock serializing the syncs of a build configuration.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+
+        Returns:
+        - threading.Lock: The lock.
+        """
+        with self._lock:
+            return self._sync_locks.setdefault(build_type, threading.Lock())
+
+    def _store_builds(self, builds: Sequence[Dict]) -> None:
+        """
+        Insert or update builds and their tags.
+
+        Args:
+        - builds (list): The builds, with the mirrored fields.
+        """
+        with self._lock, self._connection:
+            for build in builds:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        build["id"],
+                        build["buildTypeId"],
+                        build.get("branchName"),
+                        build.get("number"),
+                        build.get("state"),
+                        build.get("status"),
+                        int(build.get("pinned", False)),
+                        int(passes_default_filter(build)),
+                    ),
+                )
+                self._connection.execute(
+                    "DELETE FROM tags WHERE build_id = ?", (build["id"],)
+                )
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO tags VALUES (?, ?, ?)",
+                    (
+                        (build["id"], position, tag["name"])
+                        for position, tag in enumerate(
+                            build.get("tags", {}).get("tag", [])
+                        )
+                    ),
+                )
+
+    def _get_since_build(self, build_type: str) -> Optional[int]:
+        """
+        Get the id of the build the next sync of a build configuration starts after.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+
+        Returns:
+        - int or None: The id of the build before the first unfinished build, or of
+          the last build if all builds are finished. None if there are no builds.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MAX(id) AS last, MIN(CASE WHEN state != 'finished' THEN id END) AS unfinished"
+                " FROM builds WHERE build_type = ?",
+                (build_type,),
+            ).fetchone()
+        if row["unfinished"] is not None:
+            return row["unfinished"] - 1
+        return row["last"]
+
+    def sync(
+        self, build_type: str, request: RequestsWrapper, full: bool = False
+    ) -> int:
+        """
+        Sync the builds of a build configuration, unless it was synced less than
+        sync_interval seconds ago.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        - full (bool): Whether all builds within the horizon are synced again.
+
+        Returns:
+        - int: The number of builds received.
+        """
+        with self._sync_lock(build_type):
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT since_build, synced_at FROM syncs WHERE build_type = ?",
+                    (build_type,),
+                ).fetchone()
+            if (
+                not full
+                and row is not None
+                and time.time() - row["synced_at"] < self.sync_interval
+            ):
+                return 0
+
+            synced_at = time.time()
+            if full or row is None or row["since_build"] is None:
+                horizon = datetime.now(timezone.utc) - timedelta(days=self.horizon_days)
+                since = {"since_date": horizon.strftime(SINCE_DATE_FORMAT)}
+            else:
+                since = {"since_build": locator(id=row["since_build"])}
+            params = collection_query(
+                "build",
+                MIRROR_FIELDS,
+                locator(
+                    build_type=locator(id=build_type),
+                    branch=locator(default="any"),
+                    default_filter=False,
+                    **since,
+                ),
+            )
+            builds = list(iterate_collection(BUILDS_ROOT, params, "build", request))
+            self._store_builds(builds)
+
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)",
+                    (build_type, self._get_since_build(build_type), synced_at),
+                )
+            return len(builds)
+
+    def refresh_build(self, build_id: int, request: RequestsWrapper) -> None:
+        """
+        Mirror the current state of a build, after it was modified.
+
+        Args:
+        - build_id (int): The id of the build.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        """
+        response = request.get(
+            f"{BUILDS_ROOT}/id:{build_id}",
+            params={"fields": MIRROR_FIELDS},
+            headers=HEADERS,
+            use_cache=False,
+        )
+        self._store_builds([response.json()])
+
+    def get_build(self, build_id: int) -> Optional[Dict]:
+        """
+        Get a mirrored build, shaped as returned by the builds endpoint.
+
+        Args:
+        - build_id (int): The id of the build.
+
+        Returns:
+        - dict or None: The id, number, branch, state, status, pinned state and tags
+          of the build, None if it is not mirrored.
+        """
+        with self._lock:
+            build = self._connection.execute(
+                "SELECT * FROM builds WHERE id = ?", (build_id,)
+            ).fetchone()
+            if build is None:
+                return None
+            tags = [
+                {"name": row["name"]}
+                for row in self._connection.execute(
+                    "SELECT name FROM tags WHERE build_id = ? ORDER BY position",
+                    (build_id,),
+                )
+            ]
+        return {
+            "id": build["id"],
+            "buildTypeId": build["build_type"],
+            "number": build["number"],
+            "branchName": build["branch"],
+            "state": build["state"],
+            "status": build["status"],
+            "pinned": bool(build["pinned"]),
+            "tags": {"count": len(tags), "tag": tags},
+        }
+
+    def iterate_builds(
+        self,
+        build_type: str,
+        branch: str,
+        request: RequestsWrapper,
+    ) -> Iterator[Dict]:
+        """
+        Iterate over the builds of a branch which pass the default filter, most
+        recent first, after syncing the build configuration.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+        - branch (str): The name of the branch.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+
+        Yields:
+        - dict: The builds, shaped as returned by the builds endpoint.
+        """
+        self.sync(build_type, request)
+        with self._lock:
+            build_ids = [
+                row["id"]
+                for row in self._connection.execute(
+                    "SELECT id FROM builds WHERE build_type = ? AND branch = ? AND default_filter = 1"
+                    " ORDER BY id DESC",
+                    (build_type, branch),
+                )
+            ]
+        for build_id in build_ids:
+            yield self.get_build(build_id)
+
+    def find_build(
+        self,
+        build_type: str,
+        branch: str,
+        request: RequestsWrapper,
+        tag: Optional[str] = None,
+        pinned: Optional[bool] = None,
+    ) -> Optional[Dict]:
+        """
+        Get the most recent build of a branch which passes the default filter.
+
+        Builds with a tag or pinned state are looked up on the server, as the mirror
+        misses the tags and pins added to or removed from builds since they were
+        last synced.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+        - branch (str): The name of the branch.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        - tag (str, optional): A tag of the build.
+        - pinned (bool, optional): Whether the build is pinned.
+
+        Returns:
+        - dict or None: The build, None if there is none.
+        """
+        if tag is None and pinned is None:
+            return next(self.iterate_builds(build_type, branch, request), None)
+
+        params = collection_query(
+            "build",
+            MIRROR_FIELDS,
+            build_locator(
+                build_type=build_type,
+                branch=branch,
+                tag=tag,
+                pinned=pinned,
+                count=1,
+            ),
+        )
+        build = first_item(BUILDS_ROOT, params, "build", request)
+        if build is None:
+            return None
+        self._store_builds([build])
+        return self.get_build(build["id"])
+
+    def get_artifacts(self, build: Dict, request: RequestsWrapper) -> ArtifactIndex:
+        """
+        Get the artifacts of a build, mirroring them once it is finished.
+
+        Args:
+        - build (dict): The build.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+
+        Returns:
+        - ArtifactIndex: The index of the artifacts of the build.
+        """
+        build_id = build["id"]
+        with self._lock:
+            listed = self._connection.execute(
+                "SELECT 1 FROM artifact_listings WHERE build_id = ?", (build_id,)
+            ).fetchone()
+            if listed is not None:
+                return ArtifactIndex(
+                    row["full_name"]
+                    for row in self._connection.execute(
+                        "SELECT full_name FROM artifacts WHERE build_id = ?",
+                        (build_id,),
+                    )
+                )
+
+        index = get_artifact_index(build_id, request)
+        if build.get("state") == "finished":
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO artifacts VALUES (?, ?)",
+                    ((build_id, full_name) for full_name in index),
+                )
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO artifact_listings VALUES (?)", (build_id,)
+                )
+        return index
+
+    def find_build_with_artifact(
+        self,
+        build_type: str,
+        branch: str,
+        full_name: str,
+        request: RequestsWrapper,
+    ) -> Optional[Dict]:
+        """
+        Get the most recent build of a branch which has an artifact.
+
+        Args:
+        - build_type (str): The id of the build configuration.
+        - branch (str): The name of the branch.
+        - full_name (str): The path of the artifact relative to the artifacts root,
+          which may be a glob pattern.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+
+        Returns:
+        - dict or None: The build, None if no build has the artifact.
+        """
+        for build in self.iterate_builds(build_type, branch, request):
+            if self.get_artifacts(build, request).glob(full_name):
+                return build
+        return None
+
+
+def create_build_mirror(path: Optional[Path]) -> Optional[BuildMirror]:
+    """
+    Open a BuildMirror at path, or no mirror at all when path is not given.
+
+    Args:
+    - path (Path or None): The path of the SQLite database.
+
+    Returns:
+    - BuildMirror or None: The mirror.
+    """
+    if not path:
+        return None
+    return BuildMirror(path)
+
+
+def run(
+    build_mirror: Path,
+    build_config_ids: Sequence[str],
+    full: bool,
+    horizon_days: int,
+    teamcity_access_token: str,
+) -> None:
+    """
+    Sync build configurations into the mirror.
+
+    Args:
+    - build_mirror (Path): Path of the SQLite mirror of the TeamCity builds.
+    - build_config_ids (list): The ids of the build configurations to sync.
+    - full (bool): Whether all builds within the horizon are synced again.
+    - horizon_days (int): Number of days of builds mirrored by the first sync.
+    - teamcity_access_token (str): The TeamCity access token to authenticate with.
+    """
+    request = RequestsWrapper(teamcity_access_token)
+    mirror = BuildMirror(build_mirror, horizon_days, sync_interval=0)
+    try:
+        for build_config_id in build_config_ids:
+            count = mirror.sync(build_config_id, request, full=full)
+            print(f"Synced {count} builds of {build_config_id}.")
+    finally:
+        mirror.close()
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        run(
+            args.build_mirror,
+            args.build_config_id,
+            args.full,
+            args.horizon,
+            args.teamcity_access_token.read(),
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
@@ -2,7 +2,8 @@ import argparse
 import sys
 from pathlib import Path
 
-from scripts.automation.download_teamcity_artifact import run
+from download_teamcity_artifact import run
+from streaming_download import SHA256SUMS_NAME, write_sha256sums
 from versioning import check_semantic_version
 
 
@@ -43,7 +44,8 @@ def download_python_wheels(
     teamcity_access_token: str,
 ):
     """
-    Downloads python wheels from TeamCity (Windows and Linux wheels only, macOS wheels are built on github).
+    Downloads python wheels from TeamCity (Windows and Linux wheels only, macOS wheels are built on github)
+    and writes their checksums to SHA256SUMS in destination.
 
     Args:
     - version (str): The wheel version.
@@ -59,10 +61,11 @@ def download_python_wheels(
         "Linux": "manylinux_2_17_x86_64.manylinux2014_x86_64",
     }
 
+    results = []
     for platform, arch in build_configs.items():
         artifact = f"meshkernel-{version}-py3-none-{arch}.whl"
         build_config_id = f"GridEditor_MeshKernelPy_{platform}_BuildPythonWheel"
-        run(
+        result = run(
             branch,
             artifact,
             build_config_id,
@@ -70,6 +73,10 @@ def download_python_wheels(
             destination,
             teamcity_access_token,
         )
+        results.append(result)
+
+    # the wheels were hashed while they were downloaded
+    write_sha256sums(results, Path(destination) / SHA256SUMS_NAME)
 
 
 if __name__ == "__main__":
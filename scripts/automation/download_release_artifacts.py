@@ -0,0 +1,619 @@
+"""
+Downloads the release deliverables of one or more products from TeamCity in a
+single process.
+
+The deliverables are the artifacts of the manifest (see release_artifacts.json)
+with a "download" key, which names the subdirectory of the destination they are
+saved in. The tagged builds are looked up first, and the build numbers embedded
+in the artifact names are matched as wildcards against the artifacts of the
+tagged builds, each listed once, so all artifact URLs are resolved up front
+without looking up build numbers. Optionally, the versions of the wheels and
+nupkgs are checked first, reading only their metadata through Range requests,
+so that a wrong build is reported before anything is downloaded. The artifacts
+are then downloaded concurrently and hashed as they stream in. A JSON manifest of
+the downloaded artifacts and a SHA256SUMS file are written.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from artifact_cache import ArtifactCache, create_artifact_cache
+from build_mirror import BuildMirror, create_build_mirror
+from artifact_index import BUILD_NUMBER_GLOB, get_artifact_index, is_glob
+from download_teamcity_artifact import (
+    download_build_artifact,
+    get_artifact_url,
+    get_tagged_build_id,
+    resolve_artifact,
+)
+from http_cache import create_http_cache
+from pin_artifacts import (
+    DEFAULT_MANIFEST,
+    get_artifact_placeholders,
+    get_artifacts,
+    load_manifest,
+)
+from remote_zip import get_remote_package_version, is_package, matches_release_version
+from request_wrapper import RequestsWrapper
+from streaming_download import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MAX_CHUNK_SIZE,
+    MIB,
+    SHA256SUMS_NAME,
+    DownloadResult,
+    write_sha256sums,
+)
+
+DOWNLOAD_MANIFEST_NAME = "downloaded_artifacts.json"
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        required=False,
+        default=DEFAULT_MANIFEST,
+        help="Path to the manifest describing the artifacts of each product.",
+    )
+
+    parser.add_argument(
+        "--product",
+        type=str,
+        action="append",
+        required=False,
+        help="A product of the manifest whose deliverables are downloaded. Can be repeated. If not specified, the deliverables of all products are downloaded.",
+    )
+
+    parser.add_argument(
+        "--branch_name",
+        type=str,
+        required=True,
+        help="The branch name.",
+    )
+
+    parser.add_argument(
+        "--version",
+        type=str,
+        required=True,
+        help="The release version.",
+    )
+
+    parser.add_argument(
+        "--tag",
+        type=str,
+        required=True,
+        help="The tag the builds of the artifacts are pinned with.",
+    )
+
+    parser.add_argument(
+        "--forked_repo_suffix",
+        type=str,
+        required=False,
+        default="",
+        help="Suffix of the build configuration ids of forked repositories.",
+    )
+
+    parser.add_argument(
+        "--destination",
+        type=Path,
+        required=True,
+        help="Directory where the artifacts are saved, each in the subdirectory named by the manifest.",
+    )
+
+    parser.add_argument(
+        "--download_manifest",
+        type=Path,
+        required=False,
+        default=None,
+        help=f"Path of the JSON manifest of the downloaded artifacts. If not specified, {DOWNLOAD_MANIFEST_NAME} in the destination directory.",
+    )
+
+    parser.add_argument(
+        "--sha256sums",
+        type=Path,
+        required=False,
+        default=None,
+        help=f"Path of the checksums of the downloaded artifacts. If not specified, {SHA256SUMS_NAME} in the destination directory.",
+    )
+
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        required=False,
+        default=4,
+        help="Maximum number of artifacts downloaded concurrently.",
+    )
+
+    parser.add_argument(
+        "--teamcity_access_token",
+        type=argparse.FileType("r"),
+        required=True,
+        help="The TeamCity access token to authenticate with.",
+    )
+
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--artifact_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the content-addressed artifact cache. If not specified, artifacts are not cached.",
+    )
+
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        required=False,
+        default=DEFAULT_CHUNK_SIZE // MIB,
+        help="Initial size in MiB of the chunks read from the network. Adapted to the throughput.",
+    )
+
+    parser.add_argument(
+        "--max_chunk_size",
+        type=int,
+        required=False,
+        default=DEFAULT_MAX_CHUNK_SIZE // MIB,
+        help="Maximum size in MiB of the chunks read from the network, which bounds memory use.",
+    )
+
+    parser.add_argument(
+        "--segments",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of byte ranges of each artifact downloaded concurrently.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
+    parser.add_argument(
+        "--verify_versions",
+        action="store_true",
+        help="Switch for checking the versions of the wheels and nupkgs on the server before downloading them, which reads only their metadata.",
+    )
+
+    return parser.parse_args()
+
+
+def resolve_release_artifacts(
+    manifest: Dict,
+    products: Optional[Sequence[str]],
+    branch_name: str,
+    version: str,
+    tag: str,
+    forked_repo_suffix: str,
+    request: RequestsWrapper,
+    executor: ThreadPoolExecutor,
+    mirror: Optional[BuildMirror] = None,
+) -> List[Dict]:
+    """
+    Resolve the names and URLs of the deliverables of the specified products.
+
+    Args:
+        manifest : dict
+            The release artifacts manifest.
+        products : list or None
+            The products whose deliverables are resolved, all products if None.
+        branch_name : str
+            The name of the branch.
+        version : str
+            The release version.
+        tag : str
+            The tag the builds of the artifacts are pinned with.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        executor : ThreadPoolExecutor
+            The executor the lookups are run in concurrently.
+        mirror : BuildMirror, optional
+            The mirror the builds are looked up in, the server if not provided.
+
+    Returns:
+        list
+            The deliverables in manifest order, with their expanded path and name,
+            the id of the tagged build and the download URL.
+    """
+    artifacts = [
+        artifact
+        for artifact in get_artifacts(manifest, products, forked_repo_suffix)
+        if artifact["download"]
+    ]
+
+    needed = set().union(*(get_artifact_placeholders(x) for x in artifacts))
+    unknown = needed - set(manifest["build_numbers"])
+    if unknown:
+        raise Exception(f"Unknown build numbers {sorted(unknown)} in manifest.")
+
+    # build numbers are matched against the artifacts of the tagged builds
+    substitutions = {"version": version, "suffix": forked_repo_suffix}
+    substitutions.update({name: BUILD_NUMBER_GLOB for name in needed})
+    artifacts = [
+        {
+            **artifact,
+            "artifact_path": artifact["artifact_path"].format(**substitutions),
+            "artifact_name": artifact["artifact_name"].format(**substitutions),
+        }
+        for artifact in artifacts
+    ]
+
+    build_id_lookups = {
+        build_config_id: executor.submit(
+            get_tagged_build_id, branch_name, build_config_id, tag, request, mirror
+        )
+        for build_config_id in {x["build_config_id"] for x in artifacts}
+    }
+    build_ids = {
+        build_config_id: lookup.result()
+        for build_config_id, lookup in build_id_lookups.items()
+    }
+
+    # the artifacts of each tagged build are listed once, if any name is a pattern
+    listings = {
+        build_config_id: executor.submit(
+            get_artifact_index, build_ids[build_config_id], request
+        )
+        for build_config_id in {
+            x["build_config_id"]
+            for x in artifacts
+            if is_glob(x["artifact_path"]) or is_glob(x["artifact_name"])
+        }
+    }
+
+    resolved = []
+    for artifact in artifacts:
+        build_config_id = artifact["build_config_id"]
+        build_id = build_ids[build_config_id]
+        artifact_path, artifact_name = resolve_artifact(
+            build_id,
+            artifact["artifact_path"],
+            artifact["artifact_name"],
+            request,
+            listings[build_config_id].result() if build_config_id in listings else None,
+        )
+        resolved.append(
+            {
+                **artifact,
+                "artifact_path": artifact_path,
+                "artifact_name": artifact_name,
+                "build_id": build_id,
+                "url": get_artifact_url(
+                    build_config_id, build_id, artifact_path, artifact_name
+                ),
+            }
+        )
+    return resolved
+
+
+def verify_release_versions(
+    artifacts: Sequence[Dict],
+    version: str,
+    request: RequestsWrapper,
+    executor: ThreadPoolExecutor,
+) -> None:
+    """
+    Check that the wheels and nupkgs among the deliverables carry the release
+    version, reading their metadata on the server concurrently.
+
+    Args:
+        artifacts : list
+            The deliverables as returned by resolve_release_artifacts.
+        version : str
+            The release version.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        executor : ThreadPoolExecutor
+            The executor the checks are run in concurrently.
+
+    Raises:
+        Exception
+            If a package does not carry the release version.
+    """
+    packages = [x for x in artifacts if is_package(x["artifact_name"])]
+    package_versions = executor.map(
+        lambda artifact: get_remote_package_version(
+            artifact["url"], artifact["artifact_name"], request
+        ),
+        packages,
+    )
+    mismatches = [
+        f"{artifact['artifact_name']} (build {artifact['build_id']}) has version {package_version}"
+        for artifact, package_version in zip(packages, package_versions)
+        if not matches_release_version(package_version, version)
+    ]
+    if mismatches:
+        raise Exception(
+            f"Packages not at release version {version}: {'; '.join(mismatches)}."
+        )
+    print(f"Versions of {len(packages)} packages verified.")
+
+
+def download_release_artifacts(
+    manifest: Dict,
+    products: Optional[Sequence[str]],
+    branch_name: str,
+    version: str,
+    tag: str,
+    forked_repo_suffix: str,
+    destination: Path,
+    request: RequestsWrapper,
+    max_workers: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    segments: int = 1,
+    artifact_cache: Optional[ArtifactCache] = None,
+    mirror: Optional[BuildMirror] = None,
+    verify_versions: bool = False,
+) -> List[Dict]:
+    """
+    Download the deliverables of the specified products concurrently.
+
+    Args:
+        manifest : dict
+            The release artifacts manifest.
+        products : list or None
+            The products whose deliverables are downloaded, all products if None.
+        branch_name : str
+            The name of the branch.
+        version : str
+            The release version.
+        tag : str
+            The tag the builds of the artifacts are pinned with.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+        destination : Path
+            Directory where the artifacts are saved, each in the subdirectory named
+            by the manifest.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        max_workers : int
+            Maximum number of artifacts downloaded concurrently.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        segments : int
+            The number of byte ranges of each artifact downloaded concurrently.
+        artifact_cache : ArtifactCache, optional
+            The cache the artifacts are taken from if present, and added to otherwise.
+        mirror : BuildMirror, optional
+            The mirror the builds are looked up in, the server if not provided.
+        verify_versions : bool
+            Whether the versions of the packages are checked before downloading.
+
+    Returns:
+        list
+            One entry per deliverable, in manifest order.
+    """
+    Path(destination).mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        artifacts = resolve_release_artifacts(
+            manifest,
+            products,
+            branch_name,
+            version,
+            tag,
+            forked_repo_suffix,
+            request,
+            executor,
+            mirror,
+        )
+        if verify_versions:
+            verify_release_versions(artifacts, version, request, executor)
+
+        def download(artifact: Dict) -> Dict:
+            directory = Path(destination) / artifact["download"]
+            directory.mkdir(parents=True, exist_ok=True)
+            try:
+                result = download_build_artifact(
+                    artifact["build_config_id"],
+                    artifact["build_id"],
+                    artifact["artifact_name"],
+                    directory,
+                    request,
+                    artifact_path=artifact["artifact_path"],
+                    chunk_size=chunk_size,
+                    max_chunk_size=max_chunk_size,
+                    segments=segments,
+                    artifact_cache=artifact_cache,
+                )
+            except Exception as error:
+                logging.warning(
+                    f"Could not download artifact '{artifact['artifact_name']}': {error}"
+                )
+                return summarize(artifact, None, str(error))
+            return summarize(artifact, result)
+
+        return list(executor.map(download, artifacts))
+
+
+def summarize(
+    artifact: Dict,
+    result: Optional[DownloadResult],
+    error: Optional[str] = None,
+) -> Dict:
+    """
+    Get the download manifest entry of an artifact.
+
+    Args:
+        artifact : dict
+            A deliverable as returned by resolve_release_artifacts.
+        result : DownloadResult or None
+            Where the artifact landed, None if it was not downloaded.
+        error : str, optional
+            Why the artifact was not downloaded.
+    """
+    return {
+        "product": artifact["product"],
+        "build_config_id": artifact["build_config_id"],
+        "build_id": artifact["build_id"],
+        "artifact_path": artifact["artifact_path"],
+        "artifact_name": artifact["artifact_name"],
+        "url": artifact["url"],
+        "downloaded": result is not None,
+        "path": str(result.path) if result else None,
+        "size": result.size if result else None,
+        "sha256": result.sha256 if result else None,
+        "error": error,
+    }
+
+
+def run(
+    manifest_file: Path,
+    products: Optional[Sequence[str]],
+    branch_name: str,
+    version: str,
+    tag: str,
+    forked_repo_suffix: str,
+    destination: Path,
+    download_manifest: Optional[Path],
+    sha256sums: Optional[Path],
+    max_workers: int,
+    teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+    artifact_cache_dir: Optional[Path] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    segments: int = 1,
+    build_mirror: Optional[Path] = None,
+    verify_versions: bool = False,
+    request: Optional[RequestsWrapper] = None,
+    mirror: Optional[BuildMirror] = None,
+) -> List[Dict]:
+    """
+    Runs the script with the specified parameters.
+
+    Args:
+        manifest_file : Path
+            Path to the manifest describing the artifacts of each product.
+        products : list or None
+            The products whose deliverables are downloaded, all products if None.
+        branch_name : str
+            The name of the branch.
+        version : str
+            The release version.
+        tag : str
+            The tag the builds of the artifacts are pinned with.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+        destination : Path
+            Directory where the artifacts are saved.
+        download_manifest : Path or None
+            Path of the JSON manifest of the downloaded artifacts.
+        sha256sums : Path or None
+            Path of the checksums of the downloaded artifacts.
+        max_workers : int
+            Maximum number of artifacts downloaded concurrently.
+        teamcity_access_token : str
+            The TeamCity access token to authenticate with.
+        http_cache_dir : Path, optional
+            Directory of the persistent TeamCity response cache.
+        artifact_cache_dir : Path, optional
+            Directory of the content-addressed artifact cache.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        segments : int
+            The number of byte ranges of each artifact downloaded concurrently.
+        build_mirror : Path, optional
+            Path of the SQLite mirror of the TeamCity builds.
+        verify_versions : bool
+            Whether the versions of the packages are checked before downloading.
+        request : RequestsWrapper, optional
+            An authenticated request wrapper to reuse, created from the token otherwise.
+        mirror : BuildMirror, optional
+            An open build mirror to reuse, opened from build_mirror otherwise.
+    """
+    if request is None:
+        request = RequestsWrapper(
+            teamcity_access_token, create_http_cache(http_cache_dir)
+        )
+    if mirror is None:
+        mirror = create_build_mirror(build_mirror)
+    downloads = download_release_artifacts(
+        load_manifest(manifest_file),
+        products,
+        branch_name,
+        version,
+        tag,
+        forked_repo_suffix,
+        destination,
+        request,
+        max_workers,
+        chunk_size,
+        max_chunk_size,
+        segments,
+        create_artifact_cache(artifact_cache_dir),
+        mirror,
+        verify_versions,
+    )
+
+    download_manifest = download_manifest or Path(destination) / DOWNLOAD_MANIFEST_NAME
+    with open(download_manifest, "w") as file:
+        json.dump(downloads, file, indent=4)
+    print(json.dumps(downloads, indent=4))
+
+    write_sha256sums(
+        [
+            DownloadResult(Path(x["path"]), x["size"], x["sha256"])
+            for x in downloads
+            if x["downloaded"]
+        ],
+        sha256sums or Path(destination) / SHA256SUMS_NAME,
+    )
+
+    failed = [x["artifact_name"] for x in downloads if not x["downloaded"]]
+    if failed:
+        raise Exception(f"Failed to download {failed}.")
+    return downloads
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        run(
+            args.manifest,
+            args.product,
+            args.branch_name,
+            args.version,
+            args.tag,
+            args.forked_repo_suffix,
+            args.destination,
+            args.download_manifest,
+            args.sha256sums,
+            args.max_workers,
+            args.teamcity_access_token.read(),
+            args.http_cache_dir,
+            args.artifact_cache_dir,
+            args.chunk_size * MIB,
+            args.max_chunk_size * MIB,
+            args.segments,
+            args.build_mirror,
+            args.verify_versions,
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
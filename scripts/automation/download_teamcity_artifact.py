@@ -1,9 +1,30 @@
 import argparse
-import os
 import sys
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from typing import Optional, Tuple
 
+import requests
+
+from artifact_cache import ArtifactCache, create_artifact_cache
+from artifact_index import (
+    ARCHIVE_MEMBER_SEPARATOR,
+    ArtifactIndex,
+    get_artifact_index,
+    is_glob,
+    split_archive_member,
+)
+from build_mirror import BuildMirror, create_build_mirror
+from http_cache import create_http_cache
+from remote_zip import RemoteZip
 from request_wrapper import BUILDS_ROOT, DOWNLOADS_ROOT, RequestsWrapper
+from streaming_download import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MAX_CHUNK_SIZE,
+    MIB,
+    DownloadResult,
+    download_file,
+)
+from teamcity_locator import build_locator, collection_query
 
 
 def parse_arguments():
@@ -23,7 +44,7 @@ def parse_arguments():
         "--artifact_name",
         type=str,
         required=True,
-        help="The name of the artifact to download.",
+        help="The name of the artifact to download. Can be a glob pattern, e.g. Deltares.MeshKernel.*.nupkg, which must match a single artifact of the build. A member of an archived artifact is addressed as archive.zip!/path/of/member.",
     )
 
     parser.add_argument(
@@ -63,22 +84,94 @@ def parse_arguments():
         help="The TeamCity access token to authenticate with.",
     )
 
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        required=False,
+        default=DEFAULT_CHUNK_SIZE // MIB,
+        help="Initial size in MiB of the chunks read from the network. Adapted to the throughput.",
+    )
+
+    parser.add_argument(
+        "--max_chunk_size",
+        type=int,
+        required=False,
+        default=DEFAULT_MAX_CHUNK_SIZE // MIB,
+        help="Maximum size in MiB of the chunks read from the network, which bounds memory use.",
+    )
+
+    parser.add_argument(
+        "--segments",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of byte ranges of the artifact downloaded concurrently. Falls back to a single stream if the server does not support Range requests.",
+    )
+
+    parser.add_argument(
+        "--artifact_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the content-addressed artifact cache. If not specified, artifacts are not cached.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
     return parser.parse_args()
 
 
-def download_teamcity_artifact(
+def get_tagged_build_id(
     branch_name: str,
-    artifact_name: str,
     build_config_id: str,
     tag: str,
-    destination: Path,
     request: RequestsWrapper,
-    artifact_path: str = "",
-):
-    # Get the build ID
-    params = {
-        "locator": f"branch:{branch_name},buildType:{build_config_id},tags:{tag},count:1"
-    }
+    mirror: Optional[BuildMirror] = None,
+) -> int:
+    """
+    Get the id of the build of a build configuration tagged with tag.
+
+    Args:
+        branch_name: str
+            The name of the branch.
+        build_config_id : str
+            The id of the build configuration on TeamCity.
+        tag : str
+            The tag of the build.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        mirror : BuildMirror, optional
+            The mirror the build is looked up in, the server if not provided.
+
+    Returns:
+        int
+            The id of the tagged build.
+    """
+    if mirror is not None:
+        build = mirror.find_build(build_config_id, branch_name, request, tag=tag)
+        if build is None:
+            raise Exception(f"No build of {build_config_id} tagged with {tag} found.")
+        return build["id"]
+
+    params = collection_query(
+        "build",
+        "id",
+        build_locator(build_type=build_config_id, branch=branch_name, tag=tag, count=1),
+    )
 
     headers = {"Accept": "application/json"}
 
@@ -88,25 +181,295 @@ def download_teamcity_artifact(
         raise Exception(f"Failed to get build ID: {response.text}")
 
     builds = response.json().get("build", [])
+    if not builds:
+        raise Exception(f"No build of {build_config_id} tagged with {tag} found.")
+
+    return builds[0]["id"]
 
-    build_id = builds[0]["id"]
 
-    # Download the artifact
+def get_artifact_url(
+    build_config_id: str,
+    build_id: int,
+    artifact_path: str,
+    artifact_name: str,
+) -> str:
+    """
+    Get the download URL of an artifact addressed by build id.
+
+    Args:
+        build_config_id : str
+            The id of the build configuration on TeamCity that publishes the artifact.
+        build_id : int
+            The id of the build.
+        artifact_path : str
+            The path of the artifact.
+        artifact_name : str
+            The name of the artifact.
+    """
     artifact_url = f"{DOWNLOADS_ROOT}/{build_config_id}/{build_id}:id"
     if artifact_path:
         artifact_url = f"{artifact_url}/{artifact_path}"
-    artifact_url = f"{artifact_url}/{artifact_name}"
+    return f"{artifact_url}/{artifact_name}"
+
+
+def resolve_artifact(
+    build_id: int,
+    artifact_path: str,
+    artifact_name: str,
+    request: RequestsWrapper,
+    artifacts: Optional[ArtifactIndex] = None,
+) -> Tuple[str, str]:
+    """
+    Resolve the path and name of an artifact of a build given by glob patterns.
+
+    Args:
+        build_id : int
+            The id of the build.
+        artifact_path : str
+            The path of the artifact, which may be a glob pattern.
+        artifact_name : str
+            The name of the artifact, which may be a glob pattern. Of a member of an
+            archived artifact, only the name of the archive.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        artifacts : ArtifactIndex, optional
+            The artifacts of the build, listed if needed and not provided.
 
-    response = request.get(artifact_url, headers=headers)
+    Returns:
+        tuple
+            The path and name of the artifact, as given if they are not patterns.
+    """
+    artifact_name, member = split_archive_member(artifact_name)
+    if member:
+        artifact_path, artifact_name = resolve_artifact(
+            build_id, artifact_path, artifact_name, request, artifacts
+        )
+        return artifact_path, f"{artifact_name}{ARCHIVE_MEMBER_SEPARATOR}{member}"
+    if not is_glob(artifact_path) and not is_glob(artifact_name):
+        return artifact_path, artifact_name
+    if artifacts is None:
+        artifacts = get_artifact_index(build_id, request)
+    full_name = artifacts.find(artifact_path, artifact_name)
+    if full_name is None:
+        raise Exception(
+            f"No artifact of build {build_id} matches '{artifact_name}' in '{artifact_path}'."
+        )
+    artifact_path, _, artifact_name = full_name.rpartition("/")
+    return artifact_path, artifact_name
 
-    # Write artifact to destination
-    path = os.path.join(destination, artifact_name)
-    with open(path, "wb") as artifact:
-        for chunk in response.iter_content(chunk_size=256):
-            artifact.write(chunk)
+
+def download_archive_member(
+    archive_url: str,
+    member: str,
+    path: Path,
+    request: RequestsWrapper,
+    segments: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    build_id: Optional[str] = None,
+) -> DownloadResult:
+    """
+    Download a member of an archived artifact, streaming it to path.
+
+    TeamCity extracts the member itself when it is addressed as archive.zip!/member.
+    For servers which do not, the member is extracted locally from the archive,
+    of which only the central directory and the member are fetched.
+
+    Args:
+        archive_url : str
+            The download URL of the archive.
+        member : str
+            The path of the member inside the archive.
+        path : Path
+            The destination file.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        segments : int
+            The number of byte ranges of the member downloaded concurrently.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        build_id : str, optional
+            The id of the build, against which a partial download is validated.
+
+    Returns:
+        DownloadResult
+            The path, size and sha256 of the downloaded member.
+    """
+    try:
+        return download_file(
+            f"{archive_url}{ARCHIVE_MEMBER_SEPARATOR}{member}",
+            path,
+            request,
+            segments,
+            chunk_size,
+            max_chunk_size,
+            build_id=build_id,
+        )
+    except requests.HTTPError as error:
+        print(f"Server-side extraction of {member} failed ({error}), reading archive.")
+
+    with RemoteZip(archive_url, request, block_size=max_chunk_size) as archive:
+        return archive.extract(member, path, chunk_size)
+
+
+def download_build_artifact(
+    build_config_id: str,
+    build_id: int,
+    artifact_name: str,
+    destination: Path,
+    request: RequestsWrapper,
+    artifact_path: str = "",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    segments: int = 1,
+    artifact_cache: Optional[ArtifactCache] = None,
+) -> DownloadResult:
+    """
+    Download an artifact of a build, streaming it to destination.
+
+    Args:
+        build_config_id : str
+            The id of the build configuration on TeamCity that publishes the specified artifact.
+        build_id : int
+            The id of the build.
+        artifact_name : str
+            The name of the artifact to download, or archive.zip!/member for a member
+            of an archived artifact.
+        destination : Path
+            The directory where the artifact is saved.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        artifact_path : str
+            The path of the artifact to download.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        segments : int
+            The number of byte ranges of the artifact downloaded concurrently.
+        artifact_cache : ArtifactCache, optional
+            The cache the artifact is taken from if present, and added to otherwise.
+
+    Returns:
+        DownloadResult
+            The path, size and sha256 of the downloaded artifact.
+    """
+    archive_name, member = split_archive_member(artifact_name)
+    artifact_url = get_artifact_url(
+        build_config_id, build_id, artifact_path, archive_name
+    )
+
+    # a member is saved under its own file name
+    path = Path(destination) / PurePosixPath(member or artifact_name).name
+    artifact = f"{artifact_path}/{artifact_name}" if artifact_path else artifact_name
+
+    # Artifacts addressed by build id are immutable, so a cached copy can be reused
+    if artifact_cache is not None:
+        entry = artifact_cache.fetch(build_config_id, str(build_id), artifact, path)
+        if entry is not None:
+            print(f"Artifact {artifact_name} restored from cache to {destination}")
+            return DownloadResult(path, entry["size"], entry["sha256"])
+
+    # Stream the artifact to destination
+    if member:
+        result = download_archive_member(
+            artifact_url,
+            member,
+            path,
+            request,
+            segments,
+            chunk_size,
+            max_chunk_size,
+            build_id=str(build_id),
+        )
+    else:
+        result = download_file(
+            artifact_url,
+            path,
+            request,
+            segments,
+            chunk_size,
+            max_chunk_size,
+            build_id=str(build_id),
+        )
+
+    if artifact_cache is not None:
+        artifact_cache.store(
+            build_config_id, str(build_id), artifact, path, result.sha256
+        )
 
     print(f"Artifact {artifact_name} downloaded successfully to {destination}")
 
+    return result
+
+
+def download_teamcity_artifact(
+    branch_name: str,
+    artifact_name: str,
+    build_config_id: str,
+    tag: str,
+    destination: Path,
+    request: RequestsWrapper,
+    artifact_path: str = "",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    segments: int = 1,
+    artifact_cache: Optional[ArtifactCache] = None,
+    mirror: Optional[BuildMirror] = None,
+) -> DownloadResult:
+    """
+    Download an artifact of the build tagged with tag, streaming it to destination.
+
+    Args:
+        branch_name: str
+            The name of the branch.
+        artifact_name : str
+            The name of the artifact to download, which may be a glob pattern.
+        build_config_id : str
+            The id of the build configuration on TeamCity that publishes the specified artifact.
+        tag : str
+            The tag of the build of the specified artifact.
+        destination : Path
+            The directory where the artifact is saved.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        artifact_path : str
+            The path of the artifact to download.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        segments : int
+            The number of byte ranges of the artifact downloaded concurrently.
+        artifact_cache : ArtifactCache, optional
+            The cache the artifact is taken from if present, and added to otherwise.
+        mirror : BuildMirror, optional
+            The mirror the tagged build is looked up in, the server if not provided.
+
+    Returns:
+        DownloadResult
+            The path, size and sha256 of the downloaded artifact.
+    """
+    build_id = get_tagged_build_id(branch_name, build_config_id, tag, request, mirror)
+    artifact_path, artifact_name = resolve_artifact(
+        build_id, artifact_path, artifact_name, request
+    )
+
+    return download_build_artifact(
+        build_config_id,
+        build_id,
+        artifact_name,
+        destination,
+        request,
+        artifact_path=artifact_path,
+        chunk_size=chunk_size,
+        max_chunk_size=max_chunk_size,
+        segments=segments,
+        artifact_cache=artifact_cache,
+    )
+
 
 def run(
     branch_name: str,
@@ -116,7 +479,13 @@ def run(
     destination: Path,
     teamcity_access_token: str,
     artifact_path: str = "",
-):
+    http_cache_dir: Optional[Path] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    segments: int = 1,
+    artifact_cache_dir: Optional[Path] = None,
+    build_mirror: Optional[Path] = None,
+) -> DownloadResult:
     """
     Runs the script with the specified parameters.
 
@@ -131,9 +500,21 @@ def run(
             The tag to pin the build of the specified artifact with.
         teamcity_access_token : str
             The TeamCity access token to authenticate with.
+        http_cache_dir : Path, optional
+            Directory of the persistent TeamCity response cache.
+        chunk_size : int
+            The initial size in bytes of the chunks read from the network.
+        max_chunk_size : int
+            The maximum size in bytes of the chunks read from the network.
+        segments : int
+            The number of byte ranges of the artifact downloaded concurrently.
+        artifact_cache_dir : Path, optional
+            Directory of the content-addressed artifact cache.
+        build_mirror : Path, optional
+            Path of the SQLite mirror of the TeamCity builds.
     """
-    request = RequestsWrapper(teamcity_access_token)
-    download_teamcity_artifact(
+    request = RequestsWrapper(teamcity_access_token, create_http_cache(http_cache_dir))
+    return download_teamcity_artifact(
         branch_name,
         artifact_name,
         build_config_id,
@@ -141,6 +522,11 @@ def run(
         destination,
         request,
         artifact_path=artifact_path,
+        chunk_size=chunk_size,
+        max_chunk_size=max_chunk_size,
+        segments=segments,
+        artifact_cache=create_artifact_cache(artifact_cache_dir),
+        mirror=create_build_mirror(build_mirror),
     )
 
 
@@ -155,6 +541,12 @@ if __name__ == "__main__":
             args.destination,
             args.teamcity_access_token.read(),
             args.artifact_path,
+            args.http_cache_dir,
+            args.chunk_size * MIB,
+            args.max_chunk_size * MIB,
+            args.segments,
+            args.artifact_cache_dir,
+            args.build_mirror,
         )
     except Exception as error:
         print("Error:", error, file=sys.stderr)
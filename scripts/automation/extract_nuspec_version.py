@@ -2,6 +2,7 @@ import argparse
 import sys
 import xml.etree.ElementTree as ET
 from pathlib import Path
+from typing import BinaryIO, Union
 
 
 def get_path() -> Path:
@@ -42,6 +43,18 @@ def extract_nuspec_version(file: Path) -> str:
     if not is_nuspec_file(file):
         raise Exception(str(file) + " is not a nuspec file.")
 
+    return parse_nuspec_version(file)
+
+
+def parse_nuspec_version(file: Union[Path, BinaryIO]) -> str:
+    """
+    Get the nuspec version by parsing nuspec XML
+    Args:
+    - file (Path or file object): path to the nuspec file, or the nuspec file opened in binary mode.
+
+    Returns:
+    - str: The version of the nuspec metadata.
+    """
     # Parse the XML file
     tree = ET.parse(file)
 
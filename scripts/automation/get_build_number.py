@@ -1,7 +1,13 @@
 import argparse
 import sys
+from pathlib import Path
+from typing import Optional
 
+from build_mirror import BuildMirror, create_build_mirror
+from http_cache import create_http_cache
 from request_wrapper import BUILDS_ROOT, RequestsWrapper
+from teamcity_collection import first_item
+from teamcity_locator import build_locator, collection_query
 
 
 def parse_args():
@@ -37,36 +43,108 @@ def parse_args():
         help="The TeamCity access token to authenticate with.",
     )
 
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
     args = parser.parse_args()
 
     return args
 
 
-def get_build_counter(
+def parse_build_counter(build_number: str) -> str:
+    """
+    Get the build counter from a TeamCity build number.
+
+    Args:
+    - build_number (str): The build number, formatted as: build_counter + short_git_hash
+
+    Returns:
+    - str: The build counter.
+    """
+    return build_number.split("+")[0].strip()
+
+
+def find_build_counter(
     build_config_id: str,
     version: str,
     last_successful_build: bool,
-    teamcity_access_token: str,
-):
+    request: RequestsWrapper,
+    mirror: Optional[BuildMirror] = None,
+) -> str:
+    """
+    Get the counter of the tagged (or last) build of the release branch of version.
+
+    Args:
+    - build_config_id (str): The build configuration ID.
+    - version (str): The release version.
+    - last_successful_build (bool): Whether to ignore the tag and get the last build.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - mirror (BuildMirror, optional): The mirror the build is looked up in, the server if not provided.
+
+    Returns:
+    - str: The build counter.
+    """
     tag = f"v{version}"
     branch_name = f"release/{tag}"
-    url = f"{BUILDS_ROOT}?locator=buildType:{build_config_id},branch:{branch_name}"
-    if not last_successful_build:
-        url = f"{url},tag:{tag}"
-    request = RequestsWrapper(teamcity_access_token)
-    headers = {"Accept": "application/json"}
-    response = request.get(url, headers=headers)
-    builds = response.json()["build"]
-    if builds:
-        build_counter = builds[0]["number"]
-        # build number in TC is formatted as: build_counter + short_git_hash
-        return build_counter.split("+")[0].strip()
+    if mirror is not None:
+        build = mirror.find_build(
+            build_config_id,
+            branch_name,
+            request,
+            tag=None if last_successful_build else tag,
+        )
+    else:
+        # only the latest matching build is needed, further pages are never requested
+        params = collection_query(
+            "build",
+            "number",
+            build_locator(
+                build_type=build_config_id,
+                branch=branch_name,
+                tag=None if last_successful_build else tag,
+                count=1,
+            ),
+        )
+        build = first_item(BUILDS_ROOT, params, "build", request)
+    if build:
+        return parse_build_counter(build["number"])
     else:
         raise Exception(
             f"No builds found matching the criteria [buildType: {build_config_id}, branch: {branch_name}, tag: {tag}]."
         )
 
 
+def get_build_counter(
+    build_config_id: str,
+    version: str,
+    last_successful_build: bool,
+    teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+    build_mirror: Optional[Path] = None,
+):
+    request = RequestsWrapper(teamcity_access_token, create_http_cache(http_cache_dir))
+    return find_build_counter(
+        build_config_id,
+        version,
+        last_successful_build,
+        request,
+        create_build_mirror(build_mirror),
+    )
+
+
 if __name__ == "__main__":
     try:
         args = parse_args()
@@ -75,6 +153,8 @@ if __name__ == "__main__":
             args.version,
             args.last_successful_build,
             args.teamcity_access_token.read(),
+            args.http_cache_dir,
+            args.build_mirror,
         )
         if build_counter:
             print(build_counter)
@@ -14,3 +14,7 @@ declare -g repo_name_MeshKernelNET="MeshKernelNET${forked_repo_suffix}"
 declare -g repo_name_GridEditorPlugin="Grid_Editor_plugin${forked_repo_suffix}"
 
 declare -g conda_env_name="meshkernel_release"
+
+# build configurations paused by the release, resumed once it completes (outside
+# the work directory, so that a failed release can be resumed by the next run)
+declare -g teamcity_pause_snapshot_file="${HOME}/.meshkernel_release/paused_teamcity_build_configs.json"
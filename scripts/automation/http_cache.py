@@ -0,0 +1,343 @@
+"""
+Persistent on-disk cache for TeamCity REST GET responses.
+
+Entries are keyed by URL, query parameters and Accept header. Entries of
+immutable resources (details and artifact listings of finished builds) are served
+without contacting the server. All other entries are revalidated with
+If-None-Match/If-Modified-Since and discarded once they are older than the TTL. The
+total size of the cache is bounded, the least recently used entries being evicted
+first.
+
+Streamed responses bypass the cache. Artifact downloads are streamed, and the
+downloaded artifacts are cached by the artifact cache instead.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from json_codec import JsonResponse
+
+BUILD_DETAILS_PATTERN = re.compile(r"/app/rest/builds/(?:id:)?(\d+)/?$")
+BUILD_ARTIFACTS_PATTERN = re.compile(r"/app/rest/builds/(?:id:)?(\d+)/artifacts(?:/|$)")
+BUILD_PATTERN = re.compile(r"/app/rest/builds/(?:id:)?(\d+)(?:/|$)")
+
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def url_path(url: str) -> str:
+    """
+    Get the path of a URL, which the build patterns are matched against.
+
+    Args:
+    - url (str): The URL, possibly with a query string, e.g. ?fields=...
+
+    Returns:
+    - str: The path of the URL.
+    """
+    return urlparse(url).path
+
+
+class HttpCache:
+    """
+    A size-bounded LRU cache of GET responses stored in a directory.
+
+    Attributes:
+    - directory (Path): The directory holding the cache entries.
+    - ttl (float): Maximum age in seconds of entries of mutable resources.
+    - max_bytes (int): Maximum total size of the cached response bodies.
+
+    Methods:
+    - key(url: str, params: dict, accept: str) -> str: Compute the key of a request.
+    - lookup(key: str) -> dict: Get the metadata of a cached entry.
+    - is_fresh(meta: dict) -> bool: Whether an entry can be served without revalidation.
+    - validators(meta: dict) -> dict: Conditional request headers for an entry.
+    - to_response(key: str, meta: dict) -> JsonResponse: Rebuild a response from an entry, if not evicted.
+    - store(key: str, response: requests.Response) -> None: Store a response.
+    - refresh(key: str, meta: dict) -> None: Mark an entry as revalidated.
+    - invalidate_build(url: str) -> None: Drop all entries of the build addressed by url.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """
+        Initialize an HttpCache instance.
+
+        Args:
+        - directory (Path): The directory holding the cache entries, created if needed.
+        - ttl (float): Maximum age in seconds of entries of mutable resources.
+        - max_bytes (int): Maximum total size of the cached response bodies.
+        """
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries_dir = self.directory / "entries"
+        self._finished_builds_dir = self.directory / "finished_builds"
+        self._entries_dir.mkdir(parents=True, exist_ok=True)
+        self._finished_builds_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(
+        url: str,
+        params: Optional[Dict[str, str]],
+        accept: Optional[str],
+    ) -> str:
+        """
+        Compute the key of a request.
+
+        Args:
+        - url (str): The URL of the request.
+        - params (dict or None): The query parameters of the request.
+        - accept (str or None): The Accept header of the request.
+
+        Returns:
+        - str: The cache key.
+        """
+        identity = json.dumps(
+            [url, sorted((params or {}).items()), accept or ""], default=str
+        )
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key: str) -> Path:
+        return self._entries_dir / f"{key}.json"
+
+    def _body_path(self, key: str) -> Path:
+        return self._entries_dir / f"{key}.body"
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """
+        Get the metadata of a cached entry.
+
+        Args:
+        - key (str): The cache key.
+
+        Returns:
+        - dict or None: The metadata of the entry, None if there is no usable entry.
+        """
+        try:
+            with open(self._meta_path(key), "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        if not meta["immutable"] and time.time() - meta["stored_at"] > self.ttl:
+            self._remove(key)
+            return None
+
+        if not self._body_path(key).exists():
+            self._remove(key)
+            return None
+
+        return meta
+
+    def is_fresh(self, meta: Dict) -> bool:
+        """
+        Whether an entry can be served without revalidation.
+
+        Args:
+        - meta (dict): The metadata of the entry.
+
+        Returns:
+        - bool: True if the entry describes an immutable resource.
+        """
+        if meta["immutable"]:
+            return True
+        # artifact listings become immutable once the build is known to be finished
+        match = BUILD_ARTIFACTS_PATTERN.search(url_path(meta["url"]))
+        return match is not None and self._is_finished_build(match.group(1))
+
+    @staticmethod
+    def validators(meta: Dict) -> Dict[str, str]:
+        """
+        Get the conditional request headers for an entry.
+
+        Args:
+        - meta (dict): The metadata of the entry.
+
+        Returns:
+        - dict: The If-None-Match and/or If-Modified-Since headers.
+        """
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def to_response(self, key: str, meta: Dict) -> Optional[JsonResponse]:
+        """
+        Rebuild a response from a cached entry and mark the entry as recently used.
+
+        Args:
+        - key (str): The cache key.
+        - meta (dict): The metadata of the entry.
+
+        Returns:
+        - JsonResponse or None: The cached response, None if the entry was evicted
+          since it was looked up.
+        """
+        response = JsonResponse()
+        response.status_code = meta["status_code"]
+        response.reason = meta["reason"]
+        response.url = meta["url"]
+        response.encoding = meta["encoding"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        try:
+            response._content = self._body_path(key).read_bytes()
+            os.utime(self._meta_path(key))
+        except FileNotFoundError:
+            return None
+        return response
+
+    def store(self, key: str, response: requests.Response) -> None:
+        """
+        Store a successful response, provided that it can be reused later.
+
+        Args:
+        - key (str): The cache key.
+        - response (requests.Response): The response to store.
+        """
+        if response.status_code != 200:
+            return
+
+        immutable = self._is_immutable(response)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not (immutable or etag or last_modified):
+            # an entry that can be neither trusted nor revalidated is useless
+            return
+
+        match = BUILD_PATTERN.search(url_path(response.url))
+        meta = {
+            "url": response.url,
+            "status_code": response.status_code,
+            "reason": response.reason,
+            "encoding": response.encoding,
+            "headers": dict(response.headers),
+            "etag": etag,
+            "last_modified": last_modified,
+            "immutable": immutable,
+            "build_id": match.group(1) if match else None,
+            "size": len(response.content),
+            "stored_at": time.time(),
+        }
+        self._write_atomic(self._body_path(key), response.content)
+        self._write_atomic(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+        self._evict()
+
+    def refresh(self, key: str, meta: Dict) -> None:
+        """
+        Restart the TTL of an entry after the server confirmed it is still valid.
+
+        Args:
+        - key (str): The cache key.
+        - meta (dict): The metadata of the entry.
+        """
+        meta["stored_at"] = time.time()
+        self._write_atomic(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+
+    def invalidate_build(self, url: str) -> None:
+        """
+        Drop all entries of the build addressed by url, e.g. after it was tagged or pinned.
+
+        Args:
+        - url (str): The URL of a request modifying a build.
+        """
+        match = BUILD_PATTERN.search(url_path(url))
+        if match is None:
+            return
+        build_id = match.group(1)
+        for meta_path in self._entries_dir.glob("*.json"):
+            try:
+                with open(meta_path, "r") as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+            if meta.get("build_id") == build_id:
+                self._remove(meta_path.stem)
+
+    def _is_immutable(self, response: requests.Response) -> bool:
+        path = url_path(response.url)
+        match = BUILD_ARTIFACTS_PATTERN.search(path)
+        if match is not None:
+            return self._is_finished_build(match.group(1))
+
+        match = BUILD_DETAILS_PATTERN.search(path)
+        if match is None:
+            return False
+        try:
+            finished = response.json().get("state") == "finished"
+        except ValueError:
+            return False
+        if finished:
+            (self._finished_builds_dir / match.group(1)).touch()
+        return finished
+
+    def _is_finished_build(self, build_id: str) -> bool:
+        return (self._finished_builds_dir / build_id).exists()
+
+    def _remove(self, key: str) -> None:
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        entries = []
+        total_size = 0
+        for meta_path in self._entries_dir.glob("*.json"):
+            try:
+                with open(meta_path, "r") as meta_file:
+                    size = json.load(meta_file)["size"]
+                last_used = meta_path.stat().st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, size, meta_path.stem))
+            total_size += size
+
+        # least recently used first
+        for _, size, key in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(key)
+            total_size -= size
+
+    def _write_atomic(self, path: Path, content: bytes) -> None:
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self._entries_dir)
+        try:
+            with os.fdopen(file_descriptor, "wb") as temporary_file:
+                temporary_file.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+def create_http_cache(directory: Optional[Path]) -> Optional[HttpCache]:
+    """
+    Create an HttpCache in directory, or no cache at all when directory is not given.
+
+    Args:
+    - directory (Path or None): The cache directory.
+
+    Returns:
+    - HttpCache or None: The cache.
+    """
+    if not directory:
+        return None
+    return HttpCache(directory)
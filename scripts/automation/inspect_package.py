@@ -0,0 +1,145 @@
+"""
+Prints the version of a wheel or nupkg of a tagged TeamCity build, or a member of
+it, without downloading the package: only the central directory of the archive
+and the members read are fetched, see remote_zip.py.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional
+
+from download_teamcity_artifact import (
+    get_artifact_url,
+    get_tagged_build_id,
+    resolve_artifact,
+)
+from http_cache import create_http_cache
+from remote_zip import RemoteZip, read_package_version
+from request_wrapper import RequestsWrapper
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--branch_name",
+        type=str,
+        required=True,
+        help="The branch name.",
+    )
+
+    parser.add_argument(
+        "--build_config_id",
+        type=str,
+        required=True,
+        help="The id of the build configuration on TeamCity that publishes the specified artifact.",
+    )
+
+    parser.add_argument(
+        "--tag",
+        type=str,
+        required=True,
+        help="The tag of the build of the specified artifact.",
+    )
+
+    parser.add_argument(
+        "--artifact_name",
+        type=str,
+        required=True,
+        help="The name of the wheel or nupkg. Can be a glob pattern, which must match a single artifact of the build.",
+    )
+
+    parser.add_argument(
+        "--artifact_path",
+        type=str,
+        required=False,
+        default="",
+        help="The path of the artifact. If not specified, the TeamCity root download dir is assumed.",
+    )
+
+    parser.add_argument(
+        "--member",
+        type=str,
+        required=False,
+        default=None,
+        help="A member of the archive to print, can be a glob pattern. If not specified, the version of the package is printed.",
+    )
+
+    parser.add_argument(
+        "--teamcity_access_token",
+        type=argparse.FileType("r"),
+        required=True,
+        help="The TeamCity access token to authenticate with.",
+    )
+
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    return parser.parse_args()
+
+
+def run(
+    branch_name: str,
+    build_config_id: str,
+    tag: str,
+    artifact_path: str,
+    artifact_name: str,
+    member: Optional[str],
+    teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+) -> str:
+    """
+    Print the version of a package of a tagged build, or a member of the package.
+
+    Args:
+    - branch_name (str): The name of the branch.
+    - build_config_id (str): The id of the build configuration that publishes the package.
+    - tag (str): The tag of the build.
+    - artifact_path (str): The path of the package.
+    - artifact_name (str): The name of the package, which may be a glob pattern.
+    - member (str or None): A member of the package to print, the version if None.
+    - teamcity_access_token (str): The TeamCity access token to authenticate with.
+    - http_cache_dir (Path, optional): Directory of the persistent TeamCity response cache.
+
+    Returns:
+    - str: The version or the member.
+    """
+    request = RequestsWrapper(teamcity_access_token, create_http_cache(http_cache_dir))
+    build_id = get_tagged_build_id(branch_name, build_config_id, tag, request)
+    artifact_path, artifact_name = resolve_artifact(
+        build_id, artifact_path, artifact_name, request
+    )
+    url = get_artifact_url(build_config_id, build_id, artifact_path, artifact_name)
+    with RemoteZip(url, request) as archive:
+        if member is None:
+            output = read_package_version(archive, artifact_name)
+        else:
+            output = archive.read(archive.find_one(member)).decode("utf-8")
+    print(output)
+    return output
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        run(
+            args.branch_name,
+            args.build_config_id,
+            args.tag,
+            args.artifact_path,
+            args.artifact_name,
+            args.member,
+            args.teamcity_access_token.read(),
+            args.http_cache_dir,
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
@@ -0,0 +1,210 @@
+"""
+JSON decoding of TeamCity responses.
+
+Responses returned by RequestsWrapper are JsonResponse objects, which decode their
+body once however many times json() is called. Bodies are decoded with orjson when
+it is installed, which is several times faster than the json module of the
+standard library on large payloads, and with json otherwise. Both return the same
+objects.
+
+Large collections (builds, changes, ...) can also be decoded lazily: the items of
+the collection are decoded one at a time, so that a caller which needs only the
+first items, or one field of each, does not materialise the whole collection.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterator, Union
+
+import requests
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used instead
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_decoder = json.JSONDecoder()
+
+# marks a response whose body has not been decoded yet, None being a valid document
+_UNDECODED = object()
+
+UTF8_ENCODINGS = {"utf-8", "utf8"}
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode a JSON document with the fastest available backend.
+
+    Args:
+    - data (bytes or str): The JSON document, UTF-8 encoded if bytes.
+
+    Returns:
+    - Any: The decoded document.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    return WHITESPACE.match(text, index).end()
+
+
+def _expect(text: str, index: int, character: str) -> int:
+    """
+    Check the character at index and get the index of the next token.
+
+    Args:
+    - text (str): The JSON document.
+    - index (int): The index of the expected character.
+    - character (str): The expected character.
+
+    Returns:
+    - int: The index of the token after the character.
+    """
+    if text[index : index + 1] != character:
+        raise json.JSONDecodeError(f"Expecting '{character}'", text, index)
+    return _skip_whitespace(text, index + 1)
+
+
+def iterate_items(data: Union[bytes, str], item_key: str) -> Iterator[Dict]:
+    """
+    Decode the items of a collection lazily, one at a time.
+
+    Only the top level of the document is walked: the values preceding the items
+    (count, href, nextHref, ...) are decoded and skipped, then each item is decoded
+    when the next one is requested. Nothing after the last item consumed is decoded.
+
+    Args:
+    - data (bytes or str): The JSON document of the collection, UTF-8 encoded if bytes.
+    - item_key (str): The key of the items, e.g. "build".
+
+    Yields:
+    - dict: The items of the collection, in document order.
+    """
+    text = data.decode("utf-8") if isinstance(data, bytes) else data
+    index = _expect(text, _skip_whitespace(text, 0), "{")
+    if text[index : index + 1] == "}":
+        return
+    while True:
+        key, index = _decoder.raw_decode(text, index)
+        index = _expect(text, _skip_whitespace(text, index), ":")
+        if key == item_key:
+            index = _expect(text, index, "[")
+            if text[index : index + 1] == "]":
+                return
+            while True:
+                item, index = _decoder.raw_decode(text, index)
+                yield item
+                index = _skip_whitespace(text, index)
+                if text[index : index + 1] == "]":
+                    return
+                index = _expect(text, index, ",")
+        _, index = _decoder.raw_decode(text, index)
+        index = _skip_whitespace(text, index)
+        if text[index : index + 1] == "}":
+            return
+        index = _expect(text, index, ",")
+
+
+def extract_field(data: Union[bytes, str], item_key: str, field: str) -> Iterator[Any]:
+    """
+    Get one field of the items of a collection lazily.
+
+    Args:
+    - data (bytes or str): The JSON document of the collection, UTF-8 encoded if bytes.
+    - item_key (str): The key of the items, e.g. "build".
+    - field (str): The field of the items, e.g. "number".
+
+    Yields:
+    - Any: The value of the field of each item, None if an item does not have it.
+    """
+    for item in iterate_items(data, item_key):
+        yield item.get(field)
+
+
+class JsonResponse(requests.Response):
+    """
+    A response which decodes its JSON body once, with the fastest available backend.
+
+    The decoded document is shared by all callers of json(), which must not modify it
+    unless they own the response.
+    """
+
+    _document = _UNDECODED
+
+    def json(self, **kwargs) -> Any:
+        """
+        Get the decoded body, decoding it on the first call.
+
+        Args:
+        - kwargs: Options of json.loads, the body is then decoded again with them.
+
+        Returns:
+        - Any: The decoded body.
+
+        Raises:
+        - requests.exceptions.JSONDecodeError: If the body is not valid JSON.
+        """
+        if kwargs:
+            return super().json(**kwargs)
+        if self._document is _UNDECODED:
+            encoding = (self.encoding or "utf-8").lower().replace("_", "-")
+            body = self.content if encoding in UTF8_ENCODINGS else self.text
+            try:
+                self._document = loads(body)
+            except json.JSONDecodeError as error:
+                raise requests.exceptions.JSONDecodeError(
+                    error.msg, error.doc, error.pos
+                ) from error
+        return self._document
+
+    def iter_items(self, item_key: str) -> Iterator[Dict]:
+        """
+        Decode the items of a collection lazily, see iterate_items.
+
+        Args:
+        - item_key (str): The key of the items, e.g. "build".
+
+        Yields:
+        - dict: The items of the collection, in document order.
+        """
+        if self._document is not _UNDECODED:
+            yield from self._document.get(item_key, [])
+        else:
+            yield from iterate_items(self.text, item_key)
+
+    def extract_field(self, item_key: str, field: str) -> Iterator[Any]:
+        """
+        Get one field of the items of a collection lazily, see extract_field.
+
+        Args:
+        - item_key (str): The key of the items, e.g. "build".
+        - field (str): The field of the items, e.g. "number".
+
+        Yields:
+        - Any: The value of the field of each item, None if an item does not have it.
+        """
+        for item in self.iter_items(item_key):
+            yield item.get(field)
+
+
+def as_json_response(response: requests.Response) -> JsonResponse:
+    """
+    Make a response decode its body once.
+
+    Args:
+    - response (requests.Response): The response.
+
+    Returns:
+    - JsonResponse: The same response object.
+    """
+    # JsonResponse adds no state to requests.Response, so the response is converted
+    # in place rather than copied, which would read a streamed body
+    if not isinstance(response, JsonResponse):
+        response.__class__ = JsonResponse
+    return response
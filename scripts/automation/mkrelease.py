@@ -0,0 +1,98 @@
+"""
+Single entry point of the release automation scripts.
+
+    python mkrelease.py <command> [options of the command]
+
+Each command runs the script it names as __main__, so the options and the output
+are those of the script. Nothing is imported before the command is known, and a
+command imports only its own script: the offline version bumps never load the
+HTTP stack needed by the TeamCity commands.
+"""
+
+import argparse
+import runpy
+import sys
+from pathlib import Path
+from typing import Sequence
+
+# command: (script, description)
+COMMANDS = {
+    "bump-mk": ("bump_mk_version.py", "Bump the version of MeshKernel"),
+    "bump-mkpy": ("bump_mkpy_versions.py", "Bump the versions of MeshKernelPy"),
+    "bump-package": ("bump_package_version.py", "Bump the version of a NuGet package"),
+    "bump-dependencies": (
+        "bump_dependencies_versions.py",
+        "Bump the versions of NuGet package dependencies",
+    ),
+    "bump-gep-msi": (
+        "bump_gep_msi_version.py",
+        "Bump the version of the GridEditor MSI",
+    ),
+    "build-number": ("get_build_number.py", "Get the counter of a release build"),
+    "pin": ("pin_artifacts.py", "Pin and tag the artifacts of products"),
+    "download": (
+        "download_release_artifacts.py",
+        "Download the release deliverables of products",
+    ),
+    "download-wheels": (
+        "download_python_wheels.py",
+        "Download the Windows and Linux python wheels",
+    ),
+    "inspect": (
+        "inspect_package.py",
+        "Read the version of a wheel or nupkg without downloading it",
+    ),
+    "trigger": ("trigger_build.py", "Trigger a build and watch its chain"),
+    "pause": (
+        "pause_teamcity_build_config.py",
+        "Pause or resume a build configuration",
+    ),
+    "agent": ("release_agent.py", "Serve the TeamCity steps of a release"),
+}
+
+
+def parse_arguments(argv: Sequence[str]):
+    """
+    Parse the command with which this script was called through, its options are
+    left to the script of the command
+    """
+    width = max(len(command) for command in COMMANDS)
+    parser = argparse.ArgumentParser(
+        prog="mkrelease",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(
+            f"  {command:<{width}}  {description}"
+            for command, (_, description) in COMMANDS.items()
+        )
+        + "\n\nRun 'mkrelease <command> --help' for the options of a command.",
+    )
+
+    parser.add_argument(
+        "command",
+        choices=COMMANDS,
+        metavar="command",
+        help="The command to run, see below.",
+    )
+
+    return parser.parse_args(argv[:1])
+
+
+def run(command: str, arguments: Sequence[str]) -> None:
+    """
+    Runs the script of a command with the specified arguments.
+
+    Args:
+        command : str
+            The command to run.
+        arguments : list
+            The command line arguments of the script of the command.
+    """
+    script = Path(__file__).parent / COMMANDS[command][0]
+    sys.argv = [f"mkrelease {command}", *arguments]
+    runpy.run_path(str(script), run_name="__main__")
+
+
+if __name__ == "__main__":
+    args = parse_arguments(sys.argv[1:])
+    run(args.command, sys.argv[2:])
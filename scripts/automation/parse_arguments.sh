@@ -7,6 +7,12 @@ declare -g auto_merge=false
 declare -g upload_to_pypi=false
 declare -g pypi_access_token=""
 declare -g teamcity_access_token=""
+declare -g teamcity_http_cache_dir=""
+declare -ga teamcity_http_cache_args=()
+declare -g teamcity_artifact_cache_dir=""
+declare -ga teamcity_artifact_cache_args=()
+declare -g teamcity_build_mirror=""
+declare -ga teamcity_build_mirror_args=()
 declare -g clean=false
 
 # Define the parse_named_arguments function
@@ -60,6 +66,18 @@ function parse_arguments() {
             teamcity_access_token="$2"
             shift 2
             ;;
+        --teamcity_http_cache_dir)
+            teamcity_http_cache_dir="$2"
+            shift 2
+            ;;
+        --teamcity_artifact_cache_dir)
+            teamcity_artifact_cache_dir="$2"
+            shift 2
+            ;;
+        --teamcity_build_mirror)
+            teamcity_build_mirror="$2"
+            shift 2
+            ;;
         --delay)
             delay="$2"
             shift 2
@@ -106,6 +124,17 @@ function parse_arguments() {
         fi
     fi
 
+    # optional parameters forwarded to the TeamCity scripts
+    if [[ -n ${teamcity_http_cache_dir} ]]; then
+        teamcity_http_cache_args=(--http_cache_dir "${teamcity_http_cache_dir}")
+    fi
+    if [[ -n ${teamcity_artifact_cache_dir} ]]; then
+        teamcity_artifact_cache_args=(--artifact_cache_dir "${teamcity_artifact_cache_dir}")
+    fi
+    if [[ -n ${teamcity_build_mirror} ]]; then
+        teamcity_build_mirror_args=(--build_mirror "${teamcity_build_mirror}")
+    fi
+
     # positional arguments
     if ((${#positional_args[@]})); then
         echo "Found positional arguments (${positional_args[@]}). Such arguments are not allowed. Only named arguments are valid."
@@ -11,22 +11,22 @@ automatic_update_teamcity_config_ids=(
 
 function pause_automatic_teamcity_updates() {
     show_progress
-    for config_id in "${automatic_update_teamcity_config_ids[@]}"; do
-        python ${scripts_path}/pause_teamcity_build_config.py \
-            --build_config_id "${config_id}" \
-            --pause \
-            --teamcity_access_token ${teamcity_access_token}
-
-    done
+    call_release_agent "$(
+        jq -nc \
+            --arg snapshot_file "${teamcity_pause_snapshot_file}" \
+            '{command: "pause", pause: true, snapshot_file: $snapshot_file,
+              build_config_ids: $ARGS.positional}' \
+            --args "${automatic_update_teamcity_config_ids[@]}"
+    )" >/dev/null
 }
 
 function resume_automatic_teamcity_updates() {
     show_progress
-    for config_id in "${automatic_update_teamcity_config_ids[@]}"; do
-        python ${scripts_path}/pause_teamcity_build_config.py \
-            --build_config_id "${config_id}" \
-            --resume \
-            --teamcity_access_token ${teamcity_access_token}
-
-    done
+    call_release_agent "$(
+        jq -nc \
+            --arg snapshot_file "${teamcity_pause_snapshot_file}" \
+            '{command: "pause", pause: false, snapshot_file: $snapshot_file,
+              build_config_ids: $ARGS.positional}' \
+            --args "${automatic_update_teamcity_config_ids[@]}"
+    )" >/dev/null
 }
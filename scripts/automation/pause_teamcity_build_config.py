@@ -1,7 +1,18 @@
+"""
+Pauses or resumes TeamCity build configurations.
+
+Several build configurations can be paused or resumed at once, concurrently. With
+a snapshot file, pausing records the build configurations which were running and
+were paused by this script, and resuming restores only those: build configurations
+which were already paused beforehand are left paused.
+"""
+
 import argparse
-import sys
-import requests
 import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence
 
 from request_wrapper import RequestsWrapper, TEAMCITY_URL
 
@@ -15,8 +26,9 @@ def parse_args():
     parser.add_argument(
         "--build_config_id",
         type=str,
+        action="append",
         required=True,
-        help="the build configuration ID to pause",
+        help="the build configuration ID to pause. Can be repeated to pause or resume several build configurations at once.",
     )
 
     action_group = parser.add_mutually_exclusive_group(required=True)
@@ -33,6 +45,22 @@ def parse_args():
         help="Switch for resuming the build configuration",
     )
 
+    parser.add_argument(
+        "--snapshot_file",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the snapshot of the build configurations paused by this script. If specified, only those are resumed.",
+    )
+
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        required=False,
+        default=8,
+        help="Maximum number of build configurations paused or resumed concurrently.",
+    )
+
     parser.add_argument(
         "--teamcity_access_token",
         type=argparse.FileType("r"),
@@ -43,21 +71,49 @@ def parse_args():
     return parser.parse_args()
 
 
-def pause_build_config(
+def get_paused_url(build_config_id: str) -> str:
+    """
+    Get the URL of the paused state of a build configuration.
+
+    Args:
+    - build_config_id (str): The ID of the build configuration
+
+    Returns:
+    - str: The URL of the paused state.
+    """
+    return f"{TEAMCITY_URL}/app/rest/buildTypes/id:{build_config_id}/paused"
+
+
+def is_build_config_paused(build_config_id: str, request: RequestsWrapper) -> bool:
+    """
+    Check whether a TeamCity build configuration is paused.
+
+    Args:
+    - build_config_id (str): The ID of the build configuration
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+
+    Returns:
+    - bool: True if the build configuration is paused, False otherwise.
+    """
+    headers = {"Accept": "text/plain"}
+    response = request.get(get_paused_url(build_config_id), headers=headers)
+    return response.text.strip().lower() == "true"
+
+
+def set_build_config_paused(
     build_config_id: str,
     pause: bool,
-    teamcity_access_token: str,
+    request: RequestsWrapper,
 ) -> None:
     """
-    Pauses a TeamCity build configuration.
+    Pauses or resumes a TeamCity build configuration.
 
     Args:
     - build_config_id (str): The ID of the build configuration to pause or resume
     - pause (bool): pauses the build configuration if true, resumes it otherwise
-    - teamcity_access_token (str): TeamCity access token
+    - request (RequestsWrapper): The request wrapper to make requests calls.
     """
-    request = RequestsWrapper(teamcity_access_token)
-    url = f"{TEAMCITY_URL}/app/rest/buildTypes/id:{build_config_id}/paused"
+    url = get_paused_url(build_config_id)
     headers = {"Content-Type": "text/plain"}
     do_pause = "true" if pause else "false"
     request.put(url, headers=headers, data=do_pause)
@@ -65,14 +121,195 @@ def pause_build_config(
     print(f"Build configuration {build_config_id} {action} successfully.")
 
 
+def pause_build_config(
+    build_config_id: str,
+    pause: bool,
+    teamcity_access_token: str,
+) -> None:
+    """
+    Pauses a TeamCity build configuration.
+
+    Args:
+    - build_config_id (str): The ID of the build configuration to pause or resume
+    - pause (bool): pauses the build configuration if true, resumes it otherwise
+    - teamcity_access_token (str): TeamCity access token
+    """
+    request = RequestsWrapper(teamcity_access_token)
+    set_build_config_paused(build_config_id, pause, request)
+
+
+def load_snapshot(snapshot_file: Path) -> List[str]:
+    """
+    Load the IDs of the build configurations paused by this script.
+
+    Args:
+    - snapshot_file (Path): Path of the snapshot.
+
+    Returns:
+    - list: The IDs of the build configurations, empty if there is no snapshot.
+    """
+    if not Path(snapshot_file).is_file():
+        return []
+    with open(snapshot_file, "r") as file:
+        return json.load(file)["paused"]
+
+
+def save_snapshot(snapshot_file: Path, build_config_ids: Sequence[str]) -> None:
+    """
+    Save the IDs of the build configurations paused by this script, the snapshot is
+    removed if there are none.
+
+    Args:
+    - snapshot_file (Path): Path of the snapshot.
+    - build_config_ids (list): The IDs of the build configurations.
+    """
+    snapshot_file = Path(snapshot_file)
+    if not build_config_ids:
+        snapshot_file.unlink(missing_ok=True)
+        return
+    snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(snapshot_file, "w") as file:
+        json.dump({"paused": sorted(build_config_ids)}, file, indent=4)
+
+
+def pause_build_configs(
+    build_config_ids: Sequence[str],
+    request: RequestsWrapper,
+    snapshot_file: Optional[Path] = None,
+    max_workers: int = 8,
+) -> List[str]:
+    """
+    Pause build configurations concurrently, skipping those which are already paused.
+
+    The paused states are read concurrently first. The build configurations which
+    get paused are added to the snapshot, if any, before they are paused, so that a
+    failure halfway cannot leave a paused build configuration out of the snapshot.
+
+    Args:
+    - build_config_ids (list): The IDs of the build configurations to pause
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - snapshot_file (Path, optional): Path of the snapshot of the paused build configurations.
+    - max_workers (int): Maximum number of concurrent requests.
+
+    Returns:
+    - list: The IDs of the build configurations paused by this call.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paused = list(
+            executor.map(
+                lambda build_config_id: is_build_config_paused(
+                    build_config_id, request
+                ),
+                build_config_ids,
+            )
+        )
+        to_pause = []
+        for build_config_id, is_paused in zip(build_config_ids, paused):
+            if is_paused:
+                print(f"Build configuration {build_config_id} is already paused.")
+            else:
+                to_pause.append(build_config_id)
+
+        if snapshot_file is not None:
+            save_snapshot(
+                snapshot_file, sorted(set(load_snapshot(snapshot_file)) | set(to_pause))
+            )
+
+        list(
+            executor.map(
+                lambda build_config_id: set_build_config_paused(
+                    build_config_id, True, request
+                ),
+                to_pause,
+            )
+        )
+    return to_pause
+
+
+def resume_build_configs(
+    build_config_ids: Sequence[str],
+    request: RequestsWrapper,
+    snapshot_file: Optional[Path] = None,
+    max_workers: int = 8,
+) -> List[str]:
+    """
+    Resume build configurations concurrently.
+
+    With a snapshot, only the build configurations of the snapshot are resumed and
+    removed from it.
+
+    Args:
+    - build_config_ids (list): The IDs of the build configurations to resume
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - snapshot_file (Path, optional): Path of the snapshot of the paused build configurations.
+    - max_workers (int): Maximum number of concurrent requests.
+
+    Returns:
+    - list: The IDs of the resumed build configurations.
+    """
+    to_resume = list(build_config_ids)
+    if snapshot_file is not None:
+        snapshot = load_snapshot(snapshot_file)
+        to_resume = [x for x in to_resume if x in snapshot]
+        for build_config_id in build_config_ids:
+            if build_config_id not in snapshot:
+                print(
+                    f"Build configuration {build_config_id} was not paused by the release, left as is."
+                )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(
+            executor.map(
+                lambda build_config_id: set_build_config_paused(
+                    build_config_id, False, request
+                ),
+                to_resume,
+            )
+        )
+
+    if snapshot_file is not None:
+        save_snapshot(snapshot_file, [x for x in snapshot if x not in to_resume])
+    return to_resume
+
+
+def run(
+    build_config_ids: Sequence[str],
+    pause: bool,
+    teamcity_access_token: str,
+    snapshot_file: Optional[Path] = None,
+    max_workers: int = 8,
+) -> List[str]:
+    """
+    Pauses or resumes TeamCity build configurations.
+
+    Args:
+    - build_config_ids (list): The IDs of the build configurations to pause or resume
+    - pause (bool): pauses the build configurations if true, resumes them otherwise
+    - teamcity_access_token (str): TeamCity access token
+    - snapshot_file (Path, optional): Path of the snapshot of the paused build configurations.
+    - max_workers (int): Maximum number of concurrent requests.
+
+    Returns:
+    - list: The IDs of the paused or resumed build configurations.
+    """
+    request = RequestsWrapper(teamcity_access_token)
+    if pause:
+        return pause_build_configs(
+            build_config_ids, request, snapshot_file, max_workers
+        )
+    return resume_build_configs(build_config_ids, request, snapshot_file, max_workers)
+
+
 if __name__ == "__main__":
     try:
         args = parse_args()
 
-        build_counter = pause_build_config(
+        run(
             args.build_config_id,
             args.pause,
             args.teamcity_access_token.read(),
+            args.snapshot_file,
+            args.max_workers,
         )
     except Exception as error:
         print("Error:", error, file=sys.stderr)
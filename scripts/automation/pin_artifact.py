@@ -1,19 +1,41 @@
 """
-Pins and tags an artifact on TeamCity. Removes the tag, if found, from a previous 
+Pins and tags an artifact on TeamCity. Removes the tag, if found, from a previous
 build and removes the pin when possible.
 """
 
 import argparse
+import asyncio
 import logging
-from typing import Dict, Optional, Sequence
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
+import aiohttp
+import requests
+
+from artifact_index import ArtifactIndex, join_path, match_glob, split_archive_member
+from async_request_wrapper import AsyncRequestsWrapper
+from build_mirror import BuildMirror, create_build_mirror
+from http_cache import create_http_cache
+from json_codec import loads
 from request_wrapper import BUILDS_ROOT, RequestsWrapper
+from teamcity_collection import iterate_collection
+from teamcity_locator import build_locator, collection_query, locator
 
 HEADERS = {"Accept": "application/json"}
 
+# the fields of a build needed to pin and (un)tag it
+BUILD_FIELDS = "id,number,state,status,tags(count,tag(name))"
+
+# number of builds requested per page when searching for a build
+PAGE_SIZE = 20
+
 
 def get_previous_build(
-    branch_name: str, build_config_id: str, tag: str, request: RequestsWrapper
+    branch_name: str,
+    build_config_id: str,
+    tag: str,
+    request: RequestsWrapper,
+    mirror: Optional[BuildMirror] = None,
 ) -> Optional[Dict]:
     """
     Get the previous build tagged with the specified tag
@@ -25,24 +47,55 @@ def get_previous_build(
             The tag with which the build should be retrieved.
         request : RequestsWrapper
             The request wrapper to make requests calls.
+        mirror : BuildMirror, optional
+            The mirror the build is looked up in, the server if not provided.
     """
+    if mirror is not None:
+        return mirror.find_build(
+            build_config_id, branch_name, request, tag=tag, pinned=True
+        )
 
-    build_url = f"{BUILDS_ROOT}?locator=branch:{branch_name},buildType:{build_config_id},tag:{tag},pinned:true,count:1"
-    response = request.get(build_url, headers=HEADERS)
+    params = collection_query(
+        "build",
+        BUILD_FIELDS,
+        build_locator(
+            build_type=build_config_id,
+            branch=branch_name,
+            tag=tag,
+            pinned=True,
+            count=1,
+        ),
+    )
+    response = request.get(BUILDS_ROOT, params=params, headers=HEADERS)
 
     if response.status_code != 200:
         return None
 
-    if response.json()["count"] == 0:
+    builds = response.json().get("build", [])
+    if not builds:
         return None
 
-    build_id = response.json()["build"][0]["id"]
-    build_url_by_id = f"{BUILDS_ROOT}/id:{build_id}"
-    response_by_id = request.get(build_url_by_id, headers=HEADERS)
-    if response.status_code != 200:
-        return None
+    return builds[0]
 
-    return response_by_id.json()
+
+def get_build(build_id: str, request: RequestsWrapper) -> Dict:
+    """
+    Get the current pinned state and tags of the build with build_id, bypassing the
+    cache, so that tags added on the server in the meantime are not overwritten.
+
+    Args:
+        build_id : str
+            The id of the build to be retrieved.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+    """
+    response = request.get(
+        f"{BUILDS_ROOT}/id:{build_id}",
+        params={"fields": BUILD_FIELDS},
+        headers=HEADERS,
+        use_cache=False,
+    )
+    return response.json()
 
 
 def unpin_build(build_id: str, request: RequestsWrapper) -> None:
@@ -71,10 +124,10 @@ def clean_build(build_info: dict, tag: str, request: RequestsWrapper) -> None:
         request : RequestsWrapper
             The request wrapper to make requests calls.
     """
-
+    build_info = get_build(build_info["id"], request)
     untag_build(build_info, tag, request)
-    tag_info = build_info["tags"]
-    if tag in get_tag_values(tag_info) and tag_info["count"] == 1:
+    tag_info = build_info.get("tags", {})
+    if tag in get_tag_values(tag_info) and tag_info.get("count") == 1:
         build_id = build_info["id"]
         unpin_build(build_id, request)
 
@@ -87,7 +140,7 @@ def get_tag_values(tags) -> Sequence[str]:
         tags : dict
             A tags dictionary.
     """
-    return list(x["name"] for x in tags["tag"])
+    return list(x["name"] for x in tags.get("tag", []))
 
 
 def untag_build(build_info: dict, tag: str, request: RequestsWrapper) -> None:
@@ -102,7 +155,7 @@ def untag_build(build_info: dict, tag: str, request: RequestsWrapper) -> None:
         request : RequestsWrapper
             The request wrapper to make requests calls.
     """
-    build_tags = get_tag_values(build_info["tags"])
+    build_tags = get_tag_values(build_info.get("tags", {}))
     if tag not in build_tags:
         return
 
@@ -126,7 +179,8 @@ def has_artifact(
         build_url : str
             The build url to check the artifacts for.
         artifact_name : str
-            The expected artifact file name within the build to be retrieved.
+            The expected artifact file name within the build to be retrieved, which
+            may be a glob pattern.
         request : RequestsWrapper
             The request wrapper to make requests calls.
     """
@@ -138,55 +192,176 @@ def has_artifact(
     if artifacts_response.status_code != 200:
         return False
 
-    return artifact_name in (elem["name"] for elem in artifacts_response.json()["file"])
+    return any(
+        match_glob(elem["name"], artifact_name)
+        for elem in artifacts_response.json()["file"]
+    )
 
 
-def get_new_build(
-    branch_name: str,
-    build_config_id: str,
+async def has_artifact_async(
+    build_id: str,
+    artifact_path: str,
+    artifact_name: str,
+    request: AsyncRequestsWrapper,
+) -> bool:
+    """
+    Asynchronous counterpart of has_artifact, addressing the build by id.
+
+    Args:
+        build_id : str
+            The id of the build to check the artifacts for.
+        artifact_name : str
+            The expected artifact file name within the build to be retrieved.
+        request : AsyncRequestsWrapper
+            The asynchronous request wrapper to make requests calls.
+    """
+    build_artifacts_url = f"{BUILDS_ROOT}/id:{build_id}/artifacts/"
+    if artifact_path:
+        build_artifacts_url = f"{build_artifacts_url}/{artifact_path}"
+    try:
+        artifacts_response = await request.get(build_artifacts_url, headers=HEADERS)
+    except aiohttp.ClientResponseError:
+        return False
+
+    artifacts = await artifacts_response.json(loads=loads, content_type=None)
+    return any(
+        match_glob(elem["name"], artifact_name) for elem in artifacts.get("file", [])
+    )
+
+
+async def probe_builds(
+    builds: List[Dict],
+    artifact_path: str,
+    artifact_name: str,
+    request: AsyncRequestsWrapper,
+) -> Optional[Dict]:
+    """
+    Probe the artifacts of builds concurrently and get the first build, in the given
+    order, which has the specified artifact. Pending probes are cancelled as soon as
+    the answer is known.
+
+    Args:
+        builds : list
+            The candidate builds, most recent first.
+        artifact_name : str
+            The expected artifact file name within the build to be retrieved.
+        request : AsyncRequestsWrapper
+            The asynchronous request wrapper to make requests calls.
+    """
+    probes = [
+        asyncio.ensure_future(
+            has_artifact_async(build["id"], artifact_path, artifact_name, request)
+        )
+        for build in builds
+    ]
+    try:
+        for build, probe in zip(builds, probes):
+            if await probe:
+                return build
+        return None
+    finally:
+        for probe in probes:
+            probe.cancel()
+        await asyncio.gather(*probes, return_exceptions=True)
+
+
+def find_build_by_probing(
+    params: Dict[str, str],
     artifact_path: str,
     artifact_name: str,
     request: RequestsWrapper,
 ) -> Optional[Dict]:
     """
-    Get the build from build_config with the specified artifact.
+    Fallback of get_new_build for servers which cannot project the artifacts of the
+    builds: the artifacts of each page of builds are probed concurrently.
 
     Args:
-        build_config_id : str
-            The id of the build configuration of which the build is part.
+        params : dict
+            The locator and fields of the builds query.
         artifact_name : str
             The expected artifact file name within the build to be retrieved.
         request : RequestsWrapper
             The request wrapper to make requests calls.
     """
-    builds_url = (
-        f"{BUILDS_ROOT}?locator=branch:{branch_name},buildType:{build_config_id}"
-    )
 
-    new_builds_response = request.get(builds_url, headers=HEADERS)
+    async def find() -> Optional[Dict]:
+        async with AsyncRequestsWrapper.from_requests_wrapper(request) as async_request:
+            page = []
+            for build in iterate_collection(BUILDS_ROOT, params, "build", request):
+                page.append(build)
+                if len(page) < PAGE_SIZE:
+                    continue
+                found = await probe_builds(
+                    page, artifact_path, artifact_name, async_request
+                )
+                if found:
+                    return found
+                page = []
+            return await probe_builds(page, artifact_path, artifact_name, async_request)
+
+    return asyncio.run(find())
 
-    if new_builds_response.status_code != 200:
-        return None
 
-    builds = new_builds_response.json()
-    for build in builds["build"]:
+def get_new_build(
+    branch_name: str,
+    build_config_id: str,
+    artifact_path: str,
+    artifact_name: str,
+    request: RequestsWrapper,
+    mirror: Optional[BuildMirror] = None,
+) -> Optional[Dict]:
+    """
+    Get the build from build_config with the specified artifact.
 
-        new_build_url = f"{BUILDS_ROOT}/id:{build['id']}"
+    The builds are requested together with their matching artifacts in one projected
+    query, page by page, until the first build which has the artifact is found.
 
-        if not has_artifact(new_build_url, artifact_path, artifact_name, request):
-            continue
+    Args:
+        build_config_id : str
+            The id of the build configuration of which the build is part.
+        artifact_name : str
+            The expected artifact file name within the build to be retrieved, which
+            may be a glob pattern. Of a member of an archived artifact, the build
+            which has the archive is retrieved.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        mirror : BuildMirror, optional
+            The mirror the builds and their artifacts are looked up in, the server if not provided.
+    """
+    artifact_name, _ = split_archive_member(artifact_name)
+    full_name = join_path(artifact_path, artifact_name)
+    if mirror is not None:
+        return mirror.find_build_with_artifact(
+            build_config_id, branch_name, full_name, request
+        )
 
-        new_build_info = request.get(new_build_url, headers=HEADERS)
+    builds_locator = build_locator(
+        build_type=build_config_id, branch=branch_name, count=PAGE_SIZE
+    )
+    artifacts_locator = locator(recursive=True, pattern=full_name)
+    params = collection_query(
+        "build",
+        f"{BUILD_FIELDS},artifacts($locator({artifacts_locator}),file(fullName))",
+        builds_locator,
+    )
 
-        if new_build_info.status_code != 200:
-            logging.warning(
-                f"Request '{new_build_url}' returned {new_build_info.status_code}."
+    try:
+        for build in iterate_collection(BUILDS_ROOT, params, "build", request):
+            if "artifacts" not in build:
+                # the server ignored the projection of the artifacts
+                break
+            artifacts = ArtifactIndex(
+                elem["fullName"] for elem in build["artifacts"].get("file", [])
             )
-            continue
-
-        return new_build_info.json()
+            if artifacts.glob(full_name):
+                return build
+        else:
+            return None
+    except requests.HTTPError as error:
+        logging.warning(f"Projected builds query failed ({error}), probing builds.")
 
-    return None
+    params = collection_query("build", BUILD_FIELDS, builds_locator)
+    return find_build_by_probing(params, artifact_path, artifact_name, request)
 
 
 def pin_build(build_id: str, request: RequestsWrapper) -> None:
@@ -242,6 +417,7 @@ def bag_build(build_info: dict, tag: str, request: RequestsWrapper) -> None:
         request : RequestsWrapper
             The request wrapper to make requests calls.
     """
+    build_info = get_build(build_info["id"], request)
     pin_build(build_info["id"], request)
     tag_build(build_info, tag, request)
 
@@ -253,7 +429,8 @@ def pin_artifact(
     artifact_path: str,
     artifact_name: str,
     request: RequestsWrapper,
-):
+    mirror: Optional[BuildMirror] = None,
+) -> Optional[Dict]:
     """
     Pin and tag the build specified with build_info.
 
@@ -266,6 +443,12 @@ def pin_artifact(
             The new tag to be added to the build
         request : RequestsWrapper
             The request wrapper to make requests calls.
+        mirror : BuildMirror, optional
+            The mirror the builds are looked up in and the modified builds refreshed in.
+
+    Returns:
+        dict or None
+            The pinned build, None if no build has the artifact.
     """
 
     old_build_info = get_previous_build(
@@ -273,9 +456,12 @@ def pin_artifact(
         build_config_id,
         tag,
         request,
+        mirror,
     )
     if old_build_info:
         clean_build(old_build_info, tag, request)
+        if mirror is not None:
+            mirror.refresh_build(old_build_info["id"], request)
 
     new_build_info = get_new_build(
         branch_name,
@@ -283,12 +469,17 @@ def pin_artifact(
         artifact_path,
         artifact_name,
         request,
+        mirror,
     )
     if new_build_info:
         bag_build(new_build_info, tag, request)
+        if mirror is not None:
+            mirror.refresh_build(new_build_info["id"], request)
     else:
         logging.warning(f"Could not find a build to tag artifact '{artifact_name}'.")
 
+    return new_build_info
+
 
 def get_version(version: str) -> str:
     """Removes the leading zeros from the version string when version is a digit"""
@@ -319,7 +510,7 @@ def parse_arguments():
         "--artifact_name",
         type=str,
         required=True,
-        help="The name of the artifact to pin and tag.",
+        help="The name of the artifact to pin and tag. Can be a glob pattern, e.g. Deltares.MeshKernel.*.nupkg.",
     )
 
     parser.add_argument(
@@ -343,6 +534,22 @@ def parse_arguments():
         help="The TeamCity access token to authenticate with.",
     )
 
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
     return parser.parse_args()
 
 
@@ -353,6 +560,8 @@ def run(
     artifact_path: str,
     artifact_name: str,
     teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+    build_mirror: Optional[Path] = None,
 ):
     """
     Runs the script with the specified parameters.
@@ -370,9 +579,13 @@ def run(
             The TeamCity access token to authenticate with.
         artifact_path : str
             The path of the artifact to pin and tag.
+        http_cache_dir : Path, optional
+            Directory of the persistent TeamCity response cache.
+        build_mirror : Path, optional
+            Path of the SQLite mirror of the TeamCity builds.
     """
 
-    request = RequestsWrapper(teamcity_access_token)
+    request = RequestsWrapper(teamcity_access_token, create_http_cache(http_cache_dir))
     pin_artifact(
         branch_name,
         build_config_id,
@@ -380,6 +593,7 @@ def run(
         artifact_path,
         artifact_name,
         request,
+        create_build_mirror(build_mirror),
     )
 
 
@@ -393,6 +607,8 @@ if __name__ == "__main__":
             args.artifact_path,
             args.artifact_name,
             args.teamcity_access_token.read(),
+            args.http_cache_dir,
+            args.build_mirror,
         )
     except Exception as error:
-        logging.error("Exception:", error)
+        logging.error("Exception: %s", error)
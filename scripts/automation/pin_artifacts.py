@@ -0,0 +1,453 @@
+"""
+Pins and tags the artifacts of one or more products on TeamCity in a single process.
+
+The artifacts are described by a manifest (see release_artifacts.json). Artifact
+names may be glob patterns and may embed the build number of another build
+configuration. When that build configuration is pinned in the same run, its build
+number is taken from the pinned build and the artifact is pinned right after it.
+Otherwise, the build number is matched as a wildcard against the artifacts of the
+builds, which saves looking it up. Independent artifacts are pinned concurrently.
+A JSON summary of the pinned builds is printed.
+"""
+
+import argparse
+import json
+import logging
+import string
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+from artifact_index import BUILD_NUMBER_GLOB
+from build_mirror import BuildMirror, create_build_mirror
+from get_build_number import parse_build_counter
+from http_cache import create_http_cache
+from pin_artifact import pin_artifact
+from request_wrapper import RequestsWrapper
+
+DEFAULT_MANIFEST = Path(__file__).parent / "release_artifacts.json"
+
+# placeholders which are not build numbers
+BUILTIN_PLACEHOLDERS = {"version", "suffix"}
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        required=False,
+        default=DEFAULT_MANIFEST,
+        help="Path to the manifest describing the artifacts of each product.",
+    )
+
+    parser.add_argument(
+        "--product",
+        type=str,
+        action="append",
+        required=False,
+        help="A product of the manifest whose artifacts are pinned. Can be repeated. If not specified, all products are pinned.",
+    )
+
+    parser.add_argument(
+        "--branch_name",
+        type=str,
+        required=True,
+        help="The branch name.",
+    )
+
+    parser.add_argument(
+        "--version",
+        type=str,
+        required=True,
+        help="The release version.",
+    )
+
+    parser.add_argument(
+        "--tag",
+        type=str,
+        required=True,
+        help="The tag to pin the builds of the artifacts with.",
+    )
+
+    parser.add_argument(
+        "--forked_repo_suffix",
+        type=str,
+        required=False,
+        default="",
+        help="Suffix of the build configuration ids of forked repositories.",
+    )
+
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        required=False,
+        default=8,
+        help="Maximum number of artifacts pinned concurrently.",
+    )
+
+    parser.add_argument(
+        "--summary_file",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the JSON summary of the pinned builds. If not specified, the summary is only printed.",
+    )
+
+    parser.add_argument(
+        "--teamcity_access_token",
+        type=argparse.FileType("r"),
+        required=True,
+        help="The TeamCity access token to authenticate with.",
+    )
+
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
+    return parser.parse_args()
+
+
+def load_manifest(manifest_file: Path) -> Dict:
+    """
+    Load a release artifacts manifest.
+
+    Args:
+        manifest_file : Path
+            Path to the manifest.
+    """
+    with open(manifest_file, "r") as manifest:
+        return json.load(manifest)
+
+
+def get_placeholders(template: str) -> Set[str]:
+    """
+    Get the names of the placeholders of a template string.
+
+    Args:
+        template : str
+            A string with str.format placeholders.
+    """
+    return {
+        field_name
+        for _, field_name, _, _ in string.Formatter().parse(template)
+        if field_name
+    }
+
+
+def get_artifacts(
+    manifest: Dict,
+    products: Optional[Sequence[str]],
+    forked_repo_suffix: str,
+) -> List[Dict]:
+    """
+    Get the artifacts of the specified products, in manifest order.
+
+    Args:
+        manifest : dict
+            The release artifacts manifest.
+        products : list or None
+            The products whose artifacts are returned, all products if None.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+    """
+    products = products or list(manifest["products"])
+    unknown_products = set(products) - set(manifest["products"])
+    if unknown_products:
+        raise Exception(f"Unknown products {sorted(unknown_products)} in manifest.")
+
+    artifacts = []
+    for product in products:
+        for artifact in manifest["products"][product]:
+            artifacts.append(
+                {
+                    "product": product,
+                    "build_config_id": artifact["build_config_id"].format(
+                        suffix=forked_repo_suffix
+                    ),
+                    "artifact_path": artifact.get("artifact_path", ""),
+                    "artifact_name": artifact["artifact_name"],
+                    "download": artifact.get("download"),
+                }
+            )
+    return artifacts
+
+
+def get_artifact_placeholders(artifact: Dict) -> Set[str]:
+    """
+    Get the build number placeholders of the path and name of an artifact.
+
+    Args:
+        artifact : dict
+            An artifact as returned by get_artifacts.
+    """
+    placeholders = get_placeholders(artifact["artifact_path"]) | get_placeholders(
+        artifact["artifact_name"]
+    )
+    return placeholders - BUILTIN_PLACEHOLDERS
+
+
+def pin_artifacts(
+    manifest: Dict,
+    products: Optional[Sequence[str]],
+    branch_name: str,
+    version: str,
+    tag: str,
+    forked_repo_suffix: str,
+    request: RequestsWrapper,
+    max_workers: int = 8,
+    mirror: Optional[BuildMirror] = None,
+) -> List[Dict]:
+    """
+    Pin and tag the artifacts of the specified products.
+
+    Args:
+        manifest : dict
+            The release artifacts manifest.
+        products : list or None
+            The products whose artifacts are pinned, all products if None.
+        branch_name : str
+            The name of the branch.
+        version : str
+            The release version.
+        tag : str
+            The tag to pin the builds of the artifacts with.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        max_workers : int
+            Maximum number of artifacts pinned concurrently.
+        mirror : BuildMirror, optional
+            The mirror the builds are looked up in, the server if not provided.
+
+    Returns:
+        list
+            One summary entry per artifact, in manifest order.
+    """
+    artifacts = get_artifacts(manifest, products, forked_repo_suffix)
+    build_numbers = {
+        name: {
+            "build_config_id": spec["build_config_id"].format(
+                suffix=forked_repo_suffix
+            ),
+            "last_successful_build": spec.get("last_successful_build", False),
+        }
+        for name, spec in manifest["build_numbers"].items()
+    }
+
+    needed = set().union(*(get_artifact_placeholders(x) for x in artifacts))
+    unknown = needed - set(build_numbers)
+    if unknown:
+        raise Exception(f"Unknown build numbers {sorted(unknown)} in manifest.")
+
+    # tagged build numbers of build configurations pinned in this run are taken
+    # from the pinned builds instead of being looked up
+    pinned_build_config_ids = {x["build_config_id"] for x in artifacts}
+    deferred = {
+        name
+        for name in needed
+        if not build_numbers[name]["last_successful_build"]
+        and build_numbers[name]["build_config_id"] in pinned_build_config_ids
+    }
+
+    # the other build numbers are matched against the artifacts of the builds
+    resolved = {name: BUILD_NUMBER_GLOB for name in needed - deferred}
+    summary = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def pin(artifact: Dict) -> Dict:
+            substitutions = {"version": version, "suffix": forked_repo_suffix}
+            substitutions.update(resolved)
+            artifact = {
+                **artifact,
+                "artifact_path": artifact["artifact_path"].format(**substitutions),
+                "artifact_name": artifact["artifact_name"].format(**substitutions),
+            }
+            build = pin_artifact(
+                branch_name,
+                artifact["build_config_id"],
+                tag,
+                artifact["artifact_path"],
+                artifact["artifact_name"],
+                request,
+                mirror,
+            )
+            if build is None:
+                return summarize(artifact, None, "no build with the artifact found")
+            return summarize(artifact, build)
+
+        pending = list(range(len(artifacts)))
+        while pending:
+            ready = [
+                i
+                for i in pending
+                if get_artifact_placeholders(artifacts[i]) <= set(resolved)
+            ]
+            if not ready:
+                for i in pending:
+                    missing = get_artifact_placeholders(artifacts[i]) - set(resolved)
+                    logging.warning(
+                        f"Could not pin artifact '{artifacts[i]['artifact_name']}': "
+                        f"unresolved build numbers {sorted(missing)}."
+                    )
+                    summary[i] = summarize(
+                        artifacts[i],
+                        None,
+                        f"unresolved build numbers {sorted(missing)}",
+                    )
+                break
+
+            for i, entry in zip(
+                ready, executor.map(pin, (artifacts[i] for i in ready))
+            ):
+                summary[i] = entry
+                if not entry["pinned"]:
+                    continue
+                for name in deferred:
+                    if (
+                        build_numbers[name]["build_config_id"]
+                        == entry["build_config_id"]
+                    ):
+                        resolved[name] = parse_build_counter(entry["build_number"])
+
+            pending = [i for i in pending if i not in ready]
+
+    return [summary[i] for i in range(len(artifacts))]
+
+
+def summarize(
+    artifact: Dict,
+    build: Optional[Dict],
+    error: Optional[str] = None,
+) -> Dict:
+    """
+    Get the summary entry of an artifact.
+
+    Args:
+        artifact : dict
+            An artifact as returned by get_artifacts, with its path and name expanded
+            if possible.
+        build : dict or None
+            The pinned build, None if the artifact was not pinned.
+        error : str, optional
+            Why the artifact was not pinned.
+    """
+    return {
+        "product": artifact["product"],
+        "build_config_id": artifact["build_config_id"],
+        "artifact_path": artifact["artifact_path"],
+        "artifact_name": artifact["artifact_name"],
+        "pinned": build is not None,
+        "build_id": build["id"] if build else None,
+        "build_number": build["number"] if build else None,
+        "error": error,
+    }
+
+
+def run(
+    manifest_file: Path,
+    products: Optional[Sequence[str]],
+    branch_name: str,
+    version: str,
+    tag: str,
+    forked_repo_suffix: str,
+    max_workers: int,
+    summary_file: Optional[Path],
+    teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+    build_mirror: Optional[Path] = None,
+    request: Optional[RequestsWrapper] = None,
+    mirror: Optional[BuildMirror] = None,
+) -> List[Dict]:
+    """
+    Runs the script with the specified parameters.
+
+    Args:
+        manifest_file : Path
+            Path to the manifest describing the artifacts of each product.
+        products : list or None
+            The products whose artifacts are pinned, all products if None.
+        branch_name : str
+            The name of the branch.
+        version : str
+            The release version.
+        tag : str
+            The tag to pin the builds of the artifacts with.
+        forked_repo_suffix : str
+            Suffix of the build configuration ids of forked repositories.
+        max_workers : int
+            Maximum number of artifacts pinned concurrently.
+        summary_file : Path or None
+            Path of the JSON summary of the pinned builds.
+        teamcity_access_token : str
+            The TeamCity access token to authenticate with.
+        http_cache_dir : Path, optional
+            Directory of the persistent TeamCity response cache.
+        build_mirror : Path, optional
+            Path of the SQLite mirror of the TeamCity builds.
+        request : RequestsWrapper, optional
+            An authenticated request wrapper to reuse, created from the token otherwise.
+        mirror : BuildMirror, optional
+            An open build mirror to reuse, opened from build_mirror otherwise.
+    """
+    if request is None:
+        request = RequestsWrapper(
+            teamcity_access_token, create_http_cache(http_cache_dir)
+        )
+    if mirror is None:
+        mirror = create_build_mirror(build_mirror)
+    summary = pin_artifacts(
+        load_manifest(manifest_file),
+        products,
+        branch_name,
+        version,
+        tag,
+        forked_repo_suffix,
+        request,
+        max_workers,
+        mirror,
+    )
+
+    if summary_file:
+        with open(summary_file, "w") as file:
+            json.dump(summary, file, indent=4)
+    print(json.dumps(summary, indent=4))
+    return summary
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        run(
+            args.manifest,
+            args.product,
+            args.branch_name,
+            args.version,
+            args.tag,
+            args.forked_repo_suffix,
+            args.max_workers,
+            args.summary_file,
+            args.teamcity_access_token.read(),
+            args.http_cache_dir,
+            args.build_mirror,
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
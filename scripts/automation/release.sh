@@ -11,6 +11,7 @@ source ${scripts_path}/usage.sh
 source ${scripts_path}/parse_arguments.sh
 source ${scripts_path}/work_dir.sh
 source ${scripts_path}/conda_env.sh
+source ${scripts_path}/release_agent.sh
 source ${scripts_path}/github.sh
 source ${scripts_path}/monitor_checks_on_branch.sh
 source ${scripts_path}/pause_teamcity_auto_updates.sh
@@ -42,7 +43,7 @@ function release() {
         create_pull_request ${repo_name} ${release_branch} ${tag}
         monitor_pull_request_checks ${repo_name} ${release_branch}
         create_release ${repo_name} ${release_branch} ${tag}
-        pin_and_tag_artifacts_${product} ${release_branch} ${version} ${tag} ${teamcity_access_token}
+        pin_and_tag_artifacts ${product} ${release_branch} ${version} ${tag} ${teamcity_access_token}
         if ${auto_merge}; then
             merge_release_tag_into_base_branch ${repo_name} ${tag}
             monitor_checks_on_base_branch ${repo_name}
@@ -70,6 +71,8 @@ function main() {
 
     create_conda_env ${scripts_path}/conda_env.yml
 
+    start_release_agent
+
     pause_automatic_teamcity_updates
 
     release "MeshKernel" ${repo_name_MeshKernel}
@@ -81,17 +84,18 @@ function main() {
 
     resume_automatic_teamcity_updates
 
-    download_python_wheels ${release_branch} ${version} ${tag} ${teamcity_access_token}
-    download_nuget_packages ${release_branch} ${version} ${tag} ${teamcity_access_token}
-    download_msi ${release_branch} ${version} ${tag} ${teamcity_access_token}
+    download_artifacts ${release_branch} ${version} ${tag} ${teamcity_access_token}
 
     upload_python_wheels_to_github ${tag}
     upload_nuget_packages_to_github ${tag}
     upload_msi_to_github ${tag}
+    upload_checksums_to_github ${tag}
     if ${upload_to_pypi}; then
         upload_python_wheels_to_pypi ${pypi_access_token}
     fi
 
+    stop_release_agent
+
     remove_conda_env
 
     remove_work_dir
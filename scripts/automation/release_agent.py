@@ -0,0 +1,434 @@
+"""
+Long-lived process serving the TeamCity steps of a release.
+
+The release script starts the agent once and sends it commands as JSON lines,
+either over stdin/stdout (as a bash coprocess) or over a Unix socket. All commands
+share one authenticated session, hence its connection pool, and the response and
+artifact caches, instead of paying for an interpreter, the imports, the token and
+a TLS handshake per step.
+
+Each request is a JSON object with a "command" and the arguments of the command,
+named after the options of the corresponding script. An optional "id" is echoed.
+Each response is a JSON object with "ok" and either "result" or "error":
+
+    {"id": 1, "command": "build-number", "build_config_id": "...", "version": "1.2.3"}
+    {"id": 1, "ok": true, "result": "42"}
+
+Commands: ping, build-number, pause, pin, download and shutdown. In stdin/stdout
+mode the output of the commands is written to stderr, stdout carries responses only.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+import download_release_artifacts
+import pin_artifacts
+from build_mirror import create_build_mirror
+from get_build_number import find_build_counter
+from http_cache import create_http_cache
+from pause_teamcity_build_config import pause_build_configs, resume_build_configs
+from pin_artifacts import DEFAULT_MANIFEST
+from request_wrapper import RequestsWrapper
+from streaming_download import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_CHUNK_SIZE, MIB
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the Unix socket to serve commands on. If not specified, commands are read from stdin.",
+    )
+
+    parser.add_argument(
+        "--teamcity_access_token",
+        type=argparse.FileType("r"),
+        required=True,
+        help="The TeamCity access token to authenticate with.",
+    )
+
+    parser.add_argument(
+        "--http_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the persistent TeamCity response cache. If not specified, responses are not cached.",
+    )
+
+    parser.add_argument(
+        "--artifact_cache_dir",
+        type=Path,
+        required=False,
+        default=None,
+        help="Directory of the content-addressed artifact cache. If not specified, artifacts are not cached.",
+    )
+
+    parser.add_argument(
+        "--build_mirror",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the SQLite mirror of the TeamCity builds lookups are answered from. If not specified, builds are looked up on the server.",
+    )
+
+    return parser.parse_args()
+
+
+class ReleaseAgent:
+    """
+    Executes release commands with one authenticated TeamCity session.
+
+    Attributes:
+    - teamcity_access_token (str): The TeamCity access token to authenticate with.
+    - http_cache_dir (Path or None): Directory of the persistent TeamCity response cache.
+    - artifact_cache_dir (Path or None): Directory of the content-addressed artifact cache.
+    - build_mirror (Path or None): Path of the SQLite mirror of the TeamCity builds.
+    - mirror (BuildMirror or None): The mirror shared by all commands.
+    - request (RequestsWrapper): The request wrapper shared by all commands.
+    - build_counters (dict): The build counters resolved so far, by build configuration,
+      version and whether the last build is taken instead of the tagged one.
+    - running (bool): Whether the agent accepts further commands.
+    """
+
+    def __init__(
+        self,
+        teamcity_access_token: str,
+        http_cache_dir: Optional[Path] = None,
+        artifact_cache_dir: Optional[Path] = None,
+        build_mirror: Optional[Path] = None,
+    ):
+        """
+        Initialize the agent and its session.
+
+        Args:
+        - teamcity_access_token (str): The TeamCity access token to authenticate with.
+        - http_cache_dir (Path, optional): Directory of the persistent TeamCity response cache.
+        - artifact_cache_dir (Path, optional): Directory of the content-addressed artifact cache.
+        - build_mirror (Path, optional): Path of the SQLite mirror of the TeamCity builds.
+        """
+        self.teamcity_access_token = teamcity_access_token
+        self.http_cache_dir = http_cache_dir
+        self.artifact_cache_dir = artifact_cache_dir
+        self.build_mirror = build_mirror
+        self.mirror = create_build_mirror(build_mirror)
+        self.request = RequestsWrapper(
+            teamcity_access_token, create_http_cache(http_cache_dir)
+        )
+        self.build_counters: Dict[Tuple[str, str, bool], str] = {}
+        self.running = True
+        self.commands = {
+            "ping": self.ping,
+            "build-number": self.build_number,
+            "pause": self.pause,
+            "pin": self.pin,
+            "download": self.download,
+            "shutdown": self.shutdown,
+        }
+
+    def handle(self, message: Dict) -> Dict:
+        """
+        Execute a command.
+
+        Args:
+        - message (dict): The command and its arguments.
+
+        Returns:
+        - dict: The response, with the result of the command or the error it raised.
+        """
+        response = {"id": message["id"]} if "id" in message else {}
+        arguments = {
+            name: value
+            for name, value in message.items()
+            if name not in ("id", "command")
+        }
+        try:
+            command = self.commands.get(message.get("command"))
+            if command is None:
+                raise Exception(f"Unknown command {message.get('command')!r}.")
+            response.update(ok=True, result=command(**arguments))
+        except Exception as error:
+            logging.debug("Command failed", exc_info=True)
+            response.update(ok=False, error=str(error))
+        return response
+
+    def ping(self) -> Dict:
+        """
+        Check that the agent is alive.
+
+        Returns:
+        - dict: The process id of the agent.
+        """
+        return {"pid": os.getpid()}
+
+    def build_number(
+        self,
+        build_config_id: str,
+        version: str,
+        last_successful_build: bool = False,
+    ) -> str:
+        """
+        Get the counter of the tagged (or last) build of the release branch of version.
+
+        The counters are resolved once and reused by the next steps of the release,
+        until pinning moves the tags.
+
+        Args:
+        - build_config_id (str): The build configuration ID.
+        - version (str): The release version.
+        - last_successful_build (bool): Whether to ignore the tag and get the last build.
+
+        Returns:
+        - str: The build counter.
+        """
+        key = (build_config_id, version, last_successful_build)
+        if key not in self.build_counters:
+            self.build_counters[key] = find_build_counter(
+                build_config_id,
+                version,
+                last_successful_build,
+                self.request,
+                self.mirror,
+            )
+        return self.build_counters[key]
+
+    def pause(
+        self,
+        build_config_ids: Sequence[str],
+        pause: bool = True,
+        snapshot_file: Optional[str] = None,
+        max_workers: int = 8,
+    ) -> List[str]:
+        """
+        Pause or resume build configurations concurrently, see pause_teamcity_build_config.py.
+
+        Args:
+        - build_config_ids (list): The IDs of the build configurations.
+        - pause (bool): pauses the build configurations if true, resumes them otherwise
+        - snapshot_file (str, optional): Path of the snapshot of the paused build configurations.
+        - max_workers (int): Maximum number of concurrent requests.
+
+        Returns:
+        - list: The IDs of the paused or resumed build configurations.
+        """
+        snapshot_file = Path(snapshot_file) if snapshot_file else None
+        if pause:
+            return pause_build_configs(
+                build_config_ids, self.request, snapshot_file, max_workers
+            )
+        return resume_build_configs(
+            build_config_ids, self.request, snapshot_file, max_workers
+        )
+
+    def pin(
+        self,
+        branch_name: str,
+        version: str,
+        tag: str,
+        product: Optional[Sequence[str]] = None,
+        forked_repo_suffix: str = "",
+        max_workers: int = 8,
+        summary_file: Optional[str] = None,
+        manifest: str = str(DEFAULT_MANIFEST),
+    ) -> List[Dict]:
+        """
+        Pin and tag the artifacts of products, see pin_artifacts.py.
+
+        Returns:
+        - list: One summary entry per artifact.
+        """
+        try:
+            return pin_artifacts.run(
+                Path(manifest),
+                product,
+                branch_name,
+                version,
+                tag,
+                forked_repo_suffix,
+                max_workers,
+                Path(summary_file) if summary_file else None,
+                self.teamcity_access_token,
+                mirror=self.mirror,
+                request=self.request,
+            )
+        finally:
+            # tagged builds may have changed, even if pinning failed halfway
+            self.build_counters.clear()
+
+    def download(
+        self,
+        branch_name: str,
+        version: str,
+        tag: str,
+        destination: str,
+        product: Optional[Sequence[str]] = None,
+        forked_repo_suffix: str = "",
+        download_manifest: Optional[str] = None,
+        sha256sums: Optional[str] = None,
+        max_workers: int = 4,
+        chunk_size: int = DEFAULT_CHUNK_SIZE // MIB,
+        max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE // MIB,
+        segments: int = 1,
+        verify_versions: bool = False,
+        manifest: str = str(DEFAULT_MANIFEST),
+    ) -> List[Dict]:
+        """
+        Download the release deliverables of products, see download_release_artifacts.py.
+
+        Returns:
+        - list: One entry per downloaded artifact.
+        """
+        return download_release_artifacts.run(
+            Path(manifest),
+            product,
+            branch_name,
+            version,
+            tag,
+            forked_repo_suffix,
+            Path(destination),
+            Path(download_manifest) if download_manifest else None,
+            Path(sha256sums) if sha256sums else None,
+            max_workers,
+            self.teamcity_access_token,
+            artifact_cache_dir=self.artifact_cache_dir,
+            chunk_size=chunk_size * MIB,
+            max_chunk_size=max_chunk_size * MIB,
+            segments=segments,
+            mirror=self.mirror,
+            verify_versions=verify_versions,
+            request=self.request,
+        )
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting commands once the current one is answered.
+        """
+        self.running = False
+
+
+def handle_line(agent: ReleaseAgent, line: str) -> Dict:
+    """
+    Execute the command of a JSON line.
+
+    Args:
+    - agent (ReleaseAgent): The agent executing the command.
+    - line (str): The JSON request.
+
+    Returns:
+    - dict: The response.
+    """
+    try:
+        message = json.loads(line)
+    except json.JSONDecodeError as error:
+        return {"ok": False, "error": f"Invalid request: {error}"}
+    if not isinstance(message, dict):
+        return {"ok": False, "error": "Invalid request: expected a JSON object."}
+    return agent.handle(message)
+
+
+def serve(agent: ReleaseAgent, requests: TextIO, responses: TextIO) -> None:
+    """
+    Answer the JSON lines of a stream until it ends or the agent is shut down.
+
+    Args:
+    - agent (ReleaseAgent): The agent executing the commands.
+    - requests (TextIO): The stream of requests.
+    - responses (TextIO): The stream the responses are written to.
+    """
+    for line in requests:
+        if not line.strip():
+            continue
+        responses.write(json.dumps(handle_line(agent, line)) + "\n")
+        responses.flush()
+        if not agent.running:
+            return
+
+
+def serve_socket(agent: ReleaseAgent, path: Path) -> None:
+    """
+    Answer the JSON lines of the clients of a Unix socket, one client at a time.
+
+    Args:
+    - agent (ReleaseAgent): The agent executing the commands.
+    - path (Path): The path of the socket.
+    """
+    path.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen()
+        try:
+            while agent.running:
+                connection, _ = server.accept()
+                # separate streams, writing to a read-write text stream drops what it read ahead
+                with connection:
+                    requests = connection.makefile("r", encoding="utf-8")
+                    responses = connection.makefile("w", encoding="utf-8")
+                    with requests, responses:
+                        serve(agent, requests, responses)
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def run(
+    socket_path: Optional[Path],
+    teamcity_access_token: str,
+    http_cache_dir: Optional[Path] = None,
+    artifact_cache_dir: Optional[Path] = None,
+    build_mirror: Optional[Path] = None,
+) -> None:
+    """
+    Runs the script with the specified parameters.
+
+    Args:
+        socket_path : Path or None
+            Path of the Unix socket to serve commands on, stdin/stdout if None.
+        teamcity_access_token : str
+            The TeamCity access token to authenticate with.
+        http_cache_dir : Path, optional
+            Directory of the persistent TeamCity response cache.
+        artifact_cache_dir : Path, optional
+            Directory of the content-addressed artifact cache.
+        build_mirror : Path, optional
+            Path of the SQLite mirror of the TeamCity builds.
+    """
+    agent = ReleaseAgent(
+        teamcity_access_token, http_cache_dir, artifact_cache_dir, build_mirror
+    )
+    try:
+        if socket_path is not None:
+            serve_socket(agent, socket_path)
+            return
+
+        # stdout is reserved for the responses
+        responses = sys.stdout
+        with redirect_stdout(sys.stderr):
+            serve(agent, sys.stdin, responses)
+    finally:
+        if agent.mirror is not None:
+            agent.mirror.close()
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        run(
+            args.socket,
+            args.teamcity_access_token.read(),
+            args.http_cache_dir,
+            args.artifact_cache_dir,
+            args.build_mirror,
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
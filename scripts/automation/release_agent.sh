@@ -0,0 +1,41 @@
+#!/bin/bash
+
+# The release agent serves the TeamCity steps of the release from a single python
+# process, which keeps one authenticated session and its caches for the whole release.
+# Requests and responses are JSON lines exchanged with the agent coprocess.
+
+function start_release_agent() {
+    show_progress
+    coproc release_agent {
+        python ${scripts_path}/release_agent.py \
+            --teamcity_access_token ${teamcity_access_token} \
+            "${teamcity_http_cache_args[@]}" \
+            "${teamcity_artifact_cache_args[@]}" \
+            "${teamcity_build_mirror_args[@]}"
+    }
+    call_release_agent '{"command": "ping"}' >/dev/null
+}
+
+function call_release_agent() {
+    local request=$1
+    local response
+    echo "${request}" >&${release_agent[1]}
+    if ! read -r response <&${release_agent[0]}; then
+        col_echo --red "Error: the release agent exited unexpectedly" >&2
+        return 1
+    fi
+    if [ "$(echo "${response}" | jq -r '.ok')" != "true" ]; then
+        col_echo --red "Error: $(echo "${response}" | jq -r '.error')" >&2
+        return 1
+    fi
+    echo "${response}" | jq -r '.result // empty'
+}
+
+function stop_release_agent() {
+    show_progress
+    if [[ -n ${release_agent_PID} ]]; then
+        local release_agent_pid=${release_agent_PID}
+        call_release_agent '{"command": "shutdown"}' >/dev/null
+        wait ${release_agent_pid}
+    fi
+}
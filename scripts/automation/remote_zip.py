@@ -0,0 +1,392 @@
+"""
+Reads members of ZIP archives on TeamCity without downloading the archives.
+
+Wheels and nupkgs are ZIP archives whose central directory, at the end of the
+file, lists the offset of each member. The archive is read through HTTP Range
+requests: the first request fetches the tail of the file, which holds the
+central directory of small archives, and each member read afterwards fetches
+only its own bytes. Reading the version of a wheel (*.dist-info/METADATA) or
+of a nupkg (its .nuspec) then costs a few kilobytes instead of the whole file.
+
+If the server does not honour Range requests, the whole file is received by the
+first request and the archive is read from memory.
+
+Members can also be extracted to disk, decompressed and hashed as they stream in.
+"""
+
+import hashlib
+import io
+import os
+import re
+import zipfile
+from email.message import Message
+from email.parser import Parser
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import List, Tuple
+
+from extract_nuspec_version import parse_nuspec_version
+from request_wrapper import RequestsWrapper
+from streaming_download import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_PROGRESS_INTERVAL,
+    DownloadResult,
+    ProgressReporter,
+)
+
+KIB = 1024
+
+# the tail of an archive fetched first, which holds the end of central directory
+# record and, for archives with a few hundred members, the whole central directory
+DEFAULT_TAIL_SIZE = 64 * KIB
+
+# minimum number of bytes fetched by a Range request, so that the headers and the
+# data of a small member are fetched together
+DEFAULT_BLOCK_SIZE = 64 * KIB
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    A read-only, seekable file over HTTP Range requests, which keeps the last
+    fetched block of bytes.
+
+    Attributes:
+    - url (str): The URL of the file.
+    - size (int): The size of the file in bytes.
+    - block_size (int): Minimum number of bytes fetched by a request.
+    - bytes_fetched (int): Number of bytes received so far.
+    - requests (int): Number of requests made so far.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        request: RequestsWrapper,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        tail_size: int = DEFAULT_TAIL_SIZE,
+    ):
+        """
+        Open the file, fetching its tail.
+
+        Args:
+        - url (str): The URL of the file.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        - block_size (int): Minimum number of bytes fetched by a request.
+        - tail_size (int): Number of bytes fetched from the end of the file on opening.
+        """
+        super().__init__()
+        self.url = url
+        self.request = request
+        self.block_size = block_size
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._position = 0
+        self._start, self._data, self.size = self._fetch(f"bytes=-{tail_size}")
+
+    def _fetch(self, byte_range: str) -> Tuple[int, bytes, int]:
+        """
+        Fetch a range of bytes of the file.
+
+        Args:
+        - byte_range (str): The value of the Range header.
+
+        Returns:
+        - tuple: The offset of the bytes received, the bytes, and the size of the file.
+          The whole file if the server does not honour Range requests.
+        """
+        # streamed, so that the response bypasses the cache, which ignores ranges
+        with self.request.get(
+            self.url, headers={"Range": byte_range}, stream=True
+        ) as response:
+            data = response.content
+            self.requests += 1
+            self.bytes_fetched += len(data)
+            if response.status_code != 206:
+                return 0, data, len(data)
+            match = CONTENT_RANGE_PATTERN.fullmatch(
+                response.headers.get("Content-Range", "")
+            )
+            if not match:
+                raise Exception(
+                    f"Range request {byte_range} for {self.url} returned no valid Content-Range."
+                )
+            return int(match.group(1)), data, int(match.group(3))
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}.")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        """
+        Read bytes at the current position, fetching them unless they are all in
+        the last fetched block.
+
+        Args:
+        - buffer (writable bytes-like object): Where the bytes are read to.
+
+        Returns:
+        - int: The number of bytes read, 0 at the end of the file.
+        """
+        count = min(len(buffer), self.size - self._position)
+        if count <= 0:
+            return 0
+        offset = self._position - self._start
+        if offset < 0 or offset + count > len(self._data):
+            last = min(self.size, self._position + max(count, self.block_size)) - 1
+            self._start, self._data, _ = self._fetch(f"bytes={self._position}-{last}")
+            offset = self._position - self._start
+        buffer[:count] = self._data[offset : offset + count]
+        self._position += count
+        return count
+
+
+class RemoteZip:
+    """
+    A ZIP archive on the server whose members are read without downloading it.
+
+    Attributes:
+    - file (RemoteFile): The remote file of the archive.
+    - archive (zipfile.ZipFile): The archive.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        request: RequestsWrapper,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        tail_size: int = DEFAULT_TAIL_SIZE,
+    ):
+        """
+        Open the archive, reading its central directory.
+
+        Args:
+        - url (str): The URL of the archive.
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        - block_size (int): Minimum number of bytes fetched by a request.
+        - tail_size (int): Number of bytes fetched from the end of the archive on opening.
+        """
+        self.file = RemoteFile(url, request, block_size, tail_size)
+        self.archive = zipfile.ZipFile(self.file)
+
+    def __enter__(self) -> "RemoteZip":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the archive.
+        """
+        self.archive.close()
+        self.file.close()
+
+    def namelist(self) -> List[str]:
+        """
+        Get the names of the members of the archive.
+
+        Returns:
+        - list: The names of the members.
+        """
+        return self.archive.namelist()
+
+    def find(self, pattern: str) -> List[str]:
+        """
+        Get the members of the archive matching a glob pattern, * and ? do not match /.
+
+        Args:
+        - pattern (str): The glob pattern.
+
+        Returns:
+        - list: The names of the matching members.
+        """
+        depth = pattern.count("/")
+        return [
+            name
+            for name in self.archive.namelist()
+            if name.count("/") == depth and fnmatchcase(name, pattern)
+        ]
+
+    def find_one(self, pattern: str) -> str:
+        """
+        Get the single member of the archive matching a glob pattern.
+
+        Args:
+        - pattern (str): The glob pattern.
+
+        Returns:
+        - str: The name of the member.
+        """
+        names = self.find(pattern)
+        if len(names) != 1:
+            raise Exception(
+                f"Expected one member matching '{pattern}' in {self.file.url}, found {names}."
+            )
+        return names[0]
+
+    def read(self, name: str) -> bytes:
+        """
+        Read a member of the archive.
+
+        Args:
+        - name (str): The name of the member.
+
+        Returns:
+        - bytes: The uncompressed content of the member.
+        """
+        return self.archive.read(name)
+
+    def extract(
+        self,
+        name: str,
+        path: Path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+    ) -> DownloadResult:
+        """
+        Extract a member of the archive to path, hashing it on the way. The member is
+        written to a '.part' file which replaces path once complete.
+
+        Args:
+        - name (str): The name of the member.
+        - path (Path): The destination file.
+        - chunk_size (int): The size in bytes of the chunks decompressed at once.
+        - progress_interval (float): Minimum number of seconds between two progress reports.
+
+        Returns:
+        - DownloadResult: The path, size and sha256 of the extracted file.
+        """
+        path = Path(path)
+        part_path = path.with_name(f"{path.name}.part")
+        progress = ProgressReporter(
+            path.name, self.archive.getinfo(name).file_size, progress_interval
+        )
+        digest = hashlib.sha256()
+        written = 0
+        with self.archive.open(name) as member, open(part_path, "wb") as file:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                file.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+                progress.advance(len(chunk))
+        progress.finish()
+        os.replace(part_path, path)
+        return DownloadResult(path, written, digest.hexdigest())
+
+
+def read_wheel_metadata(archive: RemoteZip) -> Message:
+    """
+    Read the core metadata of a wheel.
+
+    Args:
+    - archive (RemoteZip): The wheel.
+
+    Returns:
+    - email.message.Message: The metadata, e.g. metadata["Version"].
+    """
+    metadata = archive.read(archive.find_one("*.dist-info/METADATA"))
+    return Parser().parsestr(metadata.decode("utf-8"))
+
+
+def read_nuspec_version(archive: RemoteZip) -> str:
+    """
+    Read the version of a nupkg from its nuspec.
+
+    Args:
+    - archive (RemoteZip): The nupkg.
+
+    Returns:
+    - str: The version of the package.
+    """
+    nuspec = archive.read(archive.find_one("*.nuspec"))
+    return parse_nuspec_version(io.BytesIO(nuspec))
+
+
+def read_package_version(archive: RemoteZip, artifact_name: str) -> str:
+    """
+    Read the version of a wheel or nupkg.
+
+    Args:
+    - archive (RemoteZip): The package.
+    - artifact_name (str): The name of the package file.
+
+    Returns:
+    - str: The version of the package.
+    """
+    if artifact_name.endswith(".whl"):
+        return read_wheel_metadata(archive)["Version"]
+    if artifact_name.endswith(".nupkg"):
+        return read_nuspec_version(archive)
+    raise Exception(f"{artifact_name} is neither a wheel nor a nupkg.")
+
+
+def is_package(artifact_name: str) -> bool:
+    """
+    Whether an artifact is a package whose version can be read remotely.
+
+    Args:
+    - artifact_name (str): The name of the artifact.
+
+    Returns:
+    - bool: True for wheels and nupkgs.
+    """
+    return artifact_name.endswith((".whl", ".nupkg"))
+
+
+def matches_release_version(package_version: str, version: str) -> bool:
+    """
+    Whether the version of a package is that of a release, nupkgs carry the build
+    counter as a fourth component.
+
+    Args:
+    - package_version (str): The version of the package.
+    - version (str): The release version.
+
+    Returns:
+    - bool: True if the versions match.
+    """
+    return package_version == version or package_version.startswith(f"{version}.")
+
+
+def get_remote_package_version(
+    url: str,
+    artifact_name: str,
+    request: RequestsWrapper,
+) -> str:
+    """
+    Read the version of a wheel or nupkg on the server.
+
+    Args:
+    - url (str): The URL of the package.
+    - artifact_name (str): The name of the package file.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+
+    Returns:
+    - str: The version of the package.
+    """
+    with RemoteZip(url, request) as archive:
+        return read_package_version(archive, artifact_name)
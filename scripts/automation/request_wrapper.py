@@ -7,6 +7,8 @@ BUILDS_ROOT = f"{TEAMCITY_URL}/app/rest/builds"
 # BUILDS_ROOT = f"{TEAMCITY_URL}/httpAuth/app/rest/builds":
 BUILDS_QUEUE_ROOT = f"{TEAMCITY_URL}/app/rest/buildQueue"
 DOWNLOADS_ROOT = f"{TEAMCITY_URL}/repository/download"
+BUILD_LOG_ROOT = f"{TEAMCITY_URL}/downloadBuildLog.html"
+CHANGES_ROOT = f"{TEAMCITY_URL}/app/rest/changes"
 
 import requests
 
@@ -14,41 +16,53 @@ import requests
 import requests
 from typing import Optional, Dict, Union
 
+from http_cache import HttpCache
+from json_codec import JsonResponse, as_json_response
+
 
 class RequestsWrapper:
     """
     A wrapper class around requests.Session to simplify authenticated HTTP requests.
 
+    Responses are JsonResponse objects, which decode their body once however many
+    times json() is called.
+
     Attributes:
     - session (requests.Session): Session object to maintain connection settings and headers.
+    - cache (HttpCache or None): Optional on-disk cache of GET responses.
 
     Methods:
-    - __init__(token: str): Initialize the RequestsWrapper with a token for authentication.
+    - __init__(token: str, cache: HttpCache = None): Initialize the RequestsWrapper with a token for authentication.
     - _reset_headers(headers: dict): Manages the headers of the requests
-    - get(url: str, headers: dict = None, **kwargs) -> requests.Response:
-        Perform a GET request.
-    - post(url: str, data: dict = None, json: dict = None, headers: dict = None, **kwargs) -> requests.Response:
+    - get(url: str, headers: dict = None, use_cache: bool = True, **kwargs) -> JsonResponse:
+        Perform a GET request, served from or revalidated against the cache if any.
+    - head(url: str, headers: dict = None, **kwargs) -> JsonResponse:
+        Perform a HEAD request.
+    - post(url: str, data: dict = None, json: dict = None, headers: dict = None, **kwargs) -> JsonResponse:
         Perform a POST request.
-    - put(url: str, data: dict = None, headers: dict = None, **kwargs) -> requests.Response:
+    - put(url: str, data: dict = None, headers: dict = None, **kwargs) -> JsonResponse:
         Perform a PUT request.
-    - delete(url: str, headers: dict = None, **kwargs) -> requests.Response:
+    - delete(url: str, headers: dict = None, **kwargs) -> JsonResponse:
         Perform a DELETE request.
-    - patch(url: str, data: dict = None, headers: dict = None, **kwargs) -> requests.Response:
+    - patch(url: str, data: dict = None, headers: dict = None, **kwargs) -> JsonResponse:
         Perform a PATCH request.
     """
 
     def __init__(
         self,
         token: str,
+        cache: Optional[HttpCache] = None,
     ):
         """
         Initialize a RequestsWrapper instance with a token for authentication.
 
         Args:
         - token (str): The authentication token to be used for API requests.
+        - cache (HttpCache, optional): On-disk cache of GET responses. Disabled if not provided.
         """
         self.session = requests.Session()
         self.session.headers.update({"Authorization": f"Bearer {token}"})
+        self.cache = cache
 
     def _reset_headers(
         self,
@@ -72,23 +86,106 @@ class RequestsWrapper:
         self,
         url: str,
         headers: Optional[Dict[str, str]] = None,
+        use_cache: bool = True,
         **kwargs,
-    ) -> requests.Response:
+    ) -> JsonResponse:
         """
         Perform a GET request using the configured session.
 
         Args:
         - url (str): The URL for the GET request.
         - headers (dict, optional): Additional headers to include in the request.
+        - use_cache (bool): Whether the response may be served from the cache. The
+          response of a request bypassing the cache is not stored either.
 
         Returns:
-        - requests.Response: The response object from the GET request.
+        - JsonResponse: The response object from the GET request.
         """
         headers = self._reset_headers(headers)
+        if use_cache and self.cache is not None and not kwargs.get("stream", False):
+            return self._cached_get(url, headers, **kwargs)
         response = self.session.get(url, headers=headers, **kwargs)
         response.raise_for_status()
+        return as_json_response(response)
+
+    def _cached_get(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        **kwargs,
+    ) -> JsonResponse:
+        """
+        Perform a GET request through the cache.
+
+        Immutable entries are served without contacting the server, other entries
+        are revalidated with a conditional request.
+
+        Args:
+        - url (str): The URL for the GET request.
+        - headers (dict): The headers to include in the request.
+
+        Returns:
+        - JsonResponse: The cached or fresh response object.
+        """
+        key = self.cache.key(url, kwargs.get("params"), headers.get("Accept"))
+        meta = self.cache.lookup(key)
+        if meta is not None and self.cache.is_fresh(meta):
+            cached = self.cache.to_response(key, meta)
+            if cached is not None:
+                return cached
+            # evicted since the lookup
+            meta = None
+
+        if meta is not None:
+            validated_headers = {**headers, **self.cache.validators(meta)}
+            response = self.session.get(url, headers=validated_headers, **kwargs)
+            if response.status_code == 304:
+                cached = self.cache.to_response(key, meta)
+                if cached is not None:
+                    self.cache.refresh(key, meta)
+                    return cached
+                # evicted since the lookup, the body is requested again
+                response = self.session.get(url, headers=headers, **kwargs)
+        else:
+            response = self.session.get(url, headers=headers, **kwargs)
+
+        response.raise_for_status()
+        # converted first, so that the body decoded by the cache is decoded once
+        response = as_json_response(response)
+        self.cache.store(key, response)
         return response
 
+    def head(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> JsonResponse:
+        """
+        Perform a HEAD request using the configured session.
+
+        Args:
+        - url (str): The URL for the HEAD request.
+        - headers (dict, optional): Additional headers to include in the request.
+
+        Returns:
+        - JsonResponse: The response object from the HEAD request.
+        """
+        headers = self._reset_headers(headers)
+        response = self.session.head(url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return as_json_response(response)
+
+    def _invalidate(self, url: str) -> None:
+        """
+        Drop the cached entries of the build modified by a request to url.
+
+        Args:
+        - url (str): The URL of the modifying request.
+        """
+        if self.cache is not None:
+            self.cache.invalidate_build(url)
+
     def post(
         self,
         url: str,
@@ -96,7 +193,7 @@ class RequestsWrapper:
         json: Optional[Dict[str, Union[str, int]]] = None,
         headers: Optional[Dict[str, str]] = None,
         **kwargs,
-    ) -> requests.Response:
+    ) -> JsonResponse:
         """
         Perform a POST request using the configured session.
 
@@ -107,14 +204,15 @@ class RequestsWrapper:
         - headers (dict, optional): Additional headers to include in the request.
 
         Returns:
-        - requests.Response: The response object from the POST request.
+        - JsonResponse: The response object from the POST request.
         """
         headers = self._reset_headers(headers)
+        self._invalidate(url)
         response = self.session.post(
             url, data=data, json=json, headers=headers, **kwargs
         )
         response.raise_for_status()
-        return response
+        return as_json_response(response)
 
     def put(
         self,
@@ -122,7 +220,7 @@ class RequestsWrapper:
         data: Optional[Dict[str, Union[str, int]]] = None,
         headers: Optional[Dict[str, str]] = None,
         **kwargs,
-    ) -> requests.Response:
+    ) -> JsonResponse:
         """
         Perform a PUT request using the configured session.
 
@@ -132,19 +230,20 @@ class RequestsWrapper:
         - headers (dict, optional): Additional headers to include in the request.
 
         Returns:
-        - requests.Response: The response object from the PUT request.
+        - JsonResponse: The response object from the PUT request.
         """
         headers = self._reset_headers(headers)
+        self._invalidate(url)
         response = self.session.put(url, data=data, headers=headers, **kwargs)
         response.raise_for_status()
-        return response
+        return as_json_response(response)
 
     def delete(
         self,
         url: str,
         headers: Optional[Dict[str, str]] = None,
         **kwargs,
-    ) -> requests.Response:
+    ) -> JsonResponse:
         """
         Perform a DELETE request using the configured session.
 
@@ -153,12 +252,13 @@ class RequestsWrapper:
         - headers (dict, optional): Additional headers to include in the request.
 
         Returns:
-        - requests.Response: The response object from the DELETE request.
+        - JsonResponse: The response object from the DELETE request.
         """
         headers = self._reset_headers(headers)
+        self._invalidate(url)
         response = self.session.delete(url, headers=headers, **kwargs)
         response.raise_for_status()
-        return response
+        return as_json_response(response)
 
     def patch(
         self,
@@ -166,7 +266,7 @@ class RequestsWrapper:
         data: Optional[Dict[str, Union[str, int]]] = None,
         headers: Optional[Dict[str, str]] = None,
         **kwargs,
-    ) -> requests.Response:
+    ) -> JsonResponse:
         """
         Perform a PATCH request using the configured session.
 
@@ -176,9 +276,10 @@ class RequestsWrapper:
         - headers (dict, optional): Additional headers to include in the request.
 
         Returns:
-        - requests.Response: The response object from the PATCH request.
+        - JsonResponse: The response object from the PATCH request.
         """
         headers = self._reset_headers(headers)
+        self._invalidate(url)
         response = self.session.patch(url, data=data, headers=headers, **kwargs)
         response.raise_for_status()
-        return response
+        return as_json_response(response)
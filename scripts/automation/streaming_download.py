@@ -0,0 +1,699 @@
+"""
+Streams HTTP response bodies to disk with bounded memory.
+
+The body is read in chunks whose size adapts to the observed throughput: the
+chunk size grows while chunks arrive quickly and shrinks when they do not,
+within configurable bounds. The destination file is preallocated from the
+Content-Length when known, and progress and throughput are reported
+periodically.
+
+Large files can be downloaded in segments: when the server honours HTTP Range
+requests, byte ranges of the file are fetched concurrently into the
+preallocated destination file. Otherwise, the file is streamed as a whole.
+
+Ranged downloads are written to a '.part' file next to the destination, with a
+sidecar journal recording the build, the expected size and the bytes completed
+in each segment. An interrupted download is resumed from the journal on the
+next attempt, provided that it addresses the same build and size.
+
+The sha256 of a download is computed from the bytes as they stream through, so
+that the file does not have to be read again. Of a segmented download, only the
+leading bytes arriving in order can be hashed inline; the remainder is hashed
+from the '.part' file once all segments are complete.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple
+
+import requests
+
+from request_wrapper import RequestsWrapper
+
+MIB = 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 1 * MIB
+MIN_CHUNK_SIZE = 256 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 16 * MIB
+
+# the chunk size is adapted so that reading one chunk takes about this long
+TARGET_CHUNK_DURATION = 0.25  # seconds
+
+DEFAULT_PROGRESS_INTERVAL = 5.0  # seconds
+
+# files are not split in segments smaller than this
+MIN_SEGMENT_SIZE = 8 * MIB
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+# minimum number of seconds between two saves of a download journal
+JOURNAL_SAVE_INTERVAL = 1.0
+
+SHA256SUMS_NAME = "SHA256SUMS"
+
+# size of the blocks read back from disk to complete the hash of a segmented download
+HASH_BLOCK_SIZE = 1 * MIB
+
+
+@dataclass(frozen=True)
+class DownloadResult:
+    """
+    The outcome of a download.
+
+    Attributes:
+    - path (Path): The downloaded file.
+    - size (int): The size of the file in bytes.
+    - sha256 (str): The hexadecimal sha256 digest of the file.
+    """
+
+    path: Path
+    size: int
+    sha256: str
+
+
+class PrefixHasher:
+    """
+    Computes the sha256 of a file written in possibly concurrent, out-of-order chunks.
+
+    Chunks extending the contiguous prefix hashed so far are hashed as they arrive;
+    the others are left for finish, which hashes the rest of the file from disk.
+
+    Attributes:
+    - offset (int): The number of leading bytes hashed so far.
+    """
+
+    def __init__(self):
+        """
+        Initialize a PrefixHasher instance.
+        """
+        self.offset = 0
+        self._digest = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def update(self, offset: int, chunk: bytes) -> None:
+        """
+        Hash chunk if it starts where the hashed prefix ends.
+
+        Args:
+        - offset (int): The offset of chunk in the file.
+        - chunk (bytes): The written bytes.
+        """
+        with self._lock:
+            if offset == self.offset:
+                self._digest.update(chunk)
+                self.offset += len(chunk)
+
+    def finish(self, path: Path) -> str:
+        """
+        Hash the bytes of path after the hashed prefix and get the digest.
+
+        Args:
+        - path (Path): The complete file.
+
+        Returns:
+        - str: The hexadecimal sha256 digest of the file.
+        """
+        with self._lock, open(path, "rb") as file:
+            file.seek(self.offset)
+            while True:
+                block = file.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                self._digest.update(block)
+                self.offset += len(block)
+            return self._digest.hexdigest()
+
+
+class ProgressReporter:
+    """
+    Periodically prints the progress and throughput of a transfer.
+
+    The reporter can be shared by the threads transferring the segments of a file.
+
+    Attributes:
+    - name (str): The name of the transferred item.
+    - total (int or None): The expected number of bytes, None if unknown.
+    - interval (float): Minimum number of seconds between two reports.
+    - done (int): The number of bytes transferred so far.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        total: Optional[int],
+        interval: float = DEFAULT_PROGRESS_INTERVAL,
+        initial: int = 0,
+    ):
+        """
+        Initialize a ProgressReporter instance.
+
+        Args:
+        - name (str): The name of the transferred item.
+        - total (int or None): The expected number of bytes, None if unknown.
+        - interval (float): Minimum number of seconds between two reports.
+        - initial (int): The number of bytes transferred before, e.g. by an interrupted download.
+        """
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.done = initial
+        self._initial = initial
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_report = self._start
+
+    def advance(self, count: int) -> None:
+        """
+        Account for count more transferred bytes, reporting if the last report is
+        older than the interval.
+
+        Args:
+        - count (int): The number of bytes transferred since the last call.
+        """
+        with self._lock:
+            self.done += count
+            if time.monotonic() - self._last_report >= self.interval:
+                self._report()
+
+    def finish(self) -> None:
+        """
+        Report the final progress.
+        """
+        with self._lock:
+            self._report()
+
+    def _report(self) -> None:
+        now = time.monotonic()
+        self._last_report = now
+        elapsed = max(now - self._start, 1e-6)
+        throughput = (self.done - self._initial) / MIB / elapsed
+        if self.total:
+            percentage = 100.0 * self.done / self.total
+            print(
+                f"{self.name}: {self.done / MIB:.1f}/{self.total / MIB:.1f} MiB "
+                f"({percentage:.0f}%) at {throughput:.1f} MiB/s",
+                flush=True,
+            )
+        else:
+            print(
+                f"{self.name}: {self.done / MIB:.1f} MiB at {throughput:.1f} MiB/s",
+                flush=True,
+            )
+
+
+def adapt_chunk_size(
+    chunk_size: int,
+    duration: float,
+    max_chunk_size: int,
+) -> int:
+    """
+    Get the size of the next chunk from the time it took to read the last one.
+
+    Args:
+    - chunk_size (int): The size of the last chunk.
+    - duration (float): The number of seconds it took to read the last chunk.
+    - max_chunk_size (int): The upper bound of the chunk size.
+
+    Returns:
+    - int: The size of the next chunk.
+    """
+    if duration < TARGET_CHUNK_DURATION / 2:
+        chunk_size *= 2
+    elif duration > TARGET_CHUNK_DURATION * 2:
+        chunk_size //= 2
+    return max(MIN_CHUNK_SIZE, min(chunk_size, max_chunk_size))
+
+
+def preallocate(file: BinaryIO, size: int) -> None:
+    """
+    Reserve size bytes on disk for file.
+
+    Args:
+    - file (BinaryIO): The file opened for writing.
+    - size (int): The expected size of the file.
+    """
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except (AttributeError, OSError):
+        # not available on this platform or file system
+        file.truncate(size)
+
+
+def copy_stream(
+    response: requests.Response,
+    file: BinaryIO,
+    chunk_size: int,
+    max_chunk_size: int,
+    on_chunk: Callable[[bytes], None],
+) -> int:
+    """
+    Copy the body of a streamed response to file at its current position.
+
+    Args:
+    - response (requests.Response): A response obtained with stream=True.
+    - file (BinaryIO): The destination file.
+    - chunk_size (int): The initial chunk size in bytes.
+    - max_chunk_size (int): The upper bound of the chunk size in bytes.
+    - on_chunk (callable): Called with each chunk once it is written.
+
+    Returns:
+    - int: The number of bytes written.
+    """
+    chunk_size = max(MIN_CHUNK_SIZE, min(chunk_size, max_chunk_size))
+    written = 0
+    while True:
+        start = time.monotonic()
+        chunk = response.raw.read(chunk_size, decode_content=True)
+        if not chunk:
+            return written
+        file.write(chunk)
+        written += len(chunk)
+        if len(chunk) == chunk_size:
+            chunk_size = adapt_chunk_size(
+                chunk_size, time.monotonic() - start, max_chunk_size
+            )
+        on_chunk(chunk)
+
+
+def stream_to_file(
+    response: requests.Response,
+    path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+) -> Tuple[int, str]:
+    """
+    Write the body of a streamed response to path, hashing it on the way.
+
+    Args:
+    - response (requests.Response): A response obtained with stream=True.
+    - path (Path): The destination file.
+    - chunk_size (int): The initial chunk size in bytes.
+    - max_chunk_size (int): The upper bound of the chunk size in bytes.
+    - progress_interval (float): Minimum number of seconds between two progress reports.
+
+    Returns:
+    - tuple: The number of bytes written and their hexadecimal sha256 digest.
+    """
+    expected_size = None
+    if "Content-Length" in response.headers and not response.headers.get(
+        "Content-Encoding"
+    ):
+        expected_size = int(response.headers["Content-Length"])
+
+    progress = ProgressReporter(Path(path).name, expected_size, progress_interval)
+    digest = hashlib.sha256()
+
+    def on_chunk(chunk: bytes) -> None:
+        digest.update(chunk)
+        progress.advance(len(chunk))
+
+    with open(path, "wb") as file:
+        if expected_size:
+            preallocate(file, expected_size)
+        written = copy_stream(
+            response,
+            file,
+            chunk_size,
+            max_chunk_size,
+            on_chunk,
+        )
+        file.truncate(written)
+
+    progress.finish()
+    if expected_size is not None and written != expected_size:
+        raise Exception(
+            f"Incomplete download of {path}: got {written} of {expected_size} bytes."
+        )
+    return written, digest.hexdigest()
+
+
+def get_ranged_size(url: str, request: RequestsWrapper) -> Optional[int]:
+    """
+    Get the size of the resource at url if the server honours Range requests for it.
+
+    The server is first asked with a HEAD request. If it does not advertise
+    Accept-Ranges, a one-byte Range request tells whether ranges are honoured.
+
+    Args:
+    - url (str): The URL of the resource.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+
+    Returns:
+    - int or None: The size in bytes, None if Range requests are not supported.
+    """
+    try:
+        response = request.head(url, allow_redirects=True)
+        if (
+            response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            and "Content-Length" in response.headers
+        ):
+            return int(response.headers["Content-Length"])
+
+        with request.get(url, headers={"Range": "bytes=0-0"}, stream=True) as probe:
+            match = CONTENT_RANGE_PATTERN.fullmatch(
+                probe.headers.get("Content-Range", "")
+            )
+            if probe.status_code == 206 and match:
+                return int(match.group(1))
+    except requests.RequestException:
+        pass
+
+    return None
+
+
+def split_in_segments(size: int, segments: int) -> List[Tuple[int, int]]:
+    """
+    Split size bytes in at most segments contiguous byte ranges.
+
+    Args:
+    - size (int): The number of bytes.
+    - segments (int): The maximum number of ranges.
+
+    Returns:
+    - list: The (first, last) inclusive byte offsets of each range.
+    """
+    segments = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+    segment_size = -(-size // segments)
+    return [
+        (first, min(first + segment_size, size) - 1)
+        for first in range(0, size, segment_size)
+    ]
+
+
+class DownloadJournal:
+    """
+    Sidecar journal of a ranged download to a '.part' file.
+
+    Attributes:
+    - path (Path): The path of the journal file.
+    - build_id (str or None): The id of the build whose artifact is downloaded.
+    - url (str): The URL of the downloaded resource.
+    - size (int): The expected size in bytes of the resource.
+    - segments (list): The [first, last, done] byte offsets and completed bytes of each segment.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        build_id: Optional[str],
+        url: str,
+        size: int,
+        segments: List[List[int]],
+    ):
+        """
+        Initialize a DownloadJournal instance.
+
+        Args:
+        - path (Path): The path of the journal file.
+        - build_id (str or None): The id of the build whose artifact is downloaded.
+        - url (str): The URL of the downloaded resource.
+        - size (int): The expected size in bytes of the resource.
+        - segments (list): The [first, last, done] byte offsets and completed bytes of each segment.
+        """
+        self.path = Path(path)
+        self.build_id = build_id
+        self.url = url
+        self.size = size
+        self.segments = segments
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        build_id: Optional[str],
+        url: str,
+        size: int,
+    ) -> Optional["DownloadJournal"]:
+        """
+        Load the journal at path if it describes the same download.
+
+        Args:
+        - path (Path): The path of the journal file.
+        - build_id (str or None): The id of the build whose artifact is downloaded.
+        - url (str): The URL of the downloaded resource.
+        - size (int): The expected size in bytes of the resource.
+
+        Returns:
+        - DownloadJournal or None: The journal, None if absent, unreadable or stale.
+        """
+        try:
+            with open(path, "r") as journal_file:
+                content = json.load(journal_file)
+        except (OSError, ValueError):
+            return None
+
+        if (content.get("build_id"), content.get("url"), content.get("size")) != (
+            build_id,
+            url,
+            size,
+        ):
+            return None
+        return cls(path, build_id, url, size, content["segments"])
+
+    @property
+    def completed(self) -> int:
+        """
+        The number of bytes completed in all segments.
+        """
+        return sum(done for _, _, done in self.segments)
+
+    def advance(self, index: int, count: int) -> None:
+        """
+        Account for count more bytes synced to disk in segment index, saving the
+        journal if the last save is older than JOURNAL_SAVE_INTERVAL.
+
+        Args:
+        - index (int): The index of the segment.
+        - count (int): The number of bytes synced since the last call.
+        """
+        with self._lock:
+            self.segments[index][2] += count
+            if time.monotonic() - self._last_save >= JOURNAL_SAVE_INTERVAL:
+                self._save()
+
+    def save(self) -> None:
+        """
+        Save the journal.
+        """
+        with self._lock:
+            self._save()
+
+    def remove(self) -> None:
+        """
+        Remove the journal file.
+        """
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save(self) -> None:
+        self._last_save = time.monotonic()
+        content = {
+            "build_id": self.build_id,
+            "url": self.url,
+            "size": self.size,
+            "segments": self.segments,
+        }
+        temporary_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(temporary_path, "w") as journal_file:
+            json.dump(content, journal_file)
+        os.replace(temporary_path, self.path)
+
+
+def download_segment(
+    url: str,
+    part_path: Path,
+    index: int,
+    journal: DownloadJournal,
+    request: RequestsWrapper,
+    chunk_size: int,
+    max_chunk_size: int,
+    progress: ProgressReporter,
+    hasher: PrefixHasher,
+) -> None:
+    """
+    Download the remaining bytes of a segment of url into the preallocated file part_path.
+
+    Args:
+    - url (str): The URL of the resource.
+    - part_path (Path): The preallocated '.part' file.
+    - index (int): The index of the segment in the journal.
+    - journal (DownloadJournal): The journal of the download.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - chunk_size (int): The initial chunk size in bytes.
+    - max_chunk_size (int): The upper bound of the chunk size in bytes.
+    - progress (ProgressReporter): The progress reporter shared by all segments.
+    - hasher (PrefixHasher): The hasher shared by all segments.
+    """
+    first, last, done = journal.segments[index]
+    if first + done > last:
+        return
+
+    headers = {"Range": f"bytes={first + done}-{last}"}
+    offset = first + done
+
+    with request.get(url, headers=headers, stream=True) as response:
+        if response.status_code != 206:
+            raise Exception(
+                f"Range request {headers['Range']} for {url} returned {response.status_code}."
+            )
+        with open(part_path, "r+b") as file:
+            file.seek(first + done)
+            # the journal only accounts for the bytes synced to disk, so that a resume
+            # after a crash does not skip bytes which were still buffered
+            unsynced = 0
+            last_sync = time.monotonic()
+
+            def sync() -> None:
+                nonlocal unsynced, last_sync
+                file.flush()
+                os.fsync(file.fileno())
+                journal.advance(index, unsynced)
+                unsynced = 0
+                last_sync = time.monotonic()
+
+            def on_chunk(chunk: bytes) -> None:
+                nonlocal offset, unsynced
+                hasher.update(offset, chunk)
+                offset += len(chunk)
+                unsynced += len(chunk)
+                progress.advance(len(chunk))
+                if time.monotonic() - last_sync >= JOURNAL_SAVE_INTERVAL:
+                    sync()
+
+            try:
+                copy_stream(response, file, chunk_size, max_chunk_size, on_chunk)
+            finally:
+                sync()
+
+    if journal.segments[index][2] != last - first + 1:
+        raise Exception(
+            f"Incomplete segment {headers['Range']} of {url}: got {journal.segments[index][2] - done} bytes."
+        )
+
+
+def download_file(
+    url: str,
+    path: Path,
+    request: RequestsWrapper,
+    segments: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+    build_id: Optional[str] = None,
+) -> DownloadResult:
+    """
+    Download url to path, in concurrent segments if requested and possible.
+
+    When the server honours Range requests, the download goes through a '.part'
+    file and its journal, and resumes an interrupted download of the same build.
+
+    Args:
+    - url (str): The URL of the resource.
+    - path (Path): The destination file.
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - segments (int): The number of byte ranges downloaded concurrently.
+        The file is streamed as a whole if the server does not honour Range requests.
+    - chunk_size (int): The initial chunk size in bytes.
+    - max_chunk_size (int): The upper bound of the chunk size in bytes.
+    - progress_interval (float): Minimum number of seconds between two progress reports.
+    - build_id (str, optional): The id of the build whose artifact is downloaded,
+        against which a partial download is validated before it is resumed.
+
+    Returns:
+    - DownloadResult: The path, size and sha256 of the downloaded file.
+    """
+    path = Path(path)
+    part_path = path.with_name(f"{path.name}.part")
+    journal_path = path.with_name(f"{path.name}.part.json")
+
+    size = get_ranged_size(url, request)
+    if not size:
+        for stale_path in (part_path, journal_path):
+            if stale_path.exists():
+                stale_path.unlink()
+        with request.get(url, stream=True) as response:
+            written, sha256 = stream_to_file(
+                response, part_path, chunk_size, max_chunk_size, progress_interval
+            )
+        os.replace(part_path, path)
+        return DownloadResult(path, written, sha256)
+
+    journal = None
+    if part_path.exists() and part_path.stat().st_size == size:
+        journal = DownloadJournal.load(journal_path, build_id, url, size)
+    if journal is None:
+        journal = DownloadJournal(
+            journal_path,
+            build_id,
+            url,
+            size,
+            [[first, last, 0] for first, last in split_in_segments(size, segments)],
+        )
+        with open(part_path, "wb") as file:
+            preallocate(file, size)
+        journal.save()
+    elif journal.completed:
+        print(
+            f"Resuming download of {path.name} at {journal.completed / MIB:.1f} MiB.",
+            flush=True,
+        )
+
+    progress = ProgressReporter(path.name, size, progress_interval, journal.completed)
+    hasher = PrefixHasher()
+    try:
+        with ThreadPoolExecutor(max_workers=len(journal.segments)) as executor:
+            downloads = [
+                executor.submit(
+                    download_segment,
+                    url,
+                    part_path,
+                    index,
+                    journal,
+                    request,
+                    chunk_size,
+                    max_chunk_size,
+                    progress,
+                    hasher,
+                )
+                for index in range(len(journal.segments))
+            ]
+            for download in downloads:
+                download.result()
+    finally:
+        journal.save()
+
+    progress.finish()
+    written = journal.completed
+    if written != size or os.path.getsize(part_path) != size:
+        raise Exception(
+            f"Incomplete download of {path}: got {written} of {size} bytes."
+        )
+    sha256 = hasher.finish(part_path)
+    os.replace(part_path, path)
+    journal.remove()
+    return DownloadResult(path, written, sha256)
+
+
+def write_sha256sums(results: Sequence[DownloadResult], path: Path) -> None:
+    """
+    Write the digests of downloaded files in the format of sha256sum.
+
+    Args:
+    - results (list): The results of the downloads.
+    - path (Path): The checksums file.
+    """
+    with open(path, "w") as sums_file:
+        for result in sorted(results, key=lambda x: Path(x.path).name):
+            sums_file.write(f"{result.sha256}  {Path(result.path).name}\n")
@@ -0,0 +1,140 @@
+"""
+Lazy iteration over paged TeamCity REST collections.
+
+TeamCity returns collections (builds, queued builds, changes, ...) one page at a
+time, with the URL of the next page in 'nextHref'. The iterator yields the items
+of a page while the next page is prefetched in a background thread, and stops
+requesting pages as soon as the caller stops consuming items.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+from request_wrapper import TEAMCITY_URL, RequestsWrapper
+
+HEADERS = {"Accept": "application/json"}
+
+# number of items requested per page when the locator does not specify it
+DEFAULT_PAGE_SIZE = 100
+
+
+def with_page_size(locator: str, count: Optional[int]) -> str:
+    """
+    Add a count dimension to a locator which has none.
+
+    Args:
+    - locator (str): The locator of the collection.
+    - count (int or None): The number of items per page, the server default if None.
+
+    Returns:
+    - str: The locator with the count dimension.
+    """
+    if count is None or "count:" in locator:
+        return locator
+    return f"{locator},count:{count}" if locator else f"count:{count}"
+
+
+def with_next_href(fields: Optional[str], item_key: str) -> Optional[str]:
+    """
+    Add nextHref to a fields projection which has none.
+
+    Args:
+    - fields (str or None): The fields projection, the server default if None.
+    - item_key (str): The key of the items in a page.
+
+    Returns:
+    - str or None: The fields projection including nextHref.
+    """
+    if fields is None or "nextHref" in fields:
+        return fields
+    if not fields.startswith(f"{item_key}("):
+        fields = f"{item_key}({fields})"
+    return f"nextHref,{fields}"
+
+
+def iterate_collection(
+    url: str,
+    params: Dict[str, str],
+    item_key: str,
+    request: RequestsWrapper,
+    count: Optional[int] = DEFAULT_PAGE_SIZE,
+    prefetch: bool = True,
+) -> Iterator[Dict]:
+    """
+    Iterate lazily over the items of a paged TeamCity collection.
+
+    While the items of a page are consumed, the next page is requested in a
+    background thread. Stopping the iteration early (break, or closing the
+    generator) leaves the remaining pages unrequested, apart from the one being
+    prefetched.
+
+    Args:
+    - url (str): The URL of the collection, e.g. BUILDS_ROOT.
+    - params (dict): The query parameters, with the locator and fields of the items.
+    - item_key (str): The key of the items in a page, e.g. "build".
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+    - count (int or None): The number of items per page if the locator does not specify it.
+    - prefetch (bool): Whether the next page is requested while the current one is consumed.
+
+    Yields:
+    - dict: The items of the collection, in server order.
+    """
+    params = dict(params)
+    if "locator" in params:
+        params["locator"] = with_page_size(params["locator"], count)
+    fields = with_next_href(params.get("fields"), item_key)
+    if fields is not None:
+        params["fields"] = fields
+
+    def get_page(page_url: str, page_params: Optional[Dict[str, str]]) -> Dict:
+        return request.get(page_url, params=page_params, headers=HEADERS).json()
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    next_page: Optional[Future] = None
+    try:
+        page = get_page(url, params)
+        while True:
+            next_href = page.get("nextHref")
+            if next_href and executor is not None:
+                next_page = executor.submit(
+                    get_page, f"{TEAMCITY_URL}{next_href}", None
+                )
+
+            yield from page.get(item_key, [])
+
+            if not next_href:
+                return
+            if next_page is not None:
+                page, next_page = next_page.result(), None
+            else:
+                page = get_page(f"{TEAMCITY_URL}{next_href}", None)
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def first_item(
+    url: str,
+    params: Dict[str, str],
+    item_key: str,
+    request: RequestsWrapper,
+) -> Optional[Dict]:
+    """
+    Get the first item of a TeamCity collection, requesting a single item.
+
+    Args:
+    - url (str): The URL of the collection, e.g. BUILDS_ROOT.
+    - params (dict): The query parameters, with the locator and fields of the items.
+    - item_key (str): The key of the items in a page, e.g. "build".
+    - request (RequestsWrapper): The request wrapper to make requests calls.
+
+    Returns:
+    - dict or None: The first item, None if the collection is empty.
+    """
+    items = iterate_collection(url, params, item_key, request, count=1, prefetch=False)
+    try:
+        return next(items, None)
+    finally:
+        items.close()
@@ -0,0 +1,191 @@
+"""
+Builder of TeamCity REST locators and field projections.
+
+Locators are composed from typed dimensions instead of string concatenation, so
+values are escaped consistently, dimensions which are not set are left out and
+nested locators (buildType:(id:...), snapshotDependency:(...)) compose. Queries
+always carry a fields projection, so the server only serializes the fields which
+are used.
+"""
+
+import base64
+from typing import Dict, Optional, Union
+
+# characters with a meaning in the locator syntax
+SPECIAL_CHARACTERS = frozenset(",:()")
+
+
+class Locator(str):
+    """
+    A locator built by locator(), used as is when nested in another locator.
+    """
+
+
+LocatorValue = Union[str, int, bool, Locator, None]
+
+
+def has_balanced_parentheses(value: str) -> bool:
+    """
+    Check whether the parentheses of a value are balanced.
+
+    Args:
+    - value (str): The value to check.
+
+    Returns:
+    - bool: Whether every closing parenthesis matches an opening one.
+    """
+    depth = 0
+    for character in value:
+        if character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def escape_value(value: LocatorValue) -> str:
+    """
+    Format a value of a locator dimension.
+
+    Booleans are formatted as true/false and nested locators are enclosed in
+    parentheses. Strings with commas or parentheses are enclosed in parentheses,
+    strings which cannot be enclosed (colons, unbalanced parentheses, a leading $)
+    are base64 encoded.
+
+    Args:
+    - value (str, int, bool or Locator): The value of the dimension.
+
+    Returns:
+    - str: The value as it appears in the locator.
+    """
+    if isinstance(value, Locator):
+        return f"({value})"
+    if isinstance(value, bool):
+        return str(value).lower()
+    value = str(value)
+    if value and not SPECIAL_CHARACTERS.intersection(value) and value[0] != "$":
+        return value
+    if value and ":" not in value and value[0] != "$":
+        if has_balanced_parentheses(value):
+            return f"({value})"
+    encoded = base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+    return f"$base64:{encoded}"
+
+
+def dimension_name(name: str) -> str:
+    """
+    Get the TeamCity name of a dimension given as a Python keyword.
+
+    Args:
+    - name (str): The dimension in snake case, e.g. build_type.
+
+    Returns:
+    - str: The dimension in camel case, e.g. buildType.
+    """
+    head, *tail = name.split("_")
+    return head + "".join(word.capitalize() for word in tail)
+
+
+def locator(**dimensions: LocatorValue) -> Locator:
+    """
+    Compose a locator from its dimensions, in the order given.
+
+    Dimensions set to None are left out. Snake case names are converted to the
+    camel case of TeamCity, e.g. default_filter=False gives defaultFilter:false.
+
+    Args:
+    - dimensions: The values of the dimensions.
+
+    Returns:
+    - Locator: The locator.
+    """
+    return Locator(
+        ",".join(
+            f"{dimension_name(name)}:{escape_value(value)}"
+            for name, value in dimensions.items()
+            if value is not None
+        )
+    )
+
+
+def build_locator(
+    build_type: Optional[str] = None,
+    branch: Optional[str] = None,
+    tag: Optional[str] = None,
+    status: Optional[str] = None,
+    pinned: Optional[bool] = None,
+    revision: Optional[str] = None,
+    running: Optional[Union[bool, str]] = None,
+    canceled: Optional[bool] = None,
+    snapshot_dependency: Optional[Locator] = None,
+    default_filter: Optional[bool] = None,
+    count: Optional[int] = None,
+) -> Locator:
+    """
+    Compose a locator of builds.
+
+    Args:
+    - build_type (str or None): The id of the build configuration.
+    - branch (str or None): The name of the branch.
+    - tag (str or None): A tag of the builds.
+    - status (str or None): The status of the builds, e.g. SUCCESS.
+    - pinned (bool or None): Whether the builds are pinned.
+    - revision (str or None): The VCS revision built.
+    - running (bool, str or None): Whether the builds are running, "any" for both.
+    - canceled (bool or None): Whether the builds are canceled.
+    - snapshot_dependency (Locator or None): The snapshot dependency relation.
+    - default_filter (bool or None): Whether the default filter applies.
+    - count (int or None): The maximum number of builds per page.
+
+    Returns:
+    - Locator: The locator.
+    """
+    return locator(
+        build_type=locator(id=build_type) if build_type is not None else None,
+        branch=branch,
+        tag=tag,
+        status=status,
+        pinned=pinned,
+        revision=revision,
+        running=running,
+        canceled=canceled,
+        snapshot_dependency=snapshot_dependency,
+        default_filter=default_filter,
+        count=count,
+    )
+
+
+def projection(item_key: str, fields: str) -> str:
+    """
+    Project the items of a collection on fields.
+
+    Args:
+    - item_key (str): The key of the items, e.g. "build".
+    - fields (str): The fields of the items, e.g. "id,number".
+
+    Returns:
+    - str: The fields projection of the collection.
+    """
+    return f"{item_key}({fields})"
+
+
+def collection_query(
+    item_key: str, fields: str, item_locator: Optional[Locator] = None
+) -> Dict[str, str]:
+    """
+    Get the query parameters of a collection, projected on the fields of its items.
+
+    Args:
+    - item_key (str): The key of the items, e.g. "build".
+    - fields (str): The fields of the items, e.g. "id,number".
+    - item_locator (Locator or None): The locator of the items, all items if None.
+
+    Returns:
+    - dict: The locator and fields query parameters.
+    """
+    params = {"fields": projection(item_key, fields)}
+    if item_locator:
+        params["locator"] = item_locator
+    return params
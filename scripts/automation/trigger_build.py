@@ -1,11 +1,65 @@
 import argparse
+import json
 import sys
 import time
-
-from request_wrapper import BUILDS_QUEUE_ROOT, BUILDS_ROOT, RequestsWrapper
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from request_wrapper import (
+    BUILD_LOG_ROOT,
+    BUILDS_QUEUE_ROOT,
+    BUILDS_ROOT,
+    CHANGES_ROOT,
+    RequestsWrapper,
+)
+from teamcity_collection import first_item, iterate_collection
+from teamcity_locator import build_locator, collection_query, locator
 
 HEADERS = {"Accept": "application/json"}
 
+# fields driving the polling schedule of a build
+POLL_FIELDS = "state,status,running-info(elapsedSeconds,estimatedTotalSeconds)"
+
+# fields of the builds of a chain fetched at each tick of the watcher
+CHAIN_BUILD_FIELDS = f"id,buildTypeId,{POLL_FIELDS}"
+
+# floor of the adaptive refresh interval
+DEFAULT_MIN_REFRESH_INTERVAL = 5  # seconds
+
+# seconds during which no new dependent build may appear once all builds finished,
+# only needed by chains whose dependent builds are queued by finish build triggers
+DEFAULT_SETTLE_TIME = 0
+
+# fields of a failed build included in the failure report
+FAILURE_FIELDS = "id,buildTypeId,number,state,status,statusText,webUrl"
+
+# fields of the builds of a chain from which the time spent queued and running is derived
+TIMING_FIELDS = "id,buildTypeId,state,queuedDate,startDate,finishDate"
+
+# format of the dates of the TeamCity REST API
+TEAMCITY_DATE_FORMAT = "%Y%m%dT%H%M%S%z"
+
+# number of trailing log lines of a failed build included in the failure report
+LOG_TAIL_LINES = 50
+
+
+def parse_property(argument: str) -> Tuple[str, str]:
+    """
+    Parse a name=value build parameter.
+
+    Args:
+        argument : str
+            The build parameter, formatted as name=value.
+    """
+    name, separator, value = argument.partition("=")
+    if not separator or not name:
+        raise argparse.ArgumentTypeError(f"Expected name=value, got '{argument}'.")
+    return name, value
+
 
 def parse_arguments():
     """
@@ -32,8 +86,84 @@ def parse_arguments():
         "-f",
         type=int,
         required=True,
-        help="Refresh interval in seconds used to check the status of the triggered build",
+        help="Maximum refresh interval in seconds used to check the status of the triggered build. The interval shortens as builds near their estimated finish.",
+    )
+
+    parser.add_argument(
+        "--min_refresh_interval",
+        type=int,
+        required=False,
+        default=DEFAULT_MIN_REFRESH_INTERVAL,
+        help="Minimum refresh interval in seconds used to check the status of the triggered build.",
+    )
+
+    parser.add_argument(
+        "--settle_time",
+        type=int,
+        required=False,
+        default=DEFAULT_SETTLE_TIME,
+        help="Seconds to wait for new dependent builds to be queued once all builds of the chain finished. Only needed for chains with finish build triggers, by default the watcher returns as soon as the last build finishes.",
+    )
+
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="Reuse a queued build of the branch, or a running or successful build of its head revision, instead of triggering a new build. The head revision is the latest change TeamCity detected, so commits pushed since TeamCity last checked for changes are not built.",
+    )
+
+    parser.add_argument(
+        "--move_to_top",
+        action="store_true",
+        help="Move the triggered build to the top of the build queue.",
+    )
+
+    parser.add_argument(
+        "--agent_id",
+        type=int,
+        required=False,
+        default=None,
+        help="The id of the agent to run the triggered build on.",
     )
+
+    parser.add_argument(
+        "--agent_pool_id",
+        type=int,
+        required=False,
+        default=None,
+        help="The id of the agent pool to run the triggered build on.",
+    )
+
+    parser.add_argument(
+        "--comment",
+        type=str,
+        required=False,
+        default=None,
+        help="The comment of the triggered build.",
+    )
+
+    parser.add_argument(
+        "--property",
+        type=parse_property,
+        action="append",
+        required=False,
+        default=[],
+        help="A name=value build parameter of the triggered build. Can be repeated.",
+    )
+
+    parser.add_argument(
+        "--fail_fast",
+        action="store_true",
+        help="Stream the logs of the running builds of the chain and cancel the remaining builds as soon as one fails.",
+    )
+
+    parser.add_argument(
+        "--report_file",
+        type=Path,
+        required=False,
+        default=None,
+        help="Path of the JSON failure report. If not specified, the report is only printed.",
+    )
+
     parser.add_argument(
         "--teamcity_access_token",
         type=argparse.FileType("r"),
@@ -44,17 +174,143 @@ def parse_arguments():
     return parser.parse_args()
 
 
+def get_head_revision(
+    branch_name: str,
+    build_config_id: str,
+    request: RequestsWrapper,
+) -> Optional[str]:
+    """
+    Get the latest VCS revision of a branch detected by a build configuration.
+
+    Args:
+        branch_name: str
+            The name of the branch.
+        build_config_id : str
+            The id of the build configuration.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+
+    Returns:
+        str or None
+            The revision, None if no change was detected on the branch.
+    """
+    params = collection_query(
+        "change",
+        "version",
+        build_locator(build_type=build_config_id, branch=branch_name, count=1),
+    )
+    change = first_item(CHANGES_ROOT, params, "change", request)
+    return change["version"] if change else None
+
+
+def find_matching_build(
+    branch_name: str,
+    build_config_id: str,
+    request: RequestsWrapper,
+) -> Optional[Dict]:
+    """
+    Find a build of a branch which a new build would duplicate.
+
+    Queued builds of the branch build its head revision once they start, so they
+    match. Running and finished builds match if they build the head revision and
+    did not fail. The head revision is the latest change detected by TeamCity, which
+    misses commits pushed since TeamCity last checked for changes.
+
+    Args:
+        branch_name: str
+            The name of the branch.
+        build_config_id : str
+            The id of the build configuration.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+
+    Returns:
+        dict or None
+            The id, state and revision of the matching build, None if there is none.
+    """
+    params = collection_query(
+        "build", "id,state,branchName", build_locator(build_type=build_config_id)
+    )
+    for build in iterate_collection(BUILDS_QUEUE_ROOT, params, "build", request):
+        if build.get("branchName") == branch_name:
+            return {"id": build["id"], "state": build["state"], "revision": None}
+
+    revision = get_head_revision(branch_name, build_config_id, request)
+    if revision is None:
+        return None
+
+    params = collection_query(
+        "build",
+        "id,state",
+        build_locator(
+            build_type=build_config_id,
+            branch=branch_name,
+            revision=revision,
+            status="SUCCESS",
+            running="any",
+            canceled=False,
+            count=1,
+        ),
+    )
+    build = first_item(BUILDS_ROOT, params, "build", request)
+    if build is None:
+        return None
+    return {"id": build["id"], "state": build["state"], "revision": revision}
+
+
+def move_to_top_of_queue(build_id: int, request: RequestsWrapper) -> None:
+    """
+    Move a queued build to the top of the build queue.
+
+    Args:
+        build_id : int
+            The id of the queued build.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+    """
+    request.put(f"{BUILDS_QUEUE_ROOT}/order/1", headers=HEADERS, json={"id": build_id})
+    print(f"Moved build with id {build_id} to the top of the queue.")
+
+
 def trigger_build(
     branch_name: str,
     build_config_id: str,
     request: RequestsWrapper,
+    reuse: bool = False,
+    move_to_top: bool = False,
+    agent_id: Optional[int] = None,
+    agent_pool_id: Optional[int] = None,
+    comment: Optional[str] = None,
+    properties: Sequence[Tuple[str, str]] = (),
 ) -> int:
 
+    # reuse a build of the head revision of the branch instead of enqueuing a
+    # duplicate, only on request: the head revision is the latest change TeamCity
+    # detected, which lags behind commits pushed since it last checked for changes
+    if reuse:
+        build = find_matching_build(branch_name, build_config_id, request)
+        if build is not None:
+            revision = f" on revision {build['revision']}" if build["revision"] else ""
+            print(f"Reusing {build['state']} build with id {build['id']}{revision}.")
+            if move_to_top and build["state"] == "queued":
+                move_to_top_of_queue(build["id"], request)
+            return build["id"]
+
     # setup payload for triggering the build
     build_trigger_json = {
         "buildType": {"id": build_config_id},
         "branchName": branch_name,
     }
+    if agent_id is not None:
+        build_trigger_json["agent"] = {"id": agent_id}
+    if agent_pool_id is not None:
+        build_trigger_json["agentPool"] = {"id": agent_pool_id}
+    if comment:
+        build_trigger_json["comment"] = {"text": comment}
+    if properties:
+        build_trigger_json["properties"] = {
+            "property": [{"name": name, "value": value} for name, value in properties]
+        }
 
     # trigger the build
     response = request.post(BUILDS_QUEUE_ROOT, headers=HEADERS, json=build_trigger_json)
@@ -66,81 +322,420 @@ def trigger_build(
         print(f"Failed to trigger build (Status code: {response.status_code})")
         return False
 
-    return response.json()["id"]
+    build_id = response.json()["id"]
+    if move_to_top:
+        move_to_top_of_queue(build_id, request)
+    return build_id
+
+
+def get_refresh_interval(
+    build: Dict,
+    min_refresh_interval: float,
+    max_refresh_interval: float,
+) -> float:
+    """
+    Get the number of seconds to wait before polling a build again.
+
+    Queued builds are polled at the maximum interval. Running builds are polled
+    after half of their estimated remaining time, so that polls are rare early on
+    and frequent close to the expected finish. Builds past their estimate are polled
+    after as long as they have overrun it, which doubles the overrun at each poll, so
+    that the interval backs off from the minimum to the maximum. Builds without an
+    estimate are polled at the maximum interval.
+
+    Args:
+        build : dict
+            The build, with its state and running-info.
+        min_refresh_interval : float
+            The floor of the interval in seconds.
+        max_refresh_interval : float
+            The ceiling of the interval in seconds.
+    """
+    min_refresh_interval = min(min_refresh_interval, max_refresh_interval)
+    if build["state"] == "queued":
+        return max_refresh_interval
+
+    running_info = build.get("running-info", {})
+    estimated = running_info.get("estimatedTotalSeconds")
+    elapsed = running_info.get("elapsedSeconds")
+    if estimated is None or elapsed is None:
+        return max_refresh_interval
+
+    remaining = estimated - elapsed
+    if remaining < 0:
+        return max(min_refresh_interval, min(-remaining, max_refresh_interval))
+    return max(min_refresh_interval, min(remaining / 2, max_refresh_interval))
 
 
-def wait_for_build(
+def get_dependent_builds(
     build_id: int,
-    refresh_interval: int,
     request: RequestsWrapper,
-) -> bool:
+    include_initial: bool = False,
+    fields: str = CHAIN_BUILD_FIELDS,
+) -> List[Dict]:
+    """
+    Get the queued, running and finished builds snapshot-depending on a build.
 
-    # construct the url for checking the build state and status
-    build_url = f"{BUILDS_ROOT}/{build_id}"
+    Args:
+        build_id : int
+            The id of the build.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        include_initial : bool
+            Whether the build itself is included.
+        fields : str
+            The fields of the builds to get.
+
+    Returns:
+        list
+            The builds, with the requested fields.
+    """
+    params = collection_query(
+        "build",
+        fields,
+        build_locator(
+            snapshot_dependency=locator(
+                from_=locator(id=build_id), include_initial=include_initial
+            ),
+            default_filter=False,
+        ),
+    )
 
-    # Poll for the build state until it's finished then check if it was successful
-    print(f"Waiting for build with id {build_id}...")
-    while True:
-        response = request.get(build_url, headers=HEADERS)
-        json_content = response.json()
-        # Check if the build is finished
-        if json_content["state"] == "finished":
-            print("Build finished.")
-            # Check if the build was successful
-            if json_content["status"] == "SUCCESS":
-                print("Build succeeded.")
-                return True
-            else:
-                print("Build failed.")
-                return False
-
-        # Wait for refresh_interval seconds before checking again
-        time.sleep(refresh_interval)
-
-
-def get_dependent_builds(build_id, request):
-    # Construct the URL for retrieving dependent builds
-    url = f"{BUILDS_ROOT}?locator=snapshotDependency:(from:(id:{build_id}))"
-
-    # Make an HTTP GET request to retrieve dependent builds
-    response = request.get(url, headers=HEADERS)
-
-    # Check if the request was successful
-    if response.status_code == 200:
-        return response.json()["build"]
-    else:
-        print(
-            f"Failed to retrieve dependent builds (Status code: {response.status_code})"
+    return list(iterate_collection(BUILDS_ROOT, params, "build", request))
+
+
+def describe_build(build: Dict) -> str:
+    """
+    Describe the state of a build of a chain in a single line.
+
+    Args:
+        build : dict
+            The build, as returned by get_dependent_builds.
+    """
+    description = f"Build config {build['buildTypeId']} (build id: {build['id']}): {build['state']}"
+    if build["state"] == "finished":
+        description = f"{description} ({build.get('status', 'UNKNOWN')})"
+    return description
+
+
+class BuildLogTail:
+    """
+    Incrementally reads the log of a build.
+
+    Each read requests the bytes past the offset reached so far with a Range
+    header. Servers that ignore the Range header send the whole log, from which
+    only the new part is kept.
+
+    Attributes:
+    - build (dict): The build whose log is read.
+    - offset (int): The number of bytes of the log read so far.
+    - lines (deque): The last lines of the log.
+    """
+
+    def __init__(self, build: Dict):
+        """
+        Initialize a BuildLogTail instance.
+
+        Args:
+        - build (dict): The build whose log is read, with its id and buildTypeId.
+        """
+        self.build = build
+        self.offset = 0
+        self.lines = deque(maxlen=LOG_TAIL_LINES)
+        self._partial_line = b""
+
+    def read(self, request: RequestsWrapper) -> List[str]:
+        """
+        Read the lines appended to the log since the last read.
+
+        Args:
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+
+        Returns:
+        - list: The new complete lines.
+        """
+        try:
+            response = request.get(
+                BUILD_LOG_ROOT,
+                params={"buildId": self.build["id"], "plain": "true"},
+                headers={"Range": f"bytes={self.offset}-"},
+            )
+        except requests.HTTPError as error:
+            # the log has not grown past the offset, or is still empty
+            if error.response is not None and error.response.status_code == 416:
+                return []
+            raise
+        if response.status_code == 206:
+            content = response.content
+        else:
+            content = response.content[self.offset :]
+
+        self.offset += len(content)
+        content = self._partial_line + content
+        *complete, self._partial_line = content.split(b"\n")
+        lines = [x.decode("utf-8", errors="replace").rstrip("\r") for x in complete]
+        self.lines.extend(lines)
+        return lines
+
+    def print_new_lines(self, request: RequestsWrapper) -> None:
+        """
+        Print the lines appended to the log since the last read.
+
+        Args:
+        - request (RequestsWrapper): The request wrapper to make requests calls.
+        """
+        for line in self.read(request):
+            print(f"[{self.build['buildTypeId']}] {line}", flush=True)
+
+
+def cancel_builds(
+    builds: List[Dict],
+    comment: str,
+    request: RequestsWrapper,
+) -> List[int]:
+    """
+    Cancel the queued and running builds among builds.
+
+    Args:
+        builds : list
+            The builds, with their id and state.
+        comment : str
+            The reason of the cancellation.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+
+    Returns:
+        list
+            The ids of the canceled builds.
+    """
+    cancel_request = {"comment": comment, "readdIntoQueue": False}
+    canceled_build_ids = []
+    for build in builds:
+        if build["state"] == "queued":
+            url = f"{BUILDS_QUEUE_ROOT}/id:{build['id']}"
+        elif build["state"] == "running":
+            url = f"{BUILDS_ROOT}/id:{build['id']}"
+        else:
+            continue
+        try:
+            request.post(url, headers=HEADERS, json=cancel_request)
+        except Exception as error:
+            print(f"Failed to cancel {describe_build(build)}: {error}")
+            continue
+        print(f"Canceled {describe_build(build)}")
+        canceled_build_ids.append(build["id"])
+    return canceled_build_ids
+
+
+def get_failure_report(
+    builds: List[Dict],
+    canceled_build_ids: List[int],
+    log_tails: Dict[int, BuildLogTail],
+    request: RequestsWrapper,
+) -> Dict:
+    """
+    Get a report of the failed builds of a chain.
+
+    Args:
+        builds : list
+            The builds of the chain.
+        canceled_build_ids : list
+            The ids of the builds canceled because of the failure.
+        log_tails : dict
+            The log tails of the builds, by build id.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+
+    Returns:
+        dict
+            The failed builds with their status text, web URL and last log
+            lines, and the builds canceled and succeeded.
+    """
+    failed_builds = []
+    for build in builds:
+        if build.get("status") == "SUCCESS" or build["id"] in canceled_build_ids:
+            continue
+        response = request.get(
+            f"{BUILDS_ROOT}/id:{build['id']}",
+            params={"fields": FAILURE_FIELDS},
+            headers=HEADERS,
         )
-        return None
+        failure = response.json()
+        log_tail = log_tails.get(build["id"])
+        failure["log_tail"] = list(log_tail.lines) if log_tail else []
+        failed_builds.append(failure)
+
+    return {
+        "failed": failed_builds,
+        "canceled": [x for x in builds if x["id"] in canceled_build_ids],
+        "succeeded": [x for x in builds if x.get("status") == "SUCCESS"],
+    }
+
+
+def watch_build_chain(
+    trigger_build_id: int,
+    refresh_interval: int,
+    request: RequestsWrapper,
+    settle_time: int = DEFAULT_SETTLE_TIME,
+    min_refresh_interval: int = DEFAULT_MIN_REFRESH_INTERVAL,
+    log_tails: Optional[Dict[int, BuildLogTail]] = None,
+) -> List[Dict]:
+    """
+    Wait for a build and all builds snapshot-depending on it to finish.
 
+    The whole chain is fetched with a single query per tick, and every change of
+    state of any of its builds is reported as soon as it is seen. Dependent builds
+    can be queued after the build they depend on finished (e.g. by finish build
+    triggers). For such chains, settle_time makes the chain complete only once all
+    its builds finished and no new build appeared during settle_time seconds. By
+    default, the watcher returns as soon as the last build finishes.
 
-def wait_for_dependent_builds(trigger_build_id, refresh_interval, request):
-    # Poll for the status of dependent builds
-    delay = 10 * refresh_interval
-    time.sleep(delay)
-    finished_dependent_build_ids = set()
+    Args:
+        trigger_build_id : int
+            The id of the triggered build.
+        refresh_interval : int
+            Maximum refresh interval in seconds used to check the status of the builds.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+        settle_time : int
+            Seconds to wait for new dependent builds once all builds finished.
+        min_refresh_interval : int
+            Minimum refresh interval in seconds used to check the status of the builds.
+        log_tails : dict, optional
+            If given, the logs of the running builds are printed as they grow and
+            the chain is abandoned as soon as one of its builds fails, be it still
+            running. The log tails are collected in this dict, by build id.
+
+    Returns:
+        list
+            The builds of the chain, all finished unless one failed with log_tails given.
+    """
+    print(f"Waiting for build with id {trigger_build_id} and its dependent builds...")
+    known_builds = {}
+    finished_since = None
     while True:
-        # Retrieve all dependent builds for the trigger_build_id
-        time.sleep(delay)
-        dependent_builds = get_dependent_builds(trigger_build_id, request)
+        builds = get_dependent_builds(trigger_build_id, request, include_initial=True)
+
+        changed = False
+        for build in builds:
+            previous = known_builds.get(build["id"])
+            state_changed = previous is None or previous["state"] != build["state"]
+            if state_changed:
+                print(describe_build(build), flush=True)
+                changed = True
+            known_builds[build["id"]] = build
+
+            # the log of a build that just finished is read one last time
+            if log_tails is not None and (
+                build["state"] == "running"
+                or (build["state"] == "finished" and state_changed)
+            ):
+                log_tail = log_tails.setdefault(build["id"], BuildLogTail(build))
+                log_tail.print_new_lines(request)
+
+        if log_tails is not None:
+            # running builds are marked as failed as soon as a step fails
+            failed_builds = [
+                x
+                for x in builds
+                if x["state"] != "queued" and x.get("status", "SUCCESS") != "SUCCESS"
+            ]
+            if failed_builds:
+                for build in failed_builds:
+                    print(f"Build failed: {describe_build(build)}", flush=True)
+                return list(known_builds.values())
 
-        # Check if all dependent builds have finished processing
         all_finished = all(
-            build["id"] in finished_dependent_build_ids for build in dependent_builds
+            build["state"] == "finished" for build in known_builds.values()
         )
-
-        if all_finished:
+        if not all_finished or (changed and settle_time > 0):
+            finished_since = None
+        elif finished_since is None:
+            finished_since = time.monotonic()
+
+        if finished_since is not None and (
+            time.monotonic() - finished_since >= settle_time
+        ):
             print("All dependent builds finished.")
-            break
+            return list(known_builds.values())
+
+        # the chain is polled as often as its most imminent build requires
+        time.sleep(
+            min(
+                (
+                    get_refresh_interval(x, min_refresh_interval, refresh_interval)
+                    for x in known_builds.values()
+                    if x["state"] != "finished"
+                ),
+                default=refresh_interval,
+            )
+        )
+
+
+def get_build_timings(trigger_build_id: int, request: RequestsWrapper) -> List[Dict]:
+    """
+    Get how long each build of a chain waited in the queue and how long it ran.
+
+    Args:
+        trigger_build_id : int
+            The id of the triggered build.
+        request : RequestsWrapper
+            The request wrapper to make requests calls.
+
+    Returns:
+        list
+            The id, build configuration id and seconds queued and running of each
+            build, None where not applicable.
+    """
 
-        for build in dependent_builds:
-            build_id = build["id"]
-            if build_id not in finished_dependent_build_ids:
-                config = build["buildTypeId"]
-                print(f"Running build config {config} (build id: {build_id})")
-                wait_for_build(build_id, refresh_interval, request)
-                finished_dependent_build_ids.add(build_id)
+    def parse_date(build: Dict, field: str) -> Optional[datetime]:
+        if field not in build:
+            return None
+        return datetime.strptime(build[field], TEAMCITY_DATE_FORMAT)
+
+    def seconds_between(start: Optional[datetime], end: Optional[datetime]):
+        if start is None or end is None:
+            return None
+        return int((end - start).total_seconds())
+
+    timings = []
+    builds = get_dependent_builds(
+        trigger_build_id, request, include_initial=True, fields=TIMING_FIELDS
+    )
+    for build in builds:
+        queued = parse_date(build, "queuedDate")
+        started = parse_date(build, "startDate")
+        finished = parse_date(build, "finishDate")
+        timings.append(
+            {
+                "id": build["id"],
+                "buildTypeId": build["buildTypeId"],
+                "queued_seconds": seconds_between(queued, started),
+                "running_seconds": seconds_between(started, finished),
+            }
+        )
+    return timings
+
+
+def print_build_timings(timings: List[Dict]) -> None:
+    """
+    Print how long each build of a chain waited in the queue and how long it ran.
+
+    Args:
+        timings : list
+            The timings, as returned by get_build_timings.
+    """
+    for timing in timings:
+        queued = timing["queued_seconds"]
+        running = timing["running_seconds"]
+        print(
+            f"Build config {timing['buildTypeId']} (build id: {timing['id']}): "
+            f"queued {'-' if queued is None else f'{queued}s'}, "
+            f"ran {'-' if running is None else f'{running}s'}"
+        )
+    queued_total = sum(x["queued_seconds"] or 0 for x in timings)
+    running_total = sum(x["running_seconds"] or 0 for x in timings)
+    print(f"Total: queued {queued_total}s, ran {running_total}s")
 
 
 def run(
@@ -148,7 +743,17 @@ def run(
     build_config_id: str,
     refresh_interval: int,
     teamcity_access_token: str,
-):
+    settle_time: int = DEFAULT_SETTLE_TIME,
+    min_refresh_interval: int = DEFAULT_MIN_REFRESH_INTERVAL,
+    fail_fast: bool = False,
+    report_file: Optional[Path] = None,
+    reuse: bool = False,
+    move_to_top: bool = False,
+    agent_id: Optional[int] = None,
+    agent_pool_id: Optional[int] = None,
+    comment: Optional[str] = None,
+    properties: Sequence[Tuple[str, str]] = (),
+) -> bool:
     """
     Runs the script with the specified parameters.
 
@@ -158,9 +763,36 @@ def run(
         build_config_id : str
             The id of the build configuration to trigger.
         refresh_interval : int
-            Refresh interval in seconds used to check the status of the triggered build.
+            Maximum refresh interval in seconds used to check the status of the triggered build.
         teamcity_access_token : str
             The TeamCity access token to authenticate with.
+        settle_time : int
+            Seconds to wait for new dependent builds once all builds of the chain finished.
+        min_refresh_interval : int
+            Minimum refresh interval in seconds used to check the status of the triggered build.
+        fail_fast : bool
+            Whether the logs of the running builds are streamed and the remaining
+            builds canceled as soon as one fails.
+        report_file : Path, optional
+            Path of the JSON failure report.
+        reuse : bool
+            Whether a queued build of the branch, or a running or successful build
+            of its head revision as detected by TeamCity, is reused instead of
+            triggering a new build.
+        move_to_top : bool
+            Whether the triggered build is moved to the top of the build queue.
+        agent_id : int, optional
+            The id of the agent to run the triggered build on.
+        agent_pool_id : int, optional
+            The id of the agent pool to run the triggered build on.
+        comment : str, optional
+            The comment of the triggered build.
+        properties : list
+            The (name, value) build parameters of the triggered build.
+
+    Returns:
+        bool
+            True if all builds of the chain succeeded.
     """
     request = RequestsWrapper(teamcity_access_token)
 
@@ -168,21 +800,47 @@ def run(
         branch_name,
         build_config_id,
         request,
+        reuse,
+        move_to_top,
+        agent_id,
+        agent_pool_id,
+        comment,
+        properties,
     )
 
     print(trigger_build_id)
+    if not trigger_build_id:
+        return False
 
-    wait_for_build(
+    log_tails = {} if fail_fast else None
+    builds = watch_build_chain(
         trigger_build_id,
         refresh_interval,
         request,
+        settle_time,
+        min_refresh_interval,
+        log_tails,
     )
 
-    wait_for_dependent_builds(
-        trigger_build_id,
-        refresh_interval,
-        request,
-    )
+    print_build_timings(get_build_timings(trigger_build_id, request))
+
+    if all(x.get("status") == "SUCCESS" for x in builds):
+        return True
+
+    canceled_build_ids = []
+    if fail_fast:
+        # the failing builds are left to finish so that their logs are complete
+        canceled_build_ids = cancel_builds(
+            [x for x in builds if x.get("status", "SUCCESS") == "SUCCESS"],
+            f"Canceled because a build of the chain of build {trigger_build_id} failed.",
+            request,
+        )
+    report = get_failure_report(builds, canceled_build_ids, log_tails or {}, request)
+    if report_file:
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=4)
+    print(json.dumps(report, indent=4))
+    return False
 
 
 if __name__ == "__main__":
@@ -193,6 +851,16 @@ if __name__ == "__main__":
             args.build_config_id,
             args.refresh_interval,
             args.teamcity_access_token.read(),
+            args.settle_time,
+            args.min_refresh_interval,
+            args.fail_fast,
+            args.report_file,
+            args.reuse,
+            args.move_to_top,
+            args.agent_id,
+            args.agent_pool_id,
+            args.comment,
+            args.property,
         )
     except Exception as error:
         print("Error:", error, file=sys.stderr)
@@ -46,11 +46,14 @@ function update_MeshKernelNET() {
         "Release v${version} auto-update: bump version"
 
     # bump versions of dependencies
-    local meshkernel_build_number=$(
-        python ${scripts_path}/get_build_number.py \
-            --build_config_id GridEditor_MeshKernel${forked_repo_suffix}_Windows_Build \
-            --version ${version} \
-            --teamcity_access_token ${teamcity_access_token}
+    local meshkernel_build_number
+    meshkernel_build_number=$(
+        call_release_agent "$(
+            jq -nc \
+                --arg build_config_id GridEditor_MeshKernel${forked_repo_suffix}_Windows_Build \
+                --arg version ${version} \
+                '{command: "build-number", build_config_id: $build_config_id, version: $version}'
+        )"
     )
     local dir_package_props_file=${work_dir}/${repo_name}/Directory.Packages.props
     python ${scripts_path}/bump_dependencies_versions.py \
@@ -77,11 +80,14 @@ function update_GridEditorPlugin() {
         "Release v${version} auto-update: bump version"
 
     # bump versions of dependencies
-    local meshkernelnet_build_number=$(
-        python ${scripts_path}/get_build_number.py \
-            --build_config_id GridEditor_MeshKernelNet${forked_repo_suffix}_Build \
-            --version ${version} \
-            --teamcity_access_token ${teamcity_access_token}
+    local meshkernelnet_build_number
+    meshkernelnet_build_number=$(
+        call_release_agent "$(
+            jq -nc \
+                --arg build_config_id GridEditor_MeshKernelNet${forked_repo_suffix}_Build \
+                --arg version ${version} \
+                '{command: "build-number", build_config_id: $build_config_id, version: $version}'
+        )"
     )
     local dir_package_props_file=${work_dir}/${repo_name}/Directory.Packages.props
     python ${scripts_path}/bump_dependencies_versions.py \
@@ -52,6 +52,22 @@ function upload_msi_to_github() {
     fi
 }
 
+function upload_checksums_to_github() {
+    show_progress
+    local tag=$1
+    local -a repo_names=(${repo_name_MeshKernel} ${repo_name_MeshKernelPy} ${repo_name_MeshKernelNET})
+    if ${release_grid_editor_plugin}; then
+        repo_names+=(${repo_name_GridEditorPlugin})
+    fi
+    for repo_name in "${repo_names[@]}"; do
+        echo "Uploading SHA256SUMS to ${repo_name}..."
+        gh release upload \
+            ${tag} ${work_dir}/artifacts/SHA256SUMS \
+            --repo $(get_gh_repo_path ${repo_name}) \
+            --clobber
+    done
+}
+
 function upload_python_wheels_to_pypi() {
     show_progress
     local access_token_file=$1
@@ -16,6 +16,12 @@ function usage {
     echo "  --pypi_access_token           Dependent  string   Path to PyPi access token"
     echo "                                                    Required if --upload_to_pypi is provided, ignored otherwise"
     echo "  --teamcity_access_token       Required   string   Path to teamcity access token"
+    echo "  --teamcity_http_cache_dir     Optional   string   Path to a persistent cache of TeamCity responses"
+    echo "                                                    Reused when a release is resumed or repeated (default = no cache)"
+    echo "  --teamcity_artifact_cache_dir Optional   string   Path to a content-addressed cache of TeamCity artifacts"
+    echo "                                                    Downloads of already cached artifacts skip the network (default = no cache)"
+    echo "  --teamcity_build_mirror       Optional   string   Path to a SQLite mirror of TeamCity builds"
+    echo "                                                    Build lookups are answered locally, synced incrementally (default = no mirror)"
     echo "  --github_refresh_interval     Optional   integer  Refresh interval in seconds."
     echo "                                                    Used as a refresh interval while watching github PR checks (default = 30s)"
     echo "  --delay                       Optional   integer  Delay in seconds"
@@ -0,0 +1,175 @@
+"""
+Measures the cold-start time of the mkrelease commands.
+
+Each command is started in a fresh interpreter with --help, which returns as soon
+as the script of the command is imported and its options are parsed, so the time
+measured is the start-up cost paid by every invocation. The modules imported by
+each command are inspected with -X importtime to tell whether the command loads
+the HTTP stack.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+AUTOMATION_DIR = Path(__file__).resolve().parent.parent / "automation"
+MKRELEASE = AUTOMATION_DIR / "mkrelease.py"
+
+sys.path.insert(0, str(AUTOMATION_DIR))
+from mkrelease import COMMANDS  # noqa: E402
+
+# top-level modules of the HTTP stack
+HTTP_MODULES = ("requests", "aiohttp", "urllib3")
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--command",
+        type=str,
+        action="append",
+        choices=COMMANDS,
+        required=False,
+        default=None,
+        help="A command to measure. Can be repeated. If not specified, all commands are measured.",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        required=False,
+        default=10,
+        help="Number of times each command is started.",
+    )
+
+    parser.add_argument(
+        "--python",
+        type=str,
+        required=False,
+        default=sys.executable,
+        help="The python interpreter the commands are started with.",
+    )
+
+    return parser.parse_args()
+
+
+def time_command(python: str, arguments: Sequence[str], repeat: int) -> List[float]:
+    """
+    Time the start of a command in fresh interpreters.
+
+    Args:
+    - python (str): The python interpreter.
+    - arguments (list): The arguments of the interpreter.
+    - repeat (int): Number of times the command is started.
+
+    Returns:
+    - list: The wall-clock durations in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [python, *arguments],
+            cwd=AUTOMATION_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def get_imported_modules(python: str, arguments: Sequence[str]) -> List[str]:
+    """
+    Get the modules imported by a command.
+
+    Args:
+    - python (str): The python interpreter.
+    - arguments (list): The arguments of the interpreter.
+
+    Returns:
+    - list: The names of the imported modules.
+    """
+    process = subprocess.run(
+        [python, "-X", "importtime", *arguments],
+        cwd=AUTOMATION_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    # lines are formatted as: import time: self [us] | cumulative | imported package
+    return [
+        line.rsplit("|", 1)[1].strip()
+        for line in process.stderr.splitlines()
+        if line.startswith("import time:") and line.count("|") == 2
+    ][1:]
+
+
+def benchmark(python: str, commands: Sequence[str], repeat: int) -> List[Dict]:
+    """
+    Measure the cold-start time of commands, relative to a bare interpreter.
+
+    Args:
+    - python (str): The python interpreter.
+    - commands (list): The commands to measure.
+    - repeat (int): Number of times each command is started.
+
+    Returns:
+    - list: The median and minimum durations in milliseconds, the number of
+      imported modules and whether the HTTP stack is loaded, per command.
+    """
+    cases = {"(interpreter)": ["-c", "pass"]}
+    cases.update({command: [str(MKRELEASE), command, "--help"] for command in commands})
+
+    results = []
+    for name, arguments in cases.items():
+        durations = time_command(python, arguments, repeat)
+        modules = get_imported_modules(python, arguments)
+        results.append(
+            {
+                "command": name,
+                "median_ms": statistics.median(durations) * 1000,
+                "min_ms": min(durations) * 1000,
+                "modules": len(modules),
+                "http": any(module.split(".")[0] in HTTP_MODULES for module in modules),
+            }
+        )
+    return results
+
+
+def print_results(results: Sequence[Dict]) -> None:
+    """
+    Print the results as a table.
+
+    Args:
+    - results (list): The results of benchmark.
+    """
+    width = max(len(result["command"]) for result in results)
+    print(f"{'command':<{width}}  {'median':>8}  {'min':>8}  {'modules':>7}  http")
+    for result in results:
+        print(
+            f"{result['command']:<{width}}  "
+            f"{result['median_ms']:>6.1f}ms  "
+            f"{result['min_ms']:>6.1f}ms  "
+            f"{result['modules']:>7}  "
+            f"{'yes' if result['http'] else 'no'}"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        print_results(
+            benchmark(args.python, args.command or list(COMMANDS), args.repeat)
+        )
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)
@@ -0,0 +1,258 @@
+"""
+Measures the decoding of TeamCity JSON responses.
+
+Each payload is decoded in full with the json module and, when installed, with
+orjson; decoded twice through a plain requests response and through a JsonResponse,
+which decodes once; and lazily with json_codec, taking only the first item of the
+collection or one field of each item.
+
+Payloads are recorded TeamCity responses, e.g. saved with
+curl -H "Accept: application/json" .../app/rest/builds?locator=... > builds.json
+If none is given, a builds page shaped like those of TeamCity is generated.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import requests
+
+AUTOMATION_DIR = Path(__file__).resolve().parent.parent / "automation"
+
+sys.path.insert(0, str(AUTOMATION_DIR))
+from json_codec import JsonResponse, extract_field, iterate_items, orjson  # noqa: E402
+
+
+def parse_arguments():
+    """
+    Parse the arguments with which this script was called through
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--payload",
+        type=Path,
+        action="append",
+        required=False,
+        default=None,
+        help="A recorded TeamCity JSON response. Can be repeated. If not specified, a builds page is generated.",
+    )
+
+    parser.add_argument(
+        "--item_key",
+        type=str,
+        required=False,
+        default="build",
+        help="The key of the items of the collections.",
+    )
+
+    parser.add_argument(
+        "--field",
+        type=str,
+        required=False,
+        default="number",
+        help="The field of the items extracted lazily.",
+    )
+
+    parser.add_argument(
+        "--builds",
+        type=int,
+        required=False,
+        default=1000,
+        help="Number of builds of the generated page.",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        required=False,
+        default=50,
+        help="Number of times each case is run.",
+    )
+
+    return parser.parse_args()
+
+
+def generate_builds_page(count: int) -> bytes:
+    """
+    Generate a page of builds shaped like those of TeamCity.
+
+    Args:
+    - count (int): The number of builds.
+
+    Returns:
+    - bytes: The JSON document of the page.
+    """
+    builds = [
+        {
+            "id": 400000 + i,
+            "buildTypeId": "GridEditor_MeshKernelBackEndTest_Windows_Build",
+            "number": f"{1000 + i}+{i * 2654435761 % 16**7:07x}",
+            "status": "SUCCESS" if i % 7 else "FAILURE",
+            "state": "finished",
+            "branchName": f"release/v7.{i % 10}.0",
+            "href": f"/app/rest/builds/id:{400000 + i}",
+            "webUrl": f"https://dpcbuild.deltares.nl/buildConfiguration/GridEditor/{400000 + i}",
+            "finishOnAgentDate": "20240115T101112+0100",
+            "pinned": i % 11 == 0,
+            "tags": {
+                "count": 1,
+                "tag": [{"name": f"v7.{i % 10}.0"}],
+            },
+            "artifacts": {
+                "count": 3,
+                "file": [
+                    {"name": f"Deltares.MeshKernel.7.{i % 10}.0.{1000 + i}.nupkg"},
+                    {"name": f"meshkernel-7.{i % 10}.0-py3-none-win_amd64.whl"},
+                    {"name": "NuGetContent.zip"},
+                ],
+            },
+        }
+        for i in range(count)
+    ]
+    page = {
+        "count": count,
+        "href": f"/app/rest/builds?locator=count:{count}",
+        "nextHref": f"/app/rest/builds?locator=count:{count},start:{count}",
+        "build": builds,
+    }
+    return json.dumps(page).encode("utf-8")
+
+
+def make_response(response_class: type, body: bytes) -> requests.Response:
+    """
+    Make a response with a body, as returned by the server.
+
+    Args:
+    - response_class (type): requests.Response or a subclass.
+    - body (bytes): The body.
+
+    Returns:
+    - requests.Response: The response.
+    """
+    response = response_class()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response._content = body
+    return response
+
+
+def decode_twice(response_class: type, body: bytes) -> None:
+    """
+    Decode a response twice, as callers which call json() twice do.
+
+    Args:
+    - response_class (type): requests.Response or a subclass.
+    - body (bytes): The body.
+    """
+    response = make_response(response_class, body)
+    response.json()
+    response.json()
+
+
+def time_case(function: Callable[[], object], repeat: int) -> List[float]:
+    """
+    Time a case.
+
+    Args:
+    - function (callable): The case.
+    - repeat (int): Number of times the case is run.
+
+    Returns:
+    - list: The wall-clock durations in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def benchmark(
+    name: str,
+    body: bytes,
+    item_key: str,
+    field: str,
+    repeat: int,
+) -> List[Dict]:
+    """
+    Measure the decoding of a payload.
+
+    Args:
+    - name (str): The name of the payload.
+    - body (bytes): The payload.
+    - item_key (str): The key of the items of the collection.
+    - field (str): The field of the items extracted lazily.
+    - repeat (int): Number of times each case is run.
+
+    Returns:
+    - list: The median and minimum durations in milliseconds, per case.
+    """
+    text = body.decode("utf-8")
+    cases = {"json.loads": lambda: json.loads(body)}
+    if orjson is not None:
+        cases["orjson.loads"] = lambda: orjson.loads(body)
+    cases["requests json() x2"] = lambda: decode_twice(requests.Response, body)
+    cases["JsonResponse json() x2"] = lambda: decode_twice(JsonResponse, body)
+    cases["lazy first item"] = lambda: next(iterate_items(text, item_key), None)
+    cases[f"lazy {field} of all items"] = lambda: list(
+        extract_field(text, item_key, field)
+    )
+
+    results = []
+    for case, function in cases.items():
+        durations = time_case(function, repeat)
+        results.append(
+            {
+                "payload": name,
+                "case": case,
+                "median_ms": statistics.median(durations) * 1000,
+                "min_ms": min(durations) * 1000,
+            }
+        )
+    return results
+
+
+def print_results(results: Sequence[Dict]) -> None:
+    """
+    Print the results as a table.
+
+    Args:
+    - results (list): The results of benchmark.
+    """
+    payload_width = max(len(result["payload"]) for result in results)
+    case_width = max(len(result["case"]) for result in results)
+    print(
+        f"{'payload':<{payload_width}}  {'case':<{case_width}}  {'median':>9}  {'min':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['payload']:<{payload_width}}  "
+            f"{result['case']:<{case_width}}  "
+            f"{result['median_ms']:>7.2f}ms  "
+            f"{result['min_ms']:>7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        if args.payload:
+            payloads = {str(path): path.read_bytes() for path in args.payload}
+        else:
+            payloads = {
+                f"{args.builds} builds": generate_builds_page(args.builds),
+            }
+        results = []
+        for name, body in payloads.items():
+            results.extend(
+                benchmark(name, body, args.item_key, args.field, args.repeat)
+            )
+        print_results(results)
+    except Exception as error:
+        print("Error:", error, file=sys.stderr)